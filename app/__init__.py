@@ -42,6 +42,14 @@ def create_app():
     db.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
+    
+    # مهلة طلبات الذكاء الاصطناعي لكل مسار
+    from app import ai_resilience
+    ai_resilience.init_app(app)
+    
+    # طابور المهام الخلفية (توليد المقالات، استيراد النوتات، تحليل الوجه)
+    from app import jobs
+    jobs.init_app(app)
     login_manager.login_view = 'auth.login'  # type: ignore
     login_manager.login_message = 'يرجى تسجيل الدخول للوصول إلى هذه الصفحة'
     
@@ -82,6 +90,7 @@ def create_app():
     from app.routes.seo import seo_bp
     from app.routes.face_analyzer import face_analyzer_bp
     from app.routes.google_auth import google_auth_bp
+    from app.routes.jobs import jobs_bp
     
     # Register core blueprints
     app.register_blueprint(auth_bp)
@@ -114,6 +123,7 @@ def create_app():
     app.register_blueprint(articles_bp)
     app.register_blueprint(seo_bp)
     app.register_blueprint(face_analyzer_bp)
+    app.register_blueprint(jobs_bp)
     
     # Add custom Jinja2 filters
     import json
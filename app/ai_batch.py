@@ -0,0 +1,123 @@
+"""
+AI Batch - تنفيذ مهام AI متعددة العناصر على دفعات متوازية
+
+- split_text_chunks: تقسيم نص طويل (سطر لكل عنصر أو نص حر) إلى أجزاء محدودة الحجم
+- run_batch: تشغيل الأجزاء بالتوازي على حلقة أحداث AI مع حد تزامن خاص بالدفعة،
+  وتقرير التقدم بعد كل جزء، وجمع أخطاء الأجزاء بدون إفشال الدفعة كاملة
+
+حد الدفعة (AI_BATCH_CONCURRENCY) أصغر من حد العامل (AI_MAX_CONCURRENCY) حتى لا
+تستهلك عملية استيراد كبيرة كل اتصالات العامل على حساب طلبات المستخدمين.
+"""
+
+import asyncio
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+BATCH_CONCURRENCY = int(os.environ.get('AI_BATCH_CONCURRENCY', 6))
+
+_SENTENCE_END = re.compile(r'(?<=[.!?؟؛;])\s+')
+
+
+@dataclass
+class BatchResult:
+    """نتائج الدفعة بترتيب العناصر المدخلة (None للعنصر الفاشل)"""
+    results: List[Any] = field(default_factory=list)
+    errors: Dict[int, str] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        return len(self.results)
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    @property
+    def succeeded(self) -> List[Any]:
+        return [result for i, result in enumerate(self.results) if i not in self.errors]
+
+
+def split_text_chunks(text: str, max_lines: int = 25, max_chars: int = 3000) -> List[str]:
+    """
+    تقسيم النص إلى أجزاء بحد أقصى max_lines سطر و max_chars حرف لكل جزء
+
+    الأسطر الفارغة تُتجاهل، والسطر الأطول من max_chars (نص حر بدون أسطر)
+    يُقسم على نهايات الجمل حتى لا تُقطع نوتة في منتصفها.
+    """
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) <= max_chars:
+            units.append(line)
+        else:
+            units.extend(_split_sentences(line, max_chars))
+
+    chunks = []
+    current = []
+    current_chars = 0
+    for unit in units:
+        if current and (len(current) >= max_lines or current_chars + len(unit) > max_chars):
+            chunks.append('\n'.join(current))
+            current = []
+            current_chars = 0
+        current.append(unit)
+        current_chars += len(unit) + 1
+
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def _split_sentences(text: str, max_chars: int) -> List[str]:
+    parts = []
+    current = ''
+    for sentence in _SENTENCE_END.split(text):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            parts.append(current)
+            current = ''
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        parts.append(current)
+    return parts
+
+
+async def run_batch(items: List[Any], worker: Callable[[Any], Awaitable[Any]],
+                    concurrency: Optional[int] = None,
+                    on_progress: Optional[Callable[[int, int, int], None]] = None) -> BatchResult:
+    """
+    تشغيل worker(item) لكل عنصر بالتوازي (حتى concurrency في نفس الوقت)
+
+    Args:
+        items: العناصر (مثل أجزاء النص)
+        worker: دالة غير متزامنة تعالج عنصراً واحداً؛ الاستثناء يُسجل كخطأ للعنصر فقط
+        concurrency: حد التزامن (AI_BATCH_CONCURRENCY افتراضياً)
+        on_progress: تُستدعى على حلقة الأحداث بعد كل عنصر بـ (done, total, failed)؛
+                     يجب أن تكون سريعة وبدون I/O
+
+    Returns:
+        BatchResult بنفس ترتيب items
+    """
+    semaphore = asyncio.Semaphore(concurrency or BATCH_CONCURRENCY)
+    batch = BatchResult(results=[None] * len(items))
+    done = 0
+
+    async def run_one(index: int, item):
+        nonlocal done
+        async with semaphore:
+            try:
+                batch.results[index] = await worker(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                batch.errors[index] = str(e)
+        done += 1
+        if on_progress is not None:
+            on_progress(done, len(items), len(batch.errors))
+
+    await asyncio.gather(*(run_one(i, item) for i, item in enumerate(items)))
+    return batch
@@ -0,0 +1,293 @@
+"""
+AI Response Cache - كاش استجابات الذكاء الاصطناعي
+كاش معنون بالمحتوى (content-addressed) لاستجابات OpenAI مع TTL وإزالة LRU
+يتكون من طبقة داخل العملية وطبقة SQLite اختيارية مشتركة بين عمّال gunicorn
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def make_cache_key(model: str, system_message: Optional[str], prompt, max_completion_tokens: int, **params) -> str:
+    """
+    توليد مفتاح الكاش من بصمة الطلب
+
+    المفتاح هو SHA-256 لـ (model, system_message, prompt, max_completion_tokens)
+    بالإضافة إلى أي معاملات توليد أخرى (مثل temperature) تؤثر على الناتج.
+    """
+    payload = json.dumps(
+        [model, system_message, prompt, max_completion_tokens, params],
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CacheTier:
+    """واجهة طبقة الكاش - أي طبقة جديدة يجب أن تنفذ get/set/clear"""
+
+    name = 'base'
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return 0
+
+
+class MemoryCacheTier(CacheTier):
+    """طبقة كاش داخل العملية (LRU + TTL)"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheTier(CacheTier):
+    """
+    طبقة كاش على القرص باستخدام SQLite
+
+    يمكن لجميع عمّال gunicorn مشاركة نفس الملف. يتم فتح اتصال لكل thread
+    ولكل عملية (بعد fork) لأن اتصالات SQLite لا يجوز مشاركتها بينها.
+    """
+
+    name = 'sqlite'
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl: float = 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_ai_cache_last_access ON ai_cache (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at FROM ai_cache WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at < now:
+            conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+            return None
+
+        conn.execute("UPDATE ai_cache SET last_access = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO ai_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl, now)
+        )
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        """حذف العناصر المنتهية وتقليص الجدول إلى الحد الأقصى (الأقدم استخداماً أولاً)"""
+        conn = self._connect()
+        conn.execute("DELETE FROM ai_cache WHERE expires_at < ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM ai_cache WHERE key IN ("
+            "SELECT key FROM ai_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM ai_cache")
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    كاش متعدد الطبقات لاستجابات AI
+
+    البحث يتم في الطبقات بالترتيب، وأي إصابة في طبقة لاحقة تُرفع
+    إلى الطبقات الأسرع. الكتابة تتم في جميع الطبقات.
+    """
+
+    def __init__(self, tiers: List[CacheTier]):
+        self.tiers = tiers
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'errors': 0}
+        self._tier_hits = {tier.name: 0 for tier in tiers}
+
+    def get(self, key: str) -> Optional[str]:
+        for i, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                print(f"⚠ خطأ في قراءة كاش AI ({tier.name}): {str(e)}")
+                self._count('errors')
+                continue
+
+            if value is not None:
+                for faster in self.tiers[:i]:
+                    try:
+                        faster.set(key, value)
+                    except Exception:
+                        pass
+
+                with self._lock:
+                    self._stats['hits'] += 1
+                    self._tier_hits[tier.name] += 1
+                return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        for tier in self.tiers:
+            try:
+                tier.set(key, value)
+            except Exception as e:
+                print(f"⚠ خطأ في كتابة كاش AI ({tier.name}): {str(e)}")
+                self._count('errors')
+        self._count('sets')
+
+    def clear(self) -> None:
+        for tier in self.tiers:
+            tier.clear()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def get_stats(self) -> Dict:
+        """إحصائيات الكاش (الإصابات والإخفاقات لكل طبقة)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tier_hits'] = dict(self._tier_hits)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+
+        sizes = {}
+        for tier in self.tiers:
+            try:
+                sizes[tier.name] = len(tier)
+            except Exception:
+                sizes[tier.name] = None
+        stats['sizes'] = sizes
+        return stats
+
+
+CACHE_ENABLED = os.environ.get('AI_CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_TTL = float(os.environ.get('AI_CACHE_TTL', 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', 512))
+CACHE_DB_PATH = os.environ.get('AI_CACHE_DB_PATH')
+CACHE_DB_MAX_ENTRIES = int(os.environ.get('AI_CACHE_DB_MAX_ENTRIES', 5000))
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """الحصول على كاش الاستجابات (None إذا كان معطلاً)"""
+    global _response_cache
+    if not CACHE_ENABLED:
+        return None
+
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                tiers = [MemoryCacheTier(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)]
+                if CACHE_DB_PATH:
+                    try:
+                        tiers.append(SQLiteCacheTier(CACHE_DB_PATH, max_entries=CACHE_DB_MAX_ENTRIES, ttl=CACHE_TTL))
+                    except Exception as e:
+                        print(f"⚠ تعذر فتح كاش SQLite في {CACHE_DB_PATH}: {str(e)}")
+                _response_cache = ResponseCache(tiers)
+    return _response_cache
+
+
+def get_cache_stats() -> Dict:
+    """إحصائيات الكاش للعرض في لوحة الإدارة"""
+    cache = get_response_cache()
+    if cache is None:
+        return {'enabled': False}
+    stats = cache.get_stats()
+    stats['enabled'] = True
+    return stats
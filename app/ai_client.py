@@ -0,0 +1,465 @@
+"""
+AI Client - طبقة الاتصال بـ OpenAI
+مسار غير متزامن (AsyncOpenAI) مع حد أقصى للطلبات المتزامنة لكل عامل
+
+جميع الطلبات تمر عبر حلقة أحداث (event loop) واحدة تعمل في thread خلفي
+داخل كل عملية، لذلك يمكن لعامل gunicorn واحد إبقاء عشرات الطلبات قيد
+التنفيذ، بينما تستمر الدوال المتزامنة الحالية بالعمل عبر run_sync.
+"""
+
+import asyncio
+import concurrent.futures
+import importlib.util
+import os
+import threading
+import weakref
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from app.ai_cache import make_cache_key
+from app.ai_resilience import DeadlineExceeded, detached_context, guarded_call, hedge_delay, remaining_time
+
+
+MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', 32))
+AI_LOG_TOKENS = os.environ.get('AI_LOG_TOKENS', 'true').lower() == 'true'
+
+# مجمع اتصالات HTTP لكل عامل: بحجم حد التزامن حتى لا تنتظر الطلبات اتصالاً،
+# مع إبقاء الاتصالات مفتوحة (keep-alive) لتجنب مصافحة TLS جديدة لكل طلب
+POOL_MAX_CONNECTIONS = int(os.environ.get('AI_POOL_MAX_CONNECTIONS', MAX_CONCURRENCY))
+POOL_MAX_KEEPALIVE = int(os.environ.get('AI_POOL_MAX_KEEPALIVE', POOL_MAX_CONNECTIONS))
+POOL_KEEPALIVE_EXPIRY = float(os.environ.get('AI_POOL_KEEPALIVE_EXPIRY', 90))
+CONNECT_TIMEOUT = float(os.environ.get('AI_CONNECT_TIMEOUT', 10))
+# HTTP/2 يحتاج حزمة h2 (pip install httpx[http2])؛ auto = يُفعّل إذا كانت مثبتة
+_http2_setting = os.environ.get('AI_HTTP2', 'auto').lower()
+HTTP2_ENABLED = (importlib.util.find_spec('h2') is not None) if _http2_setting == 'auto' else _http2_setting == 'true'
+
+
+def get_client_settings() -> Dict:
+    """قراءة إعدادات الاتصال بـ OpenAI من متغيرات البيئة"""
+    api_key = os.environ.get("OPENAI_API_KEY") or os.environ.get("AI_INTEGRATIONS_OPENAI_API_KEY")
+    base_url = os.environ.get("AI_INTEGRATIONS_OPENAI_BASE_URL")
+
+    if not api_key:
+        # إذا لم يتم العثور على مفتاح، سنحاول القراءة من ملف .env مباشرة للطوارئ
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+            api_key = os.environ.get("OPENAI_API_KEY") or os.environ.get("AI_INTEGRATIONS_OPENAI_API_KEY")
+        except:
+            pass
+
+    return {
+        'api_key': api_key or "temporary_key_to_prevent_boot_error",
+        'base_url': base_url
+    }
+
+
+def get_http_settings() -> Dict:
+    """إعدادات httpx المشتركة: حجم المجمع، keep-alive، HTTP/2 ومهلة الاتصال"""
+    return {
+        'limits': httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY
+        ),
+        'http2': HTTP2_ENABLED,
+        'timeout': httpx.Timeout(600, connect=CONNECT_TIMEOUT)
+    }
+
+
+_sync_client = None
+_sync_client_pid = None
+_sync_client_lock = threading.Lock()
+
+
+def get_openai_client() -> OpenAI:
+    """عميل متزامن مشترك في العملية (للسكربتات والأدوات خارج مسار الطلبات)"""
+    global _sync_client, _sync_client_pid
+    if _sync_client is None or _sync_client_pid != os.getpid():
+        with _sync_client_lock:
+            if _sync_client is None or _sync_client_pid != os.getpid():
+                _sync_client = OpenAI(**get_client_settings(), http_client=DefaultHttpxClient(**get_http_settings()))
+                _sync_client_pid = os.getpid()
+    return _sync_client
+
+
+class PoolMetrics:
+    """
+    مراقبة مجمع اتصالات httpx للعميل غير المتزامن
+
+    تُحدّث عبر event hooks عند وصول كل استجابة: الاتصالات الجديدة التي لم
+    تُشاهد من قبل تُحسب كاتصالات مفتوحة (مصافحة TCP/TLS)، والباقي إعادة استخدام.
+    """
+
+    def __init__(self):
+        self.http_client = None
+        self.requests = 0
+        self.connections_opened = 0
+        self._seen = weakref.WeakSet()
+
+    def _connections(self) -> List:
+        pool = getattr(getattr(self.http_client, '_transport', None), '_pool', None)
+        return list(getattr(pool, 'connections', []))
+
+    async def on_response(self, response: httpx.Response):
+        self.requests += 1
+        for connection in self._connections():
+            if connection not in self._seen:
+                self._seen.add(connection)
+                self.connections_opened += 1
+
+    def get_stats(self) -> Dict:
+        connections = self._connections()
+        idle = sum(1 for c in connections if c.is_idle())
+        http2 = sum(1 for c in connections if 'HTTP/2' in c.info())
+        return {
+            'http2_enabled': HTTP2_ENABLED,
+            'max_connections': POOL_MAX_CONNECTIONS,
+            'max_keepalive': POOL_MAX_KEEPALIVE,
+            'keepalive_expiry': POOL_KEEPALIVE_EXPIRY,
+            'open': len(connections),
+            'idle': idle,
+            'active': len(connections) - idle,
+            'http2_connections': http2,
+            'requests': self.requests,
+            'connections_opened': self.connections_opened,
+            'reuse_ratio': round(1 - self.connections_opened / self.requests, 3) if self.requests else 0.0
+        }
+
+
+class SingleFlight:
+    """
+    دمج الطلبات المتطابقة الجارية في طلب واحد (single-flight)
+
+    أول مستدعٍ لبصمة معينة يبدأ الطلب إلى OpenAI كمهمة مستقلة، وأي مستدعٍ آخر بنفس
+    البصمة أثناء انتظار الرد ينتظر نفس المهمة بدلاً من فتح طلب جديد:
+    - المهمة لا ترث مهلة من بدأها (detached_context)، وكل مستدعٍ ينتظرها ضمن مهلته هو
+    - إلغاء أحد المنتظرين أو انتهاء مهلته لا يؤثر على الباقين، والمهمة تُلغى فقط
+      عندما يغادر آخر منتظر قبل وصول الرد
+    يجب استخدامه من حلقة أحداث واحدة فقط.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: str, coro_factory):
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.get_running_loop().create_task(coro_factory(), context=detached_context())
+            flight = self._inflight[key] = {'task': task, 'waiters': 0}
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.leaders += 1
+
+        task = flight['task']
+        flight['waiters'] += 1
+        try:
+            timeout = remaining_time()
+            if timeout <= 0:
+                raise DeadlineExceeded("انتهت مهلة الطلب قبل إرسال طلب AI")
+            # asyncio.wait لا يلغي المهمة عند انتهاء المهلة أو إلغاء المنتظر (مثل shield)
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if not done:
+                raise DeadlineExceeded(f"لم يصل رد خلال {timeout:.1f}s")
+            return task.result()
+        finally:
+            flight['waiters'] -= 1
+            if flight['waiters'] == 0 and not task.done():
+                self.abandoned += 1
+                del self._inflight[key]
+                task.cancel()
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key, {}).get('task') is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # منع تحذير "exception was never retrieved" إذا غادر كل المنتظرين
+
+    def get_stats(self) -> Dict:
+        return {
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'abandoned': self.abandoned,
+            'in_flight': len(self._inflight)
+        }
+
+
+class _AsyncRuntime:
+    """حلقة الأحداث الخلفية والعميل غير المتزامن والـ semaphore الخاصة بعملية واحدة"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.client = None
+        self.semaphore = None
+        self.single_flight = SingleFlight()
+        self.pool_metrics = PoolMetrics()
+        self.thread = threading.Thread(target=self._run, name='ai-client-loop', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def get_client(self) -> AsyncOpenAI:
+        if self.client is None:
+            # إعادة المحاولة والمهلة تُداران في ai_resilience ضمن مهلة المسار
+            http_client = DefaultAsyncHttpxClient(
+                **get_http_settings(),
+                event_hooks={'response': [self.pool_metrics.on_response]}
+            )
+            self.pool_metrics.http_client = http_client
+            self.client = AsyncOpenAI(**get_client_settings(), max_retries=0, http_client=http_client)
+        return self.client
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    def get_semaphore(self) -> asyncio.Semaphore:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        return self.semaphore
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> _AsyncRuntime:
+    """الحصول على runtime العملية الحالية (يُعاد إنشاؤه تلقائياً بعد fork)"""
+    global _runtime
+    if _runtime is None or _runtime.pid != os.getpid():
+        with _runtime_lock:
+            if _runtime is None or _runtime.pid != os.getpid():
+                _runtime = _AsyncRuntime()
+    return _runtime
+
+
+def reset_after_fork():
+    """
+    نسيان العملاء والاتصالات الموروثة من العملية الأم (يُستدعى في العملية الابنة بعد fork)
+
+    لا يتم إغلاق الاتصالات الموروثة لأن إغلاق TLS يرسل close_notify على
+    مقبس ما زالت العملية الأم تستخدمه؛ يكفي إسقاط المراجع وإنشاء عملاء جديدة.
+    """
+    global _runtime, _runtime_lock, _sync_client, _sync_client_lock
+    _runtime = None
+    _runtime_lock = threading.Lock()
+    _sync_client = None
+    _sync_client_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+
+def shutdown(timeout: float = 5):
+    """إغلاق اتصالات عميل AI في العملية الحالية (عند إيقاف العامل)"""
+    runtime = _runtime
+    if runtime is None or runtime.pid != os.getpid():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(runtime.aclose(), runtime.loop).result(timeout)
+    except Exception as e:
+        print(f"⚠️ AI client shutdown: {e}")
+    runtime.loop.call_soon_threadsafe(runtime.loop.stop)
+
+
+def run_sync(coro, timeout: Optional[float] = None):
+    """
+    تنفيذ coroutine على حلقة الأحداث الخلفية وانتظار النتيجة (واجهة متزامنة)
+
+    لا يجوز استدعاؤها من داخل حلقة الأحداث نفسها لأن ذلك يسبب deadlock.
+    """
+    return submit(coro).result(timeout)
+
+
+def submit(coro) -> concurrent.futures.Future:
+    """جدولة coroutine على حلقة الأحداث الخلفية دون انتظار (يعيد Future متزامن)"""
+    runtime = get_runtime()
+    if threading.current_thread() is runtime.thread:
+        coro.close()
+        raise RuntimeError("لا يمكن انتظار نتيجة متزامنة من داخل حلقة أحداث AI، استخدم await")
+
+    return asyncio.run_coroutine_threadsafe(coro, runtime.loop)
+
+
+async def on_runtime_loop(coro):
+    """
+    تنفيذ coroutine على حلقة الأحداث الخلفية من أي حلقة أحداث أخرى
+
+    العميل غير المتزامن والـ semaphore مرتبطان بحلقة واحدة، لذلك أي استدعاء
+    من حلقة مختلفة (مثلاً asyncio.run في سكربت) يُحوّل إليها.
+    """
+    runtime = get_runtime()
+    if asyncio.get_running_loop() is runtime.loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, runtime.loop))
+
+
+class TokenUsage:
+    """عداد توكنز المدخلات والمخرجات لكل وحدة (label) في العامل الحالي"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_label = {}
+
+    def record(self, label: Optional[str], model: str, usage=None, cached: bool = False):
+        label = label or 'generic'
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+
+        with self._lock:
+            stats = self._by_label.setdefault(label, {
+                'calls': 0, 'cached': 0, 'prompt_tokens': 0, 'completion_tokens': 0
+            })
+            if cached:
+                stats['cached'] += 1
+            else:
+                stats['calls'] += 1
+                stats['prompt_tokens'] += prompt_tokens
+                stats['completion_tokens'] += completion_tokens
+
+        if AI_LOG_TOKENS and not cached:
+            print(f"📊 AI [{label}] {model}: in={prompt_tokens} out={completion_tokens} توكن")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                label: dict(stats, avg_prompt_tokens=round(stats['prompt_tokens'] / stats['calls']) if stats['calls'] else 0)
+                for label, stats in self._by_label.items()
+            }
+
+
+token_usage = TokenUsage()
+
+
+async def _create_chat_completion(messages: List[Dict], model: str, max_completion_tokens: int, coalesce: bool, label: Optional[str] = None, **params) -> Optional[str]:
+    runtime = get_runtime()
+
+    async def attempt():
+        async with runtime.get_semaphore():
+            return await runtime.get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                max_completion_tokens=max_completion_tokens,
+                **params
+            )
+
+    async def upstream():
+        response = await guarded_call(model, attempt, hedge_after=hedge_delay(model, max_completion_tokens))
+        token_usage.record(label, model, response.usage)
+        return response.choices[0].message.content
+
+    if not coalesce:
+        return await upstream()
+
+    key = make_cache_key(model, None, messages, max_completion_tokens, **params)
+    return await runtime.single_flight.do(key, upstream)
+
+
+async def acreate_chat_completion(messages: List[Dict], model: str = "gpt-4o-mini", max_completion_tokens: int = 1500, coalesce: bool = True, label: Optional[str] = None, **params) -> Optional[str]:
+    """
+    إرسال طلب Chat Completion عبر العميل غير المتزامن
+
+    يخضع لحد التزامن العام (AI_MAX_CONCURRENCY) لكل عامل، والطلبات المتطابقة
+    الجارية في نفس الوقت تُدمج في طلب واحد (coalesce=True).
+    label: اسم الوحدة لتسجيل توكنز المدخلات والمخرجات.
+
+    يمر عبر circuit breaker النموذج وضمن مهلة المسار الحالي (انظر ai_resilience)،
+    ويرفع CircuitOpenError أو DeadlineExceeded بدلاً من الانتظار.
+
+    Returns:
+        نص الاستجابة
+    """
+    return await on_runtime_loop(
+        _create_chat_completion(messages, model, max_completion_tokens, coalesce, label, **params)
+    )
+
+
+async def _stream_chat_completion(messages: List[Dict], on_delta: Callable[[str], None], model: str, max_completion_tokens: int, label: Optional[str] = None, **params) -> str:
+    runtime = get_runtime()
+    parts = []
+    usage = None
+
+    async def attempt():
+        nonlocal usage
+        async with runtime.get_semaphore():
+            stream = await runtime.get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                max_completion_tokens=max_completion_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                **params
+            )
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+
+    # الأجزاء تُرسل للمتصفح فور وصولها، لذلك لا يمكن إرسال طلب احتياطي (hedge)
+    await guarded_call(model, attempt, hedge=False)
+
+    token_usage.record(label, model, usage)
+    return ''.join(parts)
+
+
+async def astream_chat_completion(messages: List[Dict], on_delta: Callable[[str], None], model: str = "gpt-4o-mini", max_completion_tokens: int = 1500, label: Optional[str] = None, **params) -> str:
+    """
+    إرسال طلب Chat Completion مع البث (stream=True)
+
+    يتم استدعاء on_delta لكل جزء نصي فور وصوله (على حلقة الأحداث الخلفية).
+    طلبات البث لا تُدمج مع غيرها.
+
+    Returns:
+        النص الكامل بعد انتهاء البث
+    """
+    return await on_runtime_loop(
+        _stream_chat_completion(messages, on_delta, model, max_completion_tokens, label, **params)
+    )
+
+
+def get_concurrency_stats() -> Dict:
+    """عدد الطلبات الجارية والحد الأقصى في العامل الحالي"""
+    runtime = _runtime
+    if runtime is None or runtime.pid != os.getpid() or runtime.semaphore is None:
+        return {'max_concurrency': MAX_CONCURRENCY, 'in_flight': 0}
+    return {
+        'max_concurrency': MAX_CONCURRENCY,
+        'in_flight': MAX_CONCURRENCY - runtime.semaphore._value
+    }
+
+
+def get_coalescing_stats() -> Dict:
+    """عدد الطلبات التي تم دمجها مع طلب جارٍ مطابق في العامل الحالي"""
+    runtime = _runtime
+    if runtime is None or runtime.pid != os.getpid():
+        return {'leaders': 0, 'coalesced': 0, 'abandoned': 0, 'in_flight': 0}
+    return runtime.single_flight.get_stats()
+
+
+def get_token_stats() -> Dict:
+    """توكنز المدخلات والمخرجات لكل وحدة في العامل الحالي"""
+    return token_usage.get_stats()
+
+
+def get_pool_stats() -> Dict:
+    """حالة مجمع اتصالات HTTP لعميل AI في العامل الحالي"""
+    runtime = _runtime
+    if runtime is None or runtime.pid != os.getpid():
+        return PoolMetrics().get_stats()
+    return runtime.pool_metrics.get_stats()
@@ -0,0 +1,333 @@
+"""
+AI Resilience - حماية الطلبات إلى OpenAI عند تباطؤ أو تعطل الخدمة
+- Circuit breaker لكل نموذج: بعد عدد من الإخفاقات المتتالية يُرفض أي طلب فوراً
+  (CircuitOpenError) فتعود الدوال إلى ردود default_responses بدون انتظار
+- مهلة نهائية (deadline) لكل مسار تُضبط عند بداية الطلب وتنتقل إلى حلقة أحداث AI
+- Hedged retries: طلب احتياطي عند الفشل المؤقت، أو عند تأخر الردود القصيرة، ضمن المهلة المتبقية
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import openai
+
+
+BREAKER_FAILURES = int(os.environ.get('AI_BREAKER_FAILURES', 5))
+BREAKER_COOLDOWN = float(os.environ.get('AI_BREAKER_COOLDOWN', 30))
+DEFAULT_DEADLINE = float(os.environ.get('AI_DEFAULT_DEADLINE', 45))
+HEDGE_AFTER = float(os.environ.get('AI_HEDGE_AFTER', 12))
+# التوليد الطويل والنماذج البطيئة يتجاوز AI_HEDGE_AFTER عادةً: يُعاد إرساله بعد الفشل فقط
+HEDGE_MAX_TOKENS = int(os.environ.get('AI_HEDGE_MAX_TOKENS', 1000))
+NO_HEDGE_MODELS = frozenset(
+    name.strip() for name in os.environ.get('AI_NO_HEDGE_MODELS', 'gpt-4o').split(',') if name.strip()
+)
+MAX_ATTEMPTS = int(os.environ.get('AI_MAX_ATTEMPTS', 2))
+
+# مهلة كل مسار بالثواني (اسم الـ blueprint أو endpoint)، وما لم يُذكر يأخذ AI_DEFAULT_DEADLINE
+ROUTE_DEADLINES = {
+    'admin.create_article': 120,
+    'admin.bulk_import_notes': 90,
+    'face_analyzer': 40,
+    'scent_dna': 40,
+    'recommendations': 40,
+    'dashboard': 20,
+}
+
+
+def _parse_route_deadlines(value: str) -> Dict[str, float]:
+    """AI_ROUTE_DEADLINES="scent_dna=30,admin.create_article=90" """
+    deadlines = {}
+    for item in value.split(','):
+        name, _, seconds = item.partition('=')
+        if name.strip() and seconds.strip():
+            deadlines[name.strip()] = float(seconds)
+    return deadlines
+
+
+ROUTE_DEADLINES.update(_parse_route_deadlines(os.environ.get('AI_ROUTE_DEADLINES', '')))
+
+
+class CircuitOpenError(Exception):
+    """الـ circuit breaker مفتوح للنموذج - لم يُرسل الطلب"""
+
+
+class DeadlineExceeded(Exception):
+    """انتهت مهلة الطلب الحالي قبل وصول رد من OpenAI"""
+
+
+# إخفاقات الخدمة نفسها (وليست أخطاء الطلب مثل 400) هي التي تفتح الـ breaker وتستحق إعادة المحاولة
+UPSTREAM_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    openai.RateLimitError,
+    asyncio.TimeoutError,
+)
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    return isinstance(error, UPSTREAM_ERRORS + (DeadlineExceeded,))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker لنموذج واحد (closed → open → half_open → closed)
+
+    - closed: الطلبات تمر، وكل إخفاق متتالٍ يُحسب
+    - open: بعد BREAKER_FAILURES إخفاقات متتالية تُرفض الطلبات فوراً لمدة BREAKER_COOLDOWN
+    - half_open: بعد انتهاء المدة يُسمح بطلب تجريبي واحد؛ نجاحه يغلق الـ breaker وفشله يعيد فتحه
+    """
+
+    def __init__(self, model: str, failure_threshold: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def before_call(self):
+        """يرفع CircuitOpenError إذا كان يجب رفض الطلب بدون إرساله"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return
+            if state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"OpenAI ({self.model}) غير متاح مؤقتاً")
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"✅ Circuit breaker [{self.model}]: مغلق (عادت الخدمة)")
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            probe_failed = self._probe_in_flight
+            self._probe_in_flight = False
+            if probe_failed or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                print(f"🔴 Circuit breaker [{self.model}]: مفتوح لمدة {self.cooldown:.0f}s بعد {self._failures} إخفاقات")
+
+    def release(self):
+        """إنهاء طلب بدون حكم على صحة الخدمة (مثلاً أُلغي من المستدعي)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'state': self._state(),
+                'consecutive_failures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(model, CircuitBreaker(model))
+    return breaker
+
+
+def get_breaker_stats() -> Dict:
+    """حالة الـ circuit breaker لكل نموذج في العامل الحالي"""
+    return {model: breaker.get_stats() for model, breaker in list(_breakers.items())}
+
+
+# ═══ المهلة النهائية (deadline) ═══
+#
+# القيمة وقت time.monotonic() المطلق. ContextVar تنتقل تلقائياً مع
+# run_coroutine_threadsafe إلى حلقة أحداث AI، ومنها إلى أي مهمة فرعية.
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('ai_deadline', default=None)
+
+
+def set_deadline(seconds: float, override: bool = False) -> contextvars.Token:
+    """
+    ضبط مهلة نهائية بعد seconds ثانية (لا تتجاوز مهلة أقرب مضبوطة مسبقاً)
+
+    override=True: مهلة مستقلة عن المضبوطة مسبقاً (مثلاً لكل جزء في دفعة طويلة)
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None and not override:
+        deadline = min(deadline, current)
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token: contextvars.Token):
+    _deadline.reset(token)
+
+
+def remaining_time() -> float:
+    """الثواني المتبقية حتى المهلة النهائية (AI_DEFAULT_DEADLINE إذا لم تُضبط)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return DEFAULT_DEADLINE
+    return deadline - time.monotonic()
+
+
+def detached_context() -> contextvars.Context:
+    """
+    نسخة من الـ context الحالي بمهلة مستقلة عن المستدعي (أطول مهلة مسار مضبوطة)،
+    لطلب مشترك بين عدة مستدعين ينتظره كل منهم ضمن مهلته هو
+    """
+    context = contextvars.copy_context()
+    longest = max(DEFAULT_DEADLINE, *ROUTE_DEADLINES.values())
+    context.run(_deadline.set, time.monotonic() + longest)
+    return context
+
+
+def route_deadline(endpoint: Optional[str], blueprint: Optional[str]) -> float:
+    if endpoint and endpoint in ROUTE_DEADLINES:
+        return ROUTE_DEADLINES[endpoint]
+    return ROUTE_DEADLINES.get(blueprint, DEFAULT_DEADLINE)
+
+
+def init_app(app):
+    """ضبط مهلة AI لكل طلب حسب المسار، وإلغاؤها عند انتهاء الطلب"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_ai_deadline():
+        g._ai_deadline_token = set_deadline(route_deadline(request.endpoint, request.blueprint))
+
+    @app.teardown_request
+    def _clear_ai_deadline(exc=None):
+        token = g.pop('_ai_deadline_token', None)
+        if token is not None:
+            try:
+                reset_deadline(token)
+            except ValueError:
+                # teardown في context مختلف (مثلاً بعد بث SSE) - القيمة تنتهي مع الطلب
+                pass
+
+
+# ═══ الاستدعاء المحمي ═══
+
+def hedge_delay(model: str, max_completion_tokens: int) -> Optional[float]:
+    """
+    ثواني الانتظار قبل الطلب الاحتياطي لاستجابة بهذا الحجم، أو None لإعادة المحاولة
+    بعد الفشل فقط (ردود أطول من AI_HEDGE_MAX_TOKENS أو نماذج AI_NO_HEDGE_MODELS)
+    """
+    if HEDGE_AFTER <= 0 or max_completion_tokens > HEDGE_MAX_TOKENS or model in NO_HEDGE_MODELS:
+        return None
+    return HEDGE_AFTER
+
+
+async def guarded_call(model: str, call: Callable[[], Awaitable], hedge: bool = True,
+                       hedge_after: Optional[float] = HEDGE_AFTER):
+    """
+    تنفيذ طلب إلى OpenAI عبر الـ circuit breaker وضمن المهلة المتبقية
+
+    hedge=True: إذا فشل الطلب فشلاً مؤقتاً (timeout، اتصال، 5xx، 429)، أو لم يصل رد
+    خلال hedge_after ثانية (None: بدون انتظار، بعد الفشل فقط)، يُرسل طلب مطابق آخر
+    ويُعتمد أول رد ناجح (حتى AI_MAX_ATTEMPTS محاولات). طلبات البث تُرسل بدون hedge.
+
+    Raises:
+        CircuitOpenError: الـ breaker مفتوح (بدون إرسال أي طلب)
+        DeadlineExceeded: انتهت المهلة قبل وصول رد
+    """
+    timeout = remaining_time()
+    if timeout <= 0:
+        raise DeadlineExceeded("انتهت مهلة الطلب قبل إرسال طلب AI")
+
+    breaker = get_breaker(model)
+    breaker.before_call()
+
+    try:
+        if hedge:
+            result = await _hedged(call, timeout, hedge_after)
+        else:
+            try:
+                result = await asyncio.wait_for(call(), timeout)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(f"لم يصل رد من {model} خلال {timeout:.1f}s") from None
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        if is_upstream_failure(e):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+
+    breaker.record_success()
+    return result
+
+
+async def _hedged(call: Callable[[], Awaitable], timeout: float, hedge_after: Optional[float]):
+    loop = asyncio.get_running_loop()
+    end = loop.time() + timeout
+    pending = set()
+    attempts = 0
+    last_error = None
+    launch = True
+
+    try:
+        while True:
+            if launch and attempts < MAX_ATTEMPTS:
+                pending.add(asyncio.ensure_future(call()))
+                attempts += 1
+            launch = False
+
+            remaining = end - loop.time()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"لم يصل رد خلال {timeout:.1f}s ({attempts} محاولات)")
+
+            wait = remaining
+            if attempts < MAX_ATTEMPTS and hedge_after:
+                wait = min(wait, hedge_after)
+
+            done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                error = task.exception()
+                if error is None:
+                    return task.result()
+                if not isinstance(error, UPSTREAM_ERRORS):
+                    raise error
+                last_error = error
+
+            if not pending and attempts >= MAX_ATTEMPTS:
+                raise last_error
+
+            # المحاولة التالية: إما لأن السابقة فشلت أو لأنها تأخرت أكثر من hedge_after
+            launch = not pending or not done
+    finally:
+        for task in pending:
+            task.cancel()
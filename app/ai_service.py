@@ -1,33 +1,18 @@
 import json
 import os
-from openai import OpenAI
 from flask_login import current_user
-from app.rag_service import get_kb, get_rag_context, get_notes_by_family, get_similar_notes
+from app.rag_service import get_kb, get_rag_context
 from app.notes_retriever import retrieve_notes, get_note_context as get_retriever_context, hybrid_retrieve, retrieve_notes_by_family, retrieve_notes_by_role
 from app.rag_engine import rag_run, get_rag_engine, RAGResult
 from app.validators.rag_validation import validate_and_sanitize, RAGValidator
 from app.constants.default_responses import get_default_response, get_safe_fallback, VALIDATION_FAILED_RESPONSE
-
-# تهيئة العميل
-def get_openai_client():
-    api_key = os.environ.get("OPENAI_API_KEY") or os.environ.get("AI_INTEGRATIONS_OPENAI_API_KEY")
-    base_url = os.environ.get("AI_INTEGRATIONS_OPENAI_BASE_URL")
-    
-    if not api_key:
-        # إذا لم يتم العثور على مفتاح، سنحاول القراءة من ملف .env مباشرة للطوارئ
-        try:
-            from dotenv import load_dotenv
-            load_dotenv()
-            api_key = os.environ.get("OPENAI_API_KEY") or os.environ.get("AI_INTEGRATIONS_OPENAI_API_KEY")
-        except:
-            pass
-            
-    return OpenAI(
-        api_key=api_key or "temporary_key_to_prevent_boot_error",
-        base_url=base_url
-    )
-
-client = get_openai_client()
+from app.ai_cache import get_response_cache, make_cache_key
+from app.ai_client import acreate_chat_completion, astream_chat_completion, run_sync, get_openai_client, token_usage
+from app.ai_resilience import set_deadline, reset_deadline
+from app.json_stream import JSONFieldStream, JSONExtractError, extract_json
+from app.prompts import render_prompt, Items, Variants
+from app.ai_batch import split_text_chunks, run_batch
+from app.constants.prompts import PROFILE_CONTEXT, REAL_PRODUCTS_WEB_DATA, DAILY_SUGGESTION_SOURCES
 
 MODULE_INFO = {
     'bio_scent': {'name_ar': 'تحليل الرائحة الحيوية', 'icon': 'bi-soundwave'},
@@ -51,18 +36,28 @@ MODULE_INFO = {
     'face_analyzer': {'name_ar': 'محلل العطر بالوجه', 'icon': 'bi-camera'}
 }
 
-def save_analysis_result(module_type, input_data, result_data):
-    """Save analysis result to database for the current user."""
+# قيم _mode للردود الافتراضية (لم يصل تحليل فعلي من AI): تُعرض كخطأ ولا تُحفظ كنتيجة للمستخدم
+FALLBACK_MODES = ('fallback_safe', 'error_fallback')
+
+
+def is_fallback(result) -> bool:
+    return isinstance(result, dict) and result.get('_mode') in FALLBACK_MODES
+
+
+def save_analysis_result(module_type, input_data, result_data, user_id=None):
+    """Save analysis result to database for the current user (or user_id from a background job)."""
     from app import db
     from app.models import AnalysisResult
     
-    if not current_user.is_authenticated:
-        return None
+    if user_id is None:
+        if not current_user.is_authenticated:
+            return None
+        user_id = current_user.id
     
     module_info = MODULE_INFO.get(module_type, {'name_ar': module_type, 'icon': 'bi-star'})
     
     analysis = AnalysisResult(
-        user_id=current_user.id,
+        user_id=user_id,
         module_type=module_type,
         module_name_ar=module_info['name_ar'],
         module_icon=module_info['icon'],
@@ -109,6 +104,34 @@ def get_rag_context_for_ai(query: str, top_k: int = 5, filters: dict = None, mod
         return "", RAGResult(is_valid=False, debug_info={'error': str(e)})
 
 
+def rag_context_field(rag_context: str, rag_result: RAGResult, module_type: str, min_notes: int = 3):
+    """
+    سياق RAG كجزء مرن في البرومبت: يُعاد توليده بعدد أقل من النوتات
+    (الأقل تطابقاً أولاً) إذا تجاوز البرومبت ميزانية التوكنز
+    """
+    if not rag_result.is_valid or not rag_result.notes:
+        return rag_context
+    engine = get_rag_engine()
+    return Items(rag_result.notes, render=lambda notes: engine.build_context(notes, module_type), min_items=min_notes)
+
+
+def format_profile_context(scent_profile) -> str:
+    """ملخص الملف العطري السابق للمستخدم (أو نص فارغ)"""
+    if not scent_profile:
+        return ""
+    return PROFILE_CONTEXT.format(
+        scent_personality=scent_profile.scent_personality or 'غير محدد',
+        favorite_notes=scent_profile.favorite_notes or 'غير محدد',
+        disliked_notes=scent_profile.disliked_notes or 'غير محدد'
+    )
+
+
+def _profile_fields(profile_data) -> dict:
+    """حقول بيانات المستخدم في قوالب Scent DNA"""
+    keys = ('gender', 'age_range', 'personality_type', 'favorite_notes', 'disliked_notes', 'climate', 'skin_type')
+    return {key: profile_data.get(key, 'غير محدد') for key in keys}
+
+
 def validate_ai_output(response: dict, rag_result: RAGResult, module_type: str, strict: bool = True) -> dict:
     """
     التحقق من صحة مخرجات AI مقابل قاعدة المعرفة
@@ -141,64 +164,92 @@ def validate_ai_output(response: dict, rag_result: RAGResult, module_type: str,
 
 
 def parse_ai_response(content):
-    """Safely parse AI response content, handling None and malformed JSON."""
+    """
+    Safely parse AI response content, handling None and malformed JSON.
+
+    يستخرج أول كائن JSON متوازن في مرور واحد (يتجاهل ```json والنص قبله وبعده،
+    بما فيه قوائم بين أقواس مثل "[1]"). كل الوحدات تتوقع كائناً. لمعرفة موضع الخطأ
+    استخدم json_stream.extract_json.
+    """
     if content is None:
         return None
     
-    result = content.strip()
-    
-    # Try to extract JSON from code blocks first
-    if result.startswith("```"):
-        parts = result.split("```")
-        if len(parts) > 1:
-            result = parts[1]
-            if result.startswith("json"):
-                result = result[4:]
-    
-    result = result.strip()
-    
-    # Try to parse the result as JSON
     try:
-        return json.loads(result)
-    except json.JSONDecodeError:
-        pass
-    
-    # If that fails, try to extract JSON from the text
-    # Find the first { and last } and try to parse that
-    try:
-        start_idx = result.find('{')
-        end_idx = result.rfind('}')
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            json_str = result[start_idx:end_idx + 1]
-            return json.loads(json_str)
-    except json.JSONDecodeError:
-        pass
-    
-    # If still failing, try to find [ and ] for arrays
-    try:
-        start_idx = result.find('[')
-        end_idx = result.rfind(']')
-        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-            json_str = result[start_idx:end_idx + 1]
-            return json.loads(json_str)
-    except json.JSONDecodeError:
-        pass
-    
-    return None
+        return extract_json(content, expect=dict)
+    except JSONExtractError:
+        return None
 
-def get_ai_response(prompt, system_message="أنت خبير عطور محترف. أجب دائمًا بصيغة JSON فقط."):
+async def achat_completion(prompt, system_message=None, model="gpt-4o-mini", max_completion_tokens=1500, use_cache=True, on_field=None, label=None, **params):
+    """
+    تنفيذ طلب Chat Completion (غير متزامن) مع كاش الاستجابات
+
+    المفتاح هو بصمة (model, system_message, prompt, max_completion_tokens, params).
+    يتم تخزين الاستجابات التي يمكن تحليلها كـ JSON فقط حتى لا يُعاد استخدام رد تالف.
+
+    Args:
+        on_field: عند تمريره يتم بث الاستجابة (stream=True) واستدعاؤه بـ (key, value)
+                  لكل حقل في المستوى الأعلى من JSON بمجرد اكتماله
+        label: اسم القالب/الوحدة لتسجيل توكنز المدخلات والمخرجات
+
+    Returns:
+        نص الاستجابة كما أعاده النموذج
+    """
+    cache = get_response_cache() if use_cache else None
+    cache_key = None
+
+    if cache is not None:
+        cache_key = make_cache_key(model, system_message, prompt, max_completion_tokens, **params)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            token_usage.record(label, model, cached=True)
+            if on_field is not None:
+                for key, value in JSONFieldStream().feed(cached):
+                    on_field(key, value)
+            return cached
+
+    messages = []
+    if system_message is not None:
+        messages.append({"role": "system", "content": system_message})
+    messages.append({"role": "user", "content": prompt})
+
+    if on_field is None:
+        content = await acreate_chat_completion(
+            messages,
+            model=model,
+            max_completion_tokens=max_completion_tokens,
+            coalesce=use_cache,
+            label=label,
+            **params
+        )
+    else:
+        fields = JSONFieldStream()
+
+        def on_delta(delta):
+            for key, value in fields.feed(delta):
+                on_field(key, value)
+
+        content = await astream_chat_completion(
+            messages,
+            on_delta,
+            model=model,
+            max_completion_tokens=max_completion_tokens,
+            label=label,
+            **params
+        )
+
+    if cache is not None and parse_ai_response(content) is not None:
+        cache.set(cache_key, content)
+
+    return content
+
+def chat_completion(prompt, system_message=None, model="gpt-4o-mini", max_completion_tokens=1500, use_cache=True, label=None, **params):
+    """الواجهة المتزامنة لـ achat_completion"""
+    return run_sync(achat_completion(prompt, system_message, model, max_completion_tokens, use_cache, label=label, **params))
+
+async def aget_ai_response(prompt, system_message="أنت خبير عطور محترف. أجب دائمًا بصيغة JSON فقط."):
     """Generic AI response function for all modules."""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            max_completion_tokens=1500
-        )
-        
-        content = response.choices[0].message.content
+        content = await achat_completion(prompt, system_message, max_completion_tokens=1500)
         parsed = parse_ai_response(content)
         
         if parsed is None:
@@ -208,8 +259,30 @@ def get_ai_response(prompt, system_message="أنت خبير عطور محترف.
     except Exception as e:
         return {"error": str(e)}
 
-def generate_scent_dna_analysis(profile_data, debug: bool = None):
-    """تحليل DNA العطري - يحاول أولاً قاعدة المعرفة، ثم يعتمد على خبرة AI العامة"""
+def get_ai_response(prompt, system_message="أنت خبير عطور محترف. أجب دائمًا بصيغة JSON فقط."):
+    """الواجهة المتزامنة لـ aget_ai_response"""
+    return run_sync(aget_ai_response(prompt, system_message))
+
+
+def reset_streamed_fields(on_field):
+    """إبلاغ مستقبل الحقول المبثوثة بإهمالها قبل محاولة بديلة (on_field.reset إن وُجدت)"""
+    reset = getattr(on_field, 'reset', None)
+    if reset is not None:
+        reset()
+
+
+async def agenerate_scent_dna_analysis(profile_data, debug: bool = None, on_field=None):
+    """تحليل DNA العطري - يحاول أولاً قاعدة المعرفة، ثم يعتمد على خبرة AI العامة
+
+    on_field: اختياري لبث حقول التحليل فور اكتمالها (انظر achat_completion). إذا بُثت
+    حقول من قاعدة المعرفة ثم فشلت تلك المحاولة تُهمل (reset_streamed_fields) قبل بث الاحتياطية
+    """
+    kb_streamed = False
+
+    def on_kb_field(key, value):
+        nonlocal kb_streamed
+        kb_streamed = True
+        on_field(key, value)
     
     query = f"{profile_data.get('gender', '')} {profile_data.get('personality_type', '')} {profile_data.get('favorite_notes', '')}"
     rag_context, rag_result = get_rag_context_for_ai(query, top_k=8, module_type='scent_dna', debug=debug)
@@ -230,93 +303,26 @@ def generate_scent_dna_analysis(profile_data, debug: bool = None):
             if n.get('profile'):
                 detail += f" - وصف: {n.get('profile')}"
             notes_details.append(detail)
-        notes_details_text = '\n'.join(notes_details)
         
-        prompt = f"""أنت خبير محلل عطور متخصص. مهمتك تقديم تحليل DNA عطري دقيق وشامل للمستخدم.
-
-═══════════════════════════════════════════════════════════
-📚 قاعدة المعرفة - المصدر الأساسي:
-═══════════════════════════════════════════════════════════
-
-📋 النوتات المتاحة (استخدم من هذه القائمة بالأولوية):
-{notes_details_text}
-
-📋 العائلات المتاحة:
-{families_list}
-
-═══════════════════════════════════════════════════════════
-👤 بيانات المستخدم (اسس عليها التحليل):
-═══════════════════════════════════════════════════════════
-- الجنس: {profile_data.get('gender', 'غير محدد')}
-- الفئة العمرية: {profile_data.get('age_range', 'غير محدد')}
-- نوع الشخصية: {profile_data.get('personality_type', 'غير محدد')}
-- النوتات المفضلة: {profile_data.get('favorite_notes', 'غير محدد')}
-- النوتات المكروهة: {profile_data.get('disliked_notes', 'غير محدد')}
-- المناخ: {profile_data.get('climate', 'غير محدد')}
-- نوع البشرة: {profile_data.get('skin_type', 'غير محدد')}
-
-═══════════════════════════════════════════════════════════
-📋 متطلبات التحليل المفصل:
-═══════════════════════════════════════════════════════════
-اكتب تحليلاً متعمقاً وشاملاً يتضمن:
-1. تعريف دقيق لشخصية المستخدم العطرية
-2. شرح العلاقة بين البيانات الشخصية (الجنس، الشخصية، البشرة) والملف العطري
-3. تبرير اختيار كل نوتة ولماذا تناسب المستخدم
-4. تحليل كيمياء البشرة وتأثيرها على العطور
-5. توصيات مفصلة حسب المناخ والمواسم
-6. نقاط قوة الملف العطري وخصائصه المميزة
-7. نصائح عملية للاستخدام الأمثل
-
-قدم الإجابة بصيغة JSON مع تفاصيل شاملة:
-{{
-    "scent_personality": "اسم وصفي دقيق للشخصية العطرية",
-    "personality_description": "وصف تفصيلي (3-5 جمل) يشرح الشخصية العطرية بعمق",
-    "dna_characteristics": {{
-        "primary_trait": "الخاصية الأساسية (مثل: الأنوثة الناعمة، الثقة الجريئة)",
-        "secondary_traits": ["صفة 1", "صفة 2", "صفة 3"],
-        "emotional_signature": "الصفة العاطفية للملف العطري",
-        "intensity_level": "مستوى الشدة (خفيف/معتدل/قوي)"
-    }},
-    "recommended_families": ["عائلة 1 مع سبب الاختيار", "عائلة 2 مع سبب الاختيار"],
-    "ideal_notes": {{
-        "top_notes": ["نوتة 1 - السبب", "نوتة 2 - السبب"],
-        "heart_notes": ["نوتة 1 - السبب", "نوتة 2 - السبب"],
-        "base_notes": ["نوتة 1 - السبب", "نوتة 2 - السبب"]
-    }},
-    "notes_to_avoid": "نص واضح يصف النوتات التي يجب تجنبها مع الأسباب العلمية (مثال: يُفضل تجنب النوتة X لأن... و النوتة Y لأن...)",
-    "skin_chemistry_analysis": "شرح تفصيلي لكيف ستتفاعل العطور مع بشرة المستخدم",
-    "seasonal_recommendations": {{
-        "spring": "توصيات الربيع المفصلة",
-        "summer": "توصيات الصيف المفصلة",
-        "fall": "توصيات الخريف المفصلة",
-        "winter": "توصيات الشتاء المفصلة"
-    }},
-    "occasion_guide": {{
-        "daily": "عطور اليوميات المناسبة",
-        "work": "عطور العمل الاحترافية",
-        "evening": "عطور السهرات الفاخرة",
-        "special": "عطور المناسبات الخاصة"
-    }},
-    "fragrance_journey": "وصف رحلة العطر على البشرة (الفتح، الوسط، الختام)",
-    "usage_tips": ["نصيحة 1 للاستخدام الأمثل", "نصيحة 2", "نصيحة 3"],
-    "overall_analysis": "تحليل شامل وعميق (5-7 جمل) يربط كل العناصر السابقة"
-}}"""
+        rendered = render_prompt(
+            'scent_dna_kb',
+            notes_details=Items(notes_details, min_items=3),
+            families_list=families_list,
+            notes_list=notes_list_ar,
+            **_profile_fields(profile_data)
+        )
 
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": f"""أنت محلل عطور متخصص. استخدم قاعدة المعرفة بالأولوية:
-النوتات المتاحة: [{notes_list_ar}]
-العائلات المتاحة: [{families_list}]
-
-إذا لم تجد نوتة في القائمة، جرب بدائل من القائمة المتاحة. أجب بصيغة JSON فقط."""},
-                    {"role": "user", "content": prompt}
-                ],
-                max_completion_tokens=2000
+            # تحليل شخصي يُحفظ لكل مستخدم: بدون كاش الاستجابات
+            content = await achat_completion(
+                rendered.prompt,
+                rendered.system,
+                max_completion_tokens=2000,
+                use_cache=False,
+                on_field=on_kb_field if on_field is not None else None,
+                label='scent_dna_kb'
             )
-            
-            content = response.choices[0].message.content
+
             parsed = parse_ai_response(content)
             
             if parsed is not None:
@@ -336,93 +342,21 @@ def generate_scent_dna_analysis(profile_data, debug: bool = None):
     
     # خطة احتياطية: استخدام خبرة AI العامة (وضع خفيف)
     print("📌 الانتقال إلى وضع AI العام لعدم توفر بيانات كافية في قاعدة المعرفة")
+    if kb_streamed:
+        reset_streamed_fields(on_field)
     
-    prompt_ai_mode = f"""أنت خبير عطور متخصص بخبرة عميقة. مهمتك تقديم تحليل Scent DNA شامل وعميق للمستخدم.
-
-═══════════════════════════════════════════════════════════
-👤 بيانات المستخدم (اسس عليها التحليل):
-═══════════════════════════════════════════════════════════
-- الجنس: {profile_data.get('gender', 'غير محدد')}
-- الفئة العمرية: {profile_data.get('age_range', 'غير محدد')}
-- نوع الشخصية: {profile_data.get('personality_type', 'غير محدد')}
-- النوتات المفضلة: {profile_data.get('favorite_notes', 'غير محدد')}
-- النوتات المكروهة: {profile_data.get('disliked_notes', 'غير محدد')}
-- المناخ: {profile_data.get('climate', 'غير محدد')}
-- نوع البشرة: {profile_data.get('skin_type', 'غير محدد')}
-
-═══════════════════════════════════════════════════════════
-📋 متطلبات التحليل المتقدم:
-═══════════════════════════════════════════════════════════
-اكتب تحليلاً متعمقاً وشاملاً يتضمن:
-1. تعريف شامل وفريد للشخصية العطرية
-2. تحليل العلاقة بين السمات الشخصية والملف العطري
-3. تفسير علمي لاختيار كل عائلة ونوتة
-4. تحليل تفصيلي لكيمياء البشرة وتأثيرها
-5. توصيات مفصلة حسب جميع المواسم
-6. دليل شامل للاستخدام حسب المناسبات
-7. وصف رحلة العطر على البشرة
-8. نصائح عملية احترافية
-
-قدم الإجابة بصيغة JSON شاملة:
-{{
-    "scent_personality": "اسم وصفي دقيق وفريد للشخصية العطرية",
-    "personality_description": "وصف تفصيلي (4-6 جمل) يكشف عمق الشخصية العطرية",
-    "dna_characteristics": {{
-        "primary_trait": "الخاصية الأساسية المميزة",
-        "secondary_traits": ["صفة 1", "صفة 2", "صفة 3", "صفة 4"],
-        "emotional_signature": "الطابع العاطفي الفريد للملف",
-        "intensity_level": "مستوى الشدة الموصى به",
-        "character_essence": "جوهر الشخصية في جملة واحدة"
-    }},
-    "recommended_families": [
-        {{"family": "اسم العائلة", "reason": "السبب التفصيلي للتوصية", "intensity": "معتدل/قوي/خفيف"}}
-    ],
-    "ideal_notes": {{
-        "top_notes": ["نوتة 1 - (السبب العلمي)", "نوتة 2 - (السبب العلمي)"],
-        "heart_notes": ["نوتة 1 - (السبب العلمي)", "نوتة 2 - (السبب العلمي)"],
-        "base_notes": ["نوتة 1 - (السبب العلمي)", "نوتة 2 - (السبب العلمي)"]
-    }},
-    "notes_to_avoid": "نص واضح ومفصل يصف النوتات التي يُفضل تجنبها مع الأسباب العلمية الدقيقة",
-    "skin_chemistry_analysis": "تحليل متقدم لكيفية تفاعل العطور مع البشرة (تأثر بـ: نوع البشرة، الحموضة، الزيوت)",
-    "seasonal_recommendations": {{
-        "spring": "عطور الربيع المناسبة مع التفاصيل",
-        "summer": "عطور الصيف الخفيفة مع النصائح",
-        "fall": "عطور الخريف الدافئة مع الأسباب",
-        "winter": "عطور الشتاء الفاخرة مع التوصيات"
-    }},
-    "occasion_guide": {{
-        "daily": "خيارات يومية عملية ومريحة",
-        "work": "عطور احترافية للعمل (محترمة، واثقة)",
-        "evening": "عطور السهرات والحفلات (جريئة، رومانسية)",
-        "special": "عطور المناسبات الخاصة (فاخرة، تأثيرية)"
-    }},
-    "fragrance_journey": "شرح تفصيلي لرحلة العطر: (الافتتاحية - الملاحظات العليا - التطور - الختام)",
-    "performance_metrics": {{
-        "longevity": "المدة المتوقعة (ساعات)",
-        "sillage": "مدى الانتشار (خافت/متوسط/قوي)",
-        "projection": "قوة التأثير"
-    }},
-    "usage_tips": [
-        "نصيحة 1 للاستخدام الأمثل",
-        "نصيحة 2 لتعزيز البقاء",
-        "نصيحة 3 لتحسين التجربة",
-        "نصيحة 4 احترافية"
-    ],
-    "complementary_products": "منتجات إضافية (مثل العطور الأخرى المتناسبة)",
-    "overall_analysis": "تحليل شامل وعميق (6-8 جمل) يربط كل العناصر ويصف الملف العطري الفريد"
-}}"""
+    rendered = render_prompt('scent_dna_ai', **_profile_fields(profile_data))
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "أنت خبير عطور محترف بخبرة عميقة. قدم تحليل DNA عطري متقدم بناءً على بيانات المستخدم. أجب بصيغة JSON فقط."},
-                {"role": "user", "content": prompt_ai_mode}
-            ],
-            max_completion_tokens=2000
+        content = await achat_completion(
+            rendered.prompt,
+            rendered.system,
+            max_completion_tokens=2000,
+            use_cache=False,
+            on_field=on_field,
+            label='scent_dna_ai'
         )
-        
-        content = response.choices[0].message.content
+
         parsed = parse_ai_response(content)
         
         if parsed is not None:
@@ -444,17 +378,15 @@ def generate_scent_dna_analysis(profile_data, debug: bool = None):
         fallback['_mode'] = 'error_fallback'
         return fallback
 
-def generate_custom_perfume(perfume_data, scent_profile=None, debug: bool = None):
+def generate_scent_dna_analysis(profile_data, debug: bool = None):
+    """الواجهة المتزامنة لـ agenerate_scent_dna_analysis"""
+    return run_sync(agenerate_scent_dna_analysis(profile_data, debug))
+
+
+async def agenerate_custom_perfume(perfume_data, scent_profile=None, debug: bool = None):
     """تصميم عطر مخصص باستخدام RAG كمصدر وحيد للحقيقة"""
     
-    profile_context = ""
-    if scent_profile:
-        profile_context = f"""
-معلومات الملف العطري السابق:
-- الشخصية العطرية: {scent_profile.scent_personality or 'غير محدد'}
-- النوتات المفضلة: {scent_profile.favorite_notes or 'غير محدد'}
-- النوتات المكروهة: {scent_profile.disliked_notes or 'غير محدد'}
-"""
+    profile_context = format_profile_context(scent_profile)
     
     query = f"{perfume_data.get('occasion', '')} {perfume_data.get('intensity', '')}"
     rag_context, rag_result = get_rag_context_for_ai(query, top_k=8, module_type='custom_perfume', debug=debug)
@@ -469,49 +401,29 @@ def generate_custom_perfume(perfume_data, scent_profile=None, debug: bool = None
     base_notes = [n.get('arabic', n.get('note', '')) for n in rag_result.notes if n.get('role', '').lower() == 'base']
     all_notes = [n.get('arabic', n.get('note', '')) for n in rag_result.notes]
 
-    prompt = f"""أنت صانع عطور محترف (Perfumer). قم بتصميم عطر شخصي فريد بناءً على المتطلبات التالية:
-
-{rag_context}
-
-⚠️ قواعد صارمة - يجب الالتزام بها:
-1. استخدم فقط النوتات العلوية المتاحة: {', '.join(top_notes) if top_notes else 'اختر من النوتات العامة'}
-2. استخدم فقط النوتات الوسطى المتاحة: {', '.join(heart_notes) if heart_notes else 'اختر من النوتات العامة'}
-3. استخدم فقط النوتات القاعدية المتاحة: {', '.join(base_notes) if base_notes else 'اختر من النوتات العامة'}
-4. جميع النوتات المتاحة: {', '.join(all_notes)}
-5. لا تذكر أي نوتة غير موجودة في القوائم أعلاه
-
-متطلبات العطر:
-- مناسبة الاستخدام: {perfume_data.get('occasion', 'يومي')}
-- درجة الثبات المطلوبة: {perfume_data.get('intensity', 'متوسط')}
-- الميزانية: {perfume_data.get('budget', 'متوسطة')}
-{profile_context}
-
-صمم عطرًا فريدًا وقدم الإجابة بصيغة JSON فقط:
-{{
-    "name": "اسم العطر المقترح (اسم إبداعي وجذاب)",
-    "name_meaning": "معنى الاسم",
-    "top_notes": ["نوتة علوية من القائمة المتاحة فقط"],
-    "heart_notes": ["نوتة وسطى من القائمة المتاحة فقط"],
-    "base_notes": ["نوتة قاعدية من القائمة المتاحة فقط"],
-    "description": "وصف تسويقي جذاب للعطر في 3-4 جمل",
-    "match_score": 92,
-    "usage_recommendations": "توصيات الاستخدام المثالية",
-    "longevity": "مدة الثبات المتوقعة",
-    "sillage": "قوة الانتشار (خفيف/متوسط/قوي)",
-    "best_seasons": ["الموسم 1", "الموسم 2"]
-}}"""
+    rendered = render_prompt(
+        'custom_perfume',
+        rag_context=rag_context_field(rag_context, rag_result, 'custom_perfume'),
+        top_notes=', '.join(top_notes) if top_notes else 'اختر من النوتات العامة',
+        heart_notes=', '.join(heart_notes) if heart_notes else 'اختر من النوتات العامة',
+        base_notes=', '.join(base_notes) if base_notes else 'اختر من النوتات العامة',
+        all_notes=', '.join(all_notes),
+        occasion=perfume_data.get('occasion', 'يومي'),
+        intensity=perfume_data.get('intensity', 'متوسط'),
+        budget=perfume_data.get('budget', 'متوسطة'),
+        profile_context=profile_context
+    )
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "أنت صانع عطور محترف. استخدم فقط النوتات المذكورة في السياق. لا تخترع أي نوتة جديدة. أجب بصيغة JSON فقط."},
-                {"role": "user", "content": prompt}
-            ],
-            max_completion_tokens=1000
+        # تصميم شخصي يُحفظ لكل مستخدم: بدون كاش الاستجابات
+        content = await achat_completion(
+            rendered.prompt,
+            rendered.system,
+            max_completion_tokens=1000,
+            use_cache=False,
+            label='custom_perfume'
         )
-        
-        content = response.choices[0].message.content
+
         parsed = parse_ai_response(content)
         
         if parsed is None:
@@ -529,6 +441,11 @@ def generate_custom_perfume(perfume_data, scent_profile=None, debug: bool = None
         fallback['error'] = str(e)
         return fallback
 
+def generate_custom_perfume(perfume_data, scent_profile=None, debug: bool = None):
+    """الواجهة المتزامنة لـ agenerate_custom_perfume"""
+    return run_sync(agenerate_custom_perfume(perfume_data, scent_profile, debug))
+
+
 def search_real_perfume_products(search_query, category="all", price_range="all", web_search_results=None):
     """Search for real perfume products from online stores using AI with web search data."""
     
@@ -555,62 +472,29 @@ def search_real_perfume_products(search_query, category="all", price_range="all"
 
     web_data_context = ""
     if web_search_results:
-        web_data_context = f"""
-REAL PRODUCT DATA FROM WEB SEARCH:
-{web_search_results}
-
-Extract ONLY products that appear in the search results above. Use the exact URLs, prices, and product names from the search data.
-"""
-
-    prompt = f"""You are a perfume shopping assistant. Based on the web search results provided, extract and structure real perfume products.
-
-User is searching for: "{search_query}"
-{category_context}
-{price_context}
-{web_data_context}
-
-CRITICAL INSTRUCTIONS:
-1. ONLY use products that appear in the web search results
-2. Use EXACT URLs from the search results - do not modify or fabricate URLs
-3. Use EXACT prices shown in the search results
-4. If a product doesn't have a clear purchase URL, skip it
-
-Return ONLY valid JSON with this structure:
-{{
-    "products": [
-        {{
-            "name": "Exact product name from search",
-            "brand": "Brand name",
-            "category": "Category in Arabic (زيوت/نوتات/عبوات/عطور نسائية/عطور رجالية/عطور يونيسكس)",
-            "price": "$XX.XX (exact price from search)",
-            "original_price": "$XX.XX or null",
-            "concentration": "EDP/EDT/Parfum/Oil",
-            "size": "50ml/100ml etc",
-            "description": "Brief Arabic description",
-            "main_notes": "Notes if available",
-            "store_name": "Store name from URL",
-            "store_url": "EXACT URL from search results",
-            "rating": 4.5,
-            "image_placeholder": "emoji"
-        }}
-    ],
-    "search_summary": "Arabic summary of real results found",
-    "data_source": "web_search"
-}}
-
-If no valid products found in search results, return empty products array."""
+        # نتائج البحث مرتبة حسب الصلة، تُقص من النهاية عند تجاوز الميزانية
+        results = web_search_results if isinstance(web_search_results, list) else str(web_search_results).split('\n')
+        web_data_context = Items(
+            results,
+            render=lambda rows: REAL_PRODUCTS_WEB_DATA.format(web_search_results='\n'.join(str(r) for r in rows))
+        )
+
+    rendered = render_prompt(
+        'real_products',
+        search_query=search_query,
+        category_context=category_context,
+        price_context=price_context,
+        web_data_context=web_data_context
+    )
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a perfume product data extractor. Extract ONLY real products from the provided web search data. Never fabricate URLs or prices."},
-                {"role": "user", "content": prompt}
-            ],
-            max_completion_tokens=2500
+        content = chat_completion(
+            rendered.prompt,
+            rendered.system,
+            max_completion_tokens=2500,
+            label='real_products'
         )
-        
-        content = response.choices[0].message.content
+
         parsed = parse_ai_response(content)
         
         if parsed is None:
@@ -621,15 +505,8 @@ If no valid products found in search results, return empty products array."""
         return {"products": [], "search_summary": f"حدث خطأ: {str(e)}", "error": str(e), "data_source": "error"}
 
 
-def generate_recommendations(query, scent_profile=None, products=None):
-    profile_context = ""
-    if scent_profile:
-        profile_context = f"""
-معلومات الملف العطري السابق:
-- الشخصية العطرية: {scent_profile.scent_personality or 'غير محدد'}
-- النوتات المفضلة: {scent_profile.favorite_notes or 'غير محدد'}
-- النوتات المكروهة: {scent_profile.disliked_notes or 'غير محدد'}
-"""
+async def agenerate_recommendations(query, scent_profile=None, products=None):
+    profile_context = format_profile_context(scent_profile)
     
     # 🔍 RAG Enhancement - Retrieve relevant notes from knowledge base
     rag_context, rag_result = get_rag_context_for_ai(query, top_k=10, module_type='recommendations')
@@ -637,122 +514,12 @@ def generate_recommendations(query, scent_profile=None, products=None):
     if not rag_result.is_valid:
         return get_default_response('recommendations')
 
-    prompt = f"""أنت خبير عطور محترف ومحلّل روائح متخصص.
-
-{rag_context}
-
-مهمتك هي تحديد العطور التي تطابق وصف المستخدم بأعلى دقة ممكنة.
-التركيز الأساسي: روح العطر (DNA) وليس مجرد تطابق النوتات.
-
-معايير الاختيار الصارمة:
-1. ركّز على DNA العطر: "لا تعتمد على مجرد تشابه النوتات. ركّز على الـDNA الحقيقي للعطر وأسلوبه العام وطابعه الرئيسي (مثل: بحري، بخوري، دخاني، فاكهي، بودري، نظيف…)."
-
-2. عائلات العطور: "إذا كان الوصف بخوري–بحري فلا يُسمح باختيار عطور شرقية ثقيلة، ولا عطور بودرية، ولا عطور فاكهية–دخانية."
-
-3. الأسلوب العام: "استبعد العطور التي تختلف في الأسلوب العام حتى لو تشابهت في بعض النوتات. الأسلوب أهم من المكونات."
-
-4. التطابق مع 6 عوامل أساسية (لا تعتمد عنصراً واحداً فقط):
-   أ) النوتات (Top/Heart/Base)
-   ب) العائلة العطرية
-   ج) الأسلوب العام (بحري، حار، ناعم، حاد، بخوري، إلخ)
-   د) الطابع والشخصية (رسمي، شبابي، فاخر، رومانسي، رياضي، إلخ)
-   هـ) قوة الفوحان والثبات
-   و) المزاج الكلي والأجواء المناسبة
-
-5. التطابق الكامل: "لا تُظهر أي عطر لا يتوافق مع: نوع الاستخدام + مزاج العطر + الأجواء المناسبة + شخصية العطر."
-
-6. الجو العام: "أي عطر لا يطابق الجو العام للوصف (النظافة – البخور – النضارة – الرسمية – الأناقة) يجب استبعاده فورًا."
-
-7. تصحيح الانحياز: "لا تقم باختيار عطور niche أو عطور فاخرة جداً إلا إذا كان الوصف يشير صراحة إلى ذلك. التزم بالعائلة والمنطق قبل الشهرة."
-
-8. نسب التطابق: "إذا لم تكن نسبة التطابق عالية جداً (أقل من 80%) فلا تضع العطر في المركز الأول."
-9. "يجب ربط الوصف بالعائلة العطرية الدقيقة مثل (Aromatic Aquatic Incense) وليس العائلة العامة فقط مثل Woody أو Fresh. أي اختلاف في العائلة الدقيقة يعني استبعاد العطر مباشرة."
-10. "يجب مطابقة الطابع العمري والذكوري/الرسمي للعطر. إذا كان الوصف ناضجًا، رسميًا، فاخرًا، فلا يُسمح باختيار عطر شبابي أو حلو أو فاكهي أو بودري."
-11."إذا ذكر المستخدم كلمة (بخور أو Incense) فلا يُسمح باختيار عطر لا يحتوي رسميًا على نوتة البخور ضمن مكوناته الأساسية."
-خطوات العمل:
-1) استخرج من الوصف:
-   - النوتات (إن وجدت)
-   - العائلة المطلوبة
-   - الأسلوب والطابع
-   - نوع الاستخدام
-   - المزاج والأجواء
-   - الجو العام (النظافة، البخور، الدفء، البرودة، إلخ)
-
-2) قارن بـ 6 عوامل (ليس نوتة واحدة):
-   - هل العائلة تطابق؟
-   - هل الأسلوب يطابق؟
-   - هل الطابع يطابق؟
-   - هل الاستخدام يطابق؟
-   - هل المزاج يطابق؟
-   - هل النوتات تدعم بقية العوامل؟
-
-3) اختر 3 عطور فقط بنسبة تطابق عالية جداً (85% فأعلى للمركز الأول):
-   - اشرح التطابق بناءً على 6 عوامل
-   - أظهر النوتات الفعلية
-   - اشرح لماذا يطابق الـ DNA
-
-4) استبعد بوضوح:
-   - عطور من عائلات مختلفة
-   - عطور بأسلوب عام مختلف
-   - عطور لا تتطابق مع الاستخدام/المزاج
-   - عطور niche بدون إشارة واضحة
-   - عطور بنسبة تطابق منخفضة
-
-وصف المستخدم:
-"{query}"
-{profile_context}
-
-قدم الإجابة بصيغة JSON فقط:
-{{
-    "scent_analysis": {{
-        "top_notes_requested": ["نوتة 1", "نوتة 2"],
-        "heart_notes_requested": ["نوتة 1", "نوتة 2"],
-        "base_notes_requested": ["نوتة 1", "نوتة 2"],
-        "fragrance_family": "العائلة العطرية المطلوبة",
-        "fragrance_style": "الأسلوب (بحري، بخوري، دخاني، ناعم، إلخ)",
-        "fragrance_character": "الطابع (رسمي، شبابي، فاخر، رومانسي، إلخ)",
-        "usage_type": "نوع الاستخدام (يومي، مساء، مناسبات، إلخ)",
-        "mood_keywords": ["كلمة مفتاحية 1", "كلمة مفتاحية 2"],
-        "overall_atmosphere": "الجو العام (نظيف، دافئ، بارد، برّاق، إلخ)",
-        "intensity_required": "خفيف/متوسط/قوي"
-    }},
-    "top_3_matches": [
-        {{
-            "rank": 1,
-            "name": "اسم العطر الكامل",
-            "brand": "العلامة التجارية",
-            "match_percentage": 92,
-            "dna_alignment": "شرح كيف يطابق DNA العطر (الأسلوب والطابع)",
-            "six_factor_analysis": {{
-                "notes_match": "درجة تطابق النوتات مع شرح",
-                "family_match": "هل العائلة تطابق؟",
-                "style_match": "هل الأسلوب متطابق؟",
-                "character_match": "هل الطابع متطابق؟",
-                "sillage_match": "هل قوة الفوحان متطابقة؟",
-                "mood_match": "هل المزاج متطابق؟"
-            }},
-            "actual_notes": {{
-                "top": ["نوتة 1", "نوتة 2"],
-                "heart": ["نوتة 1", "نوتة 2"],
-                "base": ["نوتة 1", "نوتة 2"]
-            }},
-            "detailed_match_reason": "شرح شامل: كيف يطابق هذا العطر DNA المطلوب؟ لماذا؟",
-            "best_for": "الاستخدام الأمثل",
-            "sillage": "قوة الانتشار",
-            "character_type": "نوع الطابع"
-        }}
-    ],
-    "excluded_fragrances": [
-        {{
-            "name": "اسم العطر",
-            "brand": "العلامة التجارية",
-            "exclusion_reason": "سبب واضح: نوع عدم التطابق (مثال: عائلة مختلفة تماماً، أسلوب عام مختلف، استخدام غير متطابق، طابع غير مناسب)"
-        }}
-    ],
-    "scientific_conclusion": "ملخص علمي شامل: DNA المطلوب مقابل ما اخترناه",
-    "dna_summary": "ملخص DNA العطر الأساسي المطلوب",
-    "additional_advice": "نصيحة إضافية للمستخدم"
-}}"""
+    rendered = render_prompt(
+        'recommendations',
+        rag_context=rag_context_field(rag_context, rag_result, 'recommendations'),
+        query=query,
+        profile_context=profile_context
+    )
 
     default_response = {
         "scent_analysis": {
@@ -864,16 +631,13 @@ def generate_recommendations(query, scent_profile=None, products=None):
     }
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "أنت خبير عطور محترف ومحلّل روائح متخصص. قدم تحليلات دقيقة بناءً على DNA العطر (الأسلوب والطابع) وليس النوتات فقط. قارن دائماً بـ 6 عوامل: النوتات، العائلة، الأسلوب، الطابع، الفوحان، المزاج. استبعد العطور من عائلات مختلفة وأساليب مختلفة. أجب دائمًا بصيغة JSON فقط."},
-                {"role": "user", "content": prompt}
-            ],
-            max_completion_tokens=2500
+        content = await achat_completion(
+            rendered.prompt,
+            rendered.system,
+            max_completion_tokens=2500,
+            label='recommendations'
         )
-        
-        content = response.choices[0].message.content
+
         parsed = parse_ai_response(content)
         
         if parsed is None:
@@ -887,6 +651,11 @@ def generate_recommendations(query, scent_profile=None, products=None):
         default_response["error"] = str(e)
         return default_response
 
+def generate_recommendations(query, scent_profile=None, products=None):
+    """الواجهة المتزامنة لـ agenerate_recommendations"""
+    return run_sync(agenerate_recommendations(query, scent_profile, products))
+
+
 SERVICES_MAP = {
     'bio_scent': {'name_ar': 'تحليل الرائحة الحيوية', 'keywords': ['حيوي', 'صوت', 'جلد', 'مزاج', 'طاقة']},
     'skin_chemistry': {'name_ar': 'كيمياء البشرة', 'keywords': ['بشرة', 'كيمياء', 'حساسية', 'درجة حرارة']},
@@ -909,63 +678,24 @@ SERVICES_MAP = {
     'blend_predictor': {'name_ar': 'الخلط التنبؤي', 'keywords': ['خلط', 'تنبؤ', 'نتيجة', 'توازن']},
 }
 
-def detect_article_services(title, summary, content, keywords):
+async def adetect_article_services(title, summary, content, keywords):
     """اكتشاف الخدمات المناسبة من محتوى المقال"""
     try:
-        prompt = f"""
-        أنت خبير متخصص في تحليل محتوى العطور وربطه بالخدمات المناسبة.
-        
-        حلل المقال التالي واقترح جميع الخدمات المرتبطة والمناسبة:
-        
-        العنوان: {title}
-        الملخص: {summary}
-        الكلمات المفتاحية: {keywords}
-        جزء من المحتوى: {content[:1000]}
-        
-        الخدمات المتاحة (19 خدمة):
-        1. bio_scent - تحليل الرائحة الحيوية
-        2. skin_chemistry - كيمياء البشرة
-        3. temp_volatility - التطاير الحراري
-        4. metabolism - التمثيل الغذائي
-        5. climate - محرك المناخ
-        6. neuroscience - علم الأعصاب العطري
-        7. stability - الثبات والانتشار
-        8. predictive - الذكاء التنبّؤي
-        9. scent_personality - الشخصية العطرية
-        10. signature - العطر التوقيعي
-        11. occasion - عطر لكل مناسبة
-        12. habit_planner - الخطة العطرية
-        13. digital_twin - التوأم الرقمي
-        14. adaptive - العطر التكيّفي
-        15. oil_mixer - مازج الزيوت
-        16. scent_dna - بصمة الرائحة
-        17. custom_perfume - تصميم عطر مخصص
-        18. recommendations - توصيات العطور
-        19. blend_predictor - الخلط التنبؤي
-        
-        اقترح 4-7 خدمات الأنسب بناءً على:
-        - محتوى وموضوع المقال
-        - الكلمات المفتاحية والسياق
-        - الصلة المباشرة والغير مباشرة
-        - فائدة المستخدم
-        
-        أجب بصيغة JSON فقط:
-        {{
-            "services": ["key1", "key2", "key3", "key4"],
-            "reasons": ["السبب 1", "السبب 2", "السبب 3", "السبب 4"]
-        }}
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "أنت محلل محتوى متخصص في مجال العطور والروائح. اكتشف جميع الخدمات المرتبطة بالمقال بناءً على سياقه ومحتواه. أرجع 4-7 خدمات مناسبة. أجب بصيغة JSON فقط."},
-                {"role": "user", "content": prompt}
-            ],
-            max_completion_tokens=800
+        rendered = render_prompt(
+            'article_services',
+            title=title,
+            summary=summary,
+            keywords=keywords,
+            content_excerpt=Variants(content[:1000], content[:500])
         )
         
-        content_response = response.choices[0].message.content
+        content_response = await achat_completion(
+            rendered.prompt,
+            rendered.system,
+            max_completion_tokens=800,
+            label='article_services'
+        )
+
         parsed = parse_ai_response(content_response)
         
         if parsed and 'services' in parsed:
@@ -978,8 +708,18 @@ def detect_article_services(title, summary, content, keywords):
         print(f"Service detection error: {str(e)}")
         return []
 
-def generate_article(topic, keywords, tone, language='ar'):
-    """Generate a professionally formatted article using AI"""
+def detect_article_services(title, summary, content, keywords):
+    """الواجهة المتزامنة لـ adetect_article_services"""
+    return run_sync(adetect_article_services(title, summary, content, keywords))
+
+
+async def agenerate_article(topic, keywords, tone, language='ar', on_field=None, raise_errors: bool = False):
+    """
+    Generate a professionally formatted article using AI (on_field streams title/summary/content as they complete)
+
+    المقال الافتراضي (بدون توليد فعلي من AI) يحمل _mode من FALLBACK_MODES (انظر is_fallback).
+    raise_errors=True: أخطاء طلب AI تُرفع بدلاً من المقال الافتراضي (لإعادة محاولة المهمة الخلفية)
+    """
     
     # 🔍 RAG Enhancement - Retrieve relevant notes for article
     rag_context, rag_result = get_rag_context_for_ai(f"{topic} {keywords}", top_k=5, module_type='article')
@@ -987,110 +727,14 @@ def generate_article(topic, keywords, tone, language='ar'):
     if not rag_result.is_valid:
         rag_context = ""
     
-    prompt = f"""
-    أنت محرر ومؤلف محتوى محترف متخصص في مجال العطور والروائح.
-    
-{rag_context if rag_context else "⚠️ لا توجد نوتات مسترجعة - قدم محتوى تعليمي عام بدون أسماء عطور محددة."}
-    
-    قم بإنشاء مقال شامل واحترافي حول الموضوع التالي:
-    الموضوع: {topic}
-    الكلمات المفتاحية: {keywords}
-    النبرة: {tone}
-    
-    ⚠️ تنسيق المحتوى مهم جداً - يجب أن يكون بصيغة HTML احترافية:
-    
-    المتطلبات الإلزامية للمحتوى:
-    1. عنوان رئيسي جذاب وإبداعي
-    2. ملخص احترافي (150-200 كلمة)
-    3. فهرس محتويات (Table of Contents) مع روابط داخلية
-    4. 4-6 عناوين فرعية رئيسية (H2) مع محتوى غني تحت كل عنوان
-    5. عناوين فرعية ثانوية (H3) حسب الحاجة
-    6. اقتباسات ملهمة من خبراء العطور (2-3 اقتباسات على الأقل)
-    7. قوائم نقطية وترقيمية حيث يناسب
-    8. نصائح عملية في boxes مميزة
-    9. قسم المراجع والمصادر (3-5 مراجع) تكون مراجع حقيقية وليس كمثال
-    10. خاتمة قوية مع دعوة للعمل
-    
-    صيغة HTML المطلوبة للمحتوى:
-    - استخدم <h2 id="section-X"> للعناوين الرئيسية (مع ID للفهرس)
-    - استخدم <h3> للعناوين الفرعية
-    - استخدم <blockquote class="quote-box"> للاقتباسات
-    - استخدم <div class="tip-box"> للنصائح المميزة
-    - استخدم <div class="reference-box"> للمراجع
-    - استخدم <ul> و <ol> للقوائم
-    - استخدم <strong> و <em> للتأكيد
-    - استخدم <a href="#section-X"> للروابط الداخلية في الفهرس
-    - استخدم <a href="URL" target="_blank" rel="noopener"> للروابط الخارجية
-    شروط مهمة :
-    - يجب تضمين الكلمة المفتاحية الأساسية في أول 150 كلمة من المقال.
-    - يجب تضمين الكلمة المفتاحية في 30% من عناوين H2.
-    - يجب توزيع الكلمة المفتاحية في النص بنسبة 1% إلى 1.5% من إجمالي عدد الكلمات.
-    - يجب تضمين كلمات LSI مرتبطة بالموضوع مثل الروائح، الفوحان، الثبات، نوتات العطر، العائلة العطرية، إلخ.
-    -إنتاج Meta Description داخل JSON "meta_description": 
-    "وصف موجز 150 حرفاً يظهر في نتائج البحث"
-    - إنتاج Slug تلقائي للمقال "slug": "عنوان-متوافق-مع-seo-بالإنجليزية-ومنفصل-بشرطة"
-    - إدراج Structured Data Schema Article داخل json 
-    "schema": "<script     type='application/ld+json'>...</script>"
-    - يجب أن يكون المحتوى فريد بنسبة 100% وغير معاد من أي مقالة أخرى.
-    - لا تستخدم قوالب ثابتة أو جمل مكررة بين المقالات المختلفة.
-    - استخدم أسلوباً بشرياً سلساً.
-    - تجنب التكرار والحشو.
-    - استخدم أمثلة واقعية وتفسيرات مبسطة.
-    - استخدم انتقالات لغوية طبيعية بين الفقرات.
-    - يجب أن تحتوي كل فقرة على 50–130 كلمة.
-    - لا تكتب فقرات طويلة جداً أو جمل قصيرة جداً.
-    - يجب إضافة رابطين خارجيين على الأقل لمواقع موثوقة: Fragrantica, Basenotes.
-    - يجب الحفاظ على النبرة التي يحددها المستخدم: رسمية، عاطفية، تقنية، تسويقية، إلخ.
-    - لا تخرج عن النبرة إطلاقاً.
-    -إضافة قواعد E-E-A-T الخاصة بجوجل
-    - تضمين معلومات خبراء العطور.
-    - تضمين جمل تظهر الخبرة والمعرفة (Experience).
-    - إظهار تحليل متخصص ومتعمق.
-    - يجب أن تكون جميع الروابط والمراجع حقيقية من مواقع معروفة مثل:
-    - https://www.fragrantica.com
-    - https://www.basenotes.com
-    - https://www.perfumerflavorist.com
-    -إضافة خاصية Outbound SEO Safety
-    - لا تضع روابط لمواقع غير موثوقة.
-    - لا تضع روابط عشوائية أو غير موجودة.
-
-
-    مثال على بنية المحتوى:
-    <nav class="toc-box">
-        <h4>📑 فهرس المحتويات</h4>
-        <ol>
-            <li><a href="#section-1">العنوان الأول</a></li>
-            <li><a href="#section-2">العنوان الثاني</a></li>
-        </ol>
-    </nav>
-    
-    <h2 id="section-1">العنوان الأول</h2>
-    <p>المحتوى...</p>
-    
-    <blockquote class="quote-box">
-        <p>"الاقتباس هنا"</p>
-        <cite>- اسم الخبير</cite>
-    </blockquote>
-    
-    <div class="tip-box">
-        <strong>💡 نصيحة:</strong> النصيحة هنا
-    </div>
-    
-    <div class="reference-box">
-        <h4>📚 المراجع والمصادر</h4>
-        <ol>
-            <li>اسم المرجع - <a href="URL" target="_blank">رابط</a></li>
-        </ol>
-    </div>
-    
-    أجب بصيغة JSON فقط:
-    {{
-        "title": "العنوان الرئيسي الجذاب",
-        "summary": "ملخص احترافي شامل 150-200 كلمة",
-        "content": "المحتوى الكامل بصيغة HTML المنسقة (2000-3000 كلمة)",
-        "keywords": "كلمات مفتاحية مفصولة بفواصل"
-    }}
-    """
+    rendered = render_prompt(
+        'article',
+        rag_context=rag_context_field(rag_context, rag_result, 'article') if rag_context
+        else "⚠️ لا توجد نوتات مسترجعة - قدم محتوى تعليمي عام بدون أسماء عطور محددة.",
+        topic=topic,
+        keywords=keywords,
+        tone=tone
+    )
     
     # Default article response for fallback
     default_article = {
@@ -1144,23 +788,23 @@ def generate_article(topic, keywords, tone, language='ar'):
     }
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "أنت كاتب محتوى محترف متخصص في مجال العطور. أنتج محتوى عالي الجودة ومنسق بشكل احترافي مع HTML صحيح. أجب بصيغة JSON فقط."},
-                {"role": "user", "content": prompt}
-            ],
-            max_completion_tokens=4000
+        # توليد إبداعي: نفس الموضوع يجب أن يعطي مقالاً جديداً (لا مقالات مكررة بروابط مختلفة)
+        content = await achat_completion(
+            rendered.prompt,
+            rendered.system,
+            max_completion_tokens=4000,
+            use_cache=False,
+            on_field=on_field,
+            label='article'
         )
-        
-        content = response.choices[0].message.content
+
         parsed = parse_ai_response(content)
         
         if parsed is None:
             # استخدام المقال الافتراضي كبديل
-            suggested_services = detect_article_services(default_article["title"], default_article["summary"], default_article["content"], keywords)
+            suggested_services = await adetect_article_services(default_article["title"], default_article["summary"], default_article["content"], keywords)
             default_article["suggested_services"] = suggested_services
-            return default_article
+            return dict(default_article, _mode='fallback_safe')
         
         title = parsed.get('title', f'مقال عن {topic}')
         summary = parsed.get('summary', '')
@@ -1168,7 +812,7 @@ def generate_article(topic, keywords, tone, language='ar'):
         article_keywords = parsed.get('keywords', keywords)
         
         # اكتشاف الخدمات المناسبة
-        suggested_services = detect_article_services(title, summary, content, article_keywords)
+        suggested_services = await adetect_article_services(title, summary, content, article_keywords)
         
         return {
             "success": True,
@@ -1180,71 +824,38 @@ def generate_article(topic, keywords, tone, language='ar'):
         }
     
     except Exception as e:
+        if raise_errors:
+            raise
         # في حالة حدوث خطأ، استخدام المقال الافتراضي
         print(f"Article generation error: {str(e)}")
-        return default_article
+        return dict(default_article, _mode='error_fallback')
+
+def generate_article(topic, keywords, tone, language='ar'):
+    """الواجهة المتزامنة لـ agenerate_article"""
+    return run_sync(agenerate_article(topic, keywords, tone, language))
 
 
-def analyze_face_for_perfume(image_data, debug: bool = None):
+
+async def aanalyze_face_for_perfume(image_data, debug: bool = None, on_field=None, raise_errors: bool = False):
     """
     Analyze face image using OpenAI Vision to recommend perfumes.
+    on_field streams each top-level section of the analysis as soon as it is complete.
+
+    الرد الافتراضي (بدون تحليل فعلي من AI) يحمل _mode من FALLBACK_MODES (انظر is_fallback).
+    raise_errors=True: أخطاء طلب AI تُرفع بدلاً من الرد الافتراضي (لإعادة محاولة المهمة الخلفية)
     """
     # 🔍 RAG Enhancement - Retrieve notes for face analysis
     rag_context, rag_result = get_rag_context_for_ai("شخصية أنيقة رسمية فاخرة", top_k=6, module_type='face_analyzer', debug=debug)
     
     if not rag_result.is_valid:
-        return get_default_response('face_analyzer')
+        fallback = get_default_response('face_analyzer')
+        fallback['_mode'] = 'fallback_safe'
+        return fallback
     
-    prompt = f"""أنت خبير متخصص في تحليل الوجه واختيار العطور المناسبة. قم بتحليل هذه الصورة بدقة عالية واستخرج النتائج بصيغة JSON فقط.
-
-{rag_context}
-
-1. تحليل البشرة: نوعها، درجتها، العمر، تأثيرها على الثبات، أفضل تركيز، وثبات متوقع.
-2. تحليل الشخصية من الملامح: الشخصية العامة، الانطباع، المزاج، الـ Vibe، والأسلوب.
-3. العائلات العطرية الأنسب (3-5 عائلات).
-4. أفضل 5 عطور (الاسم، البراند، التوافق 0-100، السبب، القوة، الاستخدام).
-5. عطر التوقيع.
-6. توصيات حسب المناسبة.
-
-أجب بصيغة JSON فقط بهذا الهيكل الدقيق:
-{{
-    "skin_analysis": {{
-        "skin_type": "...",
-        "skin_tone": "...",
-        "age_range": "...",
-        "perfume_effect": "...",
-        "best_concentration": "...",
-        "longevity_estimate": "..."
-    }},
-    "personality_analysis": {{
-        "personality": "...",
-        "impression": "...",
-        "mood": "...",
-        "vibe": "...",
-        "style": "..."
-    }},
-    "best_families": ["...", "...", "..."],
-    "recommended_perfumes": [
-        {{
-            "name": "...",
-            "brand": "...",
-            "match_score": 95,
-            "why_suitable": "...",
-            "strengths": "...",
-            "usage": "..."
-        }}
-    ],
-    "signature_perfume": {{
-        "name": "...",
-        "reason": "..."
-    }},
-    "occasion_recommendations": {{
-        "daily": "...",
-        "work": "...",
-        "evening": "...",
-        "special": "..."
-    }}
-}}"""
+    rendered = render_prompt(
+        'face_analyzer',
+        rag_context=rag_context_field(rag_context, rag_result, 'face_analyzer')
+    )
 
     default_response = {
         "skin_analysis": {
@@ -1319,154 +930,152 @@ def analyze_face_for_perfume(image_data, debug: bool = None):
 
     try:
         if not image_data or not image_data.startswith('data:image'):
-            return default_response
+            return dict(default_response, _mode='fallback_safe')
         
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "أنت خبير متخصص في تحليل الوجه واختيار العطور. حلل الصورة بدقة وأجب بصيغة JSON فقط."
-                },
+        content = await achat_completion(
+            [
+                {"type": "text", "text": rendered.prompt},
                 {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": image_data}
-                        }
-                    ]
+                    "type": "image_url",
+                    "image_url": {"url": image_data}
                 }
             ],
-            max_tokens=2000
+            rendered.system,
+            model="gpt-4o",
+            max_completion_tokens=2000,
+            on_field=on_field,
+            label='face_analyzer'
         )
-        
-        content = response.choices[0].message.content
+
         parsed = parse_ai_response(content)
         
         if parsed and 'skin_analysis' in parsed:
             return parsed
         else:
-            return default_response
+            return dict(default_response, _mode='fallback_safe')
             
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Face analysis error: {str(e)}")
-        return default_response
+        return dict(default_response, _mode='error_fallback')
 
+def analyze_face_for_perfume(image_data, debug: bool = None):
+    """الواجهة المتزامنة لـ aanalyze_face_for_perfume"""
+    return run_sync(aanalyze_face_for_perfume(image_data, debug))
 
-def analyze_perfume_notes_bulk_import(text: str) -> dict:
+
+# حجم كل جزء في الاستيراد الجماعي: ردود أجزاء صغيرة لا تُقطع عند max_completion_tokens
+BULK_IMPORT_CHUNK_LINES = int(os.environ.get('NOTES_IMPORT_CHUNK_LINES', 25))
+BULK_IMPORT_CHUNK_CHARS = int(os.environ.get('NOTES_IMPORT_CHUNK_CHARS', 3000))
+# مهلة كل جزء بالثواني (مستقلة عن مهلة المهمة، فالأجزاء الأخيرة في الاستيراد الكبير لا تنتهي مهلتها)
+BULK_IMPORT_CHUNK_DEADLINE = float(os.environ.get('NOTES_IMPORT_CHUNK_DEADLINE', 90))
+
+
+async def aanalyze_perfume_notes_bulk_import(text: str, on_progress=None) -> dict:
     """
     تحليل نص يحتوي على نوتات عطرية واستخراج البيانات المنسقة
+    
+    النص الطويل يُقسم إلى أجزاء (NOTES_IMPORT_CHUNK_LINES سطر) تُحلل بالتوازي
+    عبر run_batch، لكل جزء مهلته (NOTES_IMPORT_CHUNK_DEADLINE) من بداية تحليله،
+    ثم تُدمج النوتات مع حذف المكررة بين الأجزاء.
+    on_progress(done, total, failed) يُستدعى بعد كل جزء.
+    
     Returns: {
         'success': bool,
         'notes': [{'name_en': str, 'name_ar': str, 'family': str, 'role': str, ...}],
-        'error': str (if any)
+        'error': str (if any),
+        'chunks': {'total': int, 'failed': int, 'errors': [str]}
     }
     """
     if not text or not text.strip():
         return {'success': False, 'error': 'يجب إدخال نص يحتوي على النوتات'}
     
-    prompt = f"""أنت متخصص عالمي في العطور والنوتات العطرية. قم بتحليل دقيق وتفصيلي للنص التالي واستخرج معلومات النوتات العطرية بعناية.
-
-النص المدخل:
-{text}
-
-تعليمات التحليل الدقيقة:
-1. اقرأ النص بعناية واستخرج جميع النوتات المذكورة صراحة
-2. أسماء النوتات يجب أن تكون فريدة وليست متكررة (تجنب النسخ المكررة)
-3. استخرج الاسم الإنجليزي والعربي لكل نوتة (إذا لم يكن العربي موجود، قم بترجمة احترافية)
-4. صنف العائلة العطرية بدقة: Floral, Woody, Oriental, Fresh, Fruity, Herbal, Spicy, Amber, Green, Aromatic, Citrus, Oceanic, Gourmand, Chypre, Fougère
-5. حدد الدور بناءً على خصائص النوتة: Top (الطيار، الخفيف، التطاير العالي)، Heart/Middle (القلب، الرئيسي)، Base (القاعدة، الثقيل، التطاير المنخفض)
-6. حدد التطاير بدقة: High (يتلاشى سريع: 0-30 دقيقة)، Medium (متوسط: 30 دقيقة - 2 ساعة)، Low (ثقيل، يدوم طويل: +2 ساعة)
-7. اكتب وصفاً دقيقاً وعمليّاً للنوتة (profile) يعكس خصائصها الحقيقية
-8. حدد الاستخدام الأمثل (best_for): مثل "يومي، مناسبات، عمل، مساء، رياضة، الطقس الدافئ، الطقس البارد" إلخ
-9. اذكر النوتات التي تتناسب معها بناءً على الكيمياء العطرية
-10. اذكر النوتات التي يجب تجنبها (قد تسبب نتائج سيئة)
-
-الصيغة المطلوبة (JSON array نقي):
-[
-    {{
-        "name_en": "اسم إنجليزي (فريد، واضح، صحيح)",
-        "name_ar": "الاسم العربي الدقيق",
-        "family": "العائلة العطرية",
-        "role": "Top أو Heart أو Base",
-        "volatility": "High أو Medium أو Low",
-        "profile": "وصف دقيق وعمليّ للنوتة (50-100 كلمة)",
-        "best_for": ["استخدام1", "استخدام2", "استخدام3"],
-        "works_well_with": ["نوتة1", "نوتة2"],
-        "avoid_with": ["نوتة1", "نوتة2"],
-        "concentration": "نسبة مئوية (10%, 20%, إلخ)",
-        "origin": "منشأ، منطقة، أو نوع النبات"
-    }}
-]
-
-متطلبات أساسية:
-- NO duplicate names - كل نوتة يجب أن تكون فريدة
-- ALL fields must be filled - جميع الحقول مطلوبة وممتلئة
-- Accuracy first - الدقة أهم من الكثرة
-- Valid JSON only - JSON صحيح فقط بدون نصوص إضافية"""
+    chunks = split_text_chunks(text, BULK_IMPORT_CHUNK_LINES, BULK_IMPORT_CHUNK_CHARS)
+    
+    if len(chunks) <= 1:
+        result = await _aanalyze_notes_chunk(text)
+        failed = 0 if result['success'] else 1
+        if on_progress is not None:
+            on_progress(1, 1, failed)
+        errors = [f"الجزء 1: {result['error']}"] if failed else []
+        result['chunks'] = {'total': 1, 'failed': failed, 'errors': errors}
+        return result
+    
+    async def analyze_chunk(chunk):
+        # كل جزء يعمل في مهمة asyncio خاصة به، فالمهلة لا تؤثر على الأجزاء الأخرى
+        token = set_deadline(BULK_IMPORT_CHUNK_DEADLINE, override=True)
+        try:
+            result = await _aanalyze_notes_chunk(chunk)
+        finally:
+            reset_deadline(token)
+        if not result['success']:
+            raise ValueError(result['error'])
+        return result['notes']
+    
+    batch = await run_batch(chunks, analyze_chunk, on_progress=on_progress)
+    notes = merge_unique_notes(batch.succeeded)
+    errors = [f"الجزء {i + 1}: {error}" for i, error in sorted(batch.errors.items())]
+    
+    print(f"📦 Bulk import: {len(chunks)} أجزاء، {batch.failed} فاشلة، {len(notes)} نوتة فريدة")
+    
+    return {
+        'success': bool(notes),
+        'notes': notes,
+        'error': None if notes else (errors[0] if errors else 'لم يتم استخراج نوتات صحيحة من النص'),
+        'chunks': {'total': len(chunks), 'failed': batch.failed, 'errors': errors}
+    }
+
+
+def merge_unique_notes(note_lists) -> list:
+    """دمج نوتات الأجزاء مع حذف المكررة حسب الاسم الإنجليزي (أول ظهور هو المعتمد)"""
+    merged = []
+    seen = set()
+    for notes in note_lists:
+        for note in notes:
+            key = ' '.join(note['name_en'].casefold().split())
+            if key not in seen:
+                seen.add(key)
+                merged.append(note)
+    return merged
+
+
+async def _aanalyze_notes_chunk(text: str) -> dict:
+    """تحليل جزء واحد من نص النوتات بطلب AI واحد"""
+    rendered = render_prompt('notes_bulk_import', text=text)
     
     try:
-        response = client.chat.completions.create(
+        content = await achat_completion(
+            rendered.prompt,
+            rendered.system,
             model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "أنت خبير في العطور والنوتات العطرية. رد بـ JSON فقط، بدون شرح إضافي."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            max_tokens=4000,
+            max_completion_tokens=4000,
+            label='notes_bulk_import',
             temperature=0.3
         )
-        
-        content = response.choices[0].message.content
-        
-        # حاول استخراج JSON من الرد (قد يكون مغلف بـ markdown code block)
+
+        # قائمة JSON من الرد (داخل ```json أو بعد شرح نصي)
         try:
-            # إذا كان الرد مغلف بـ markdown code block، استخرجه
-            if '```json' in content:
-                start = content.find('```json') + 7
-                end = content.find('```', start)
-                if end > start:
-                    content = content[start:end].strip()
-            elif '```' in content:
-                start = content.find('```') + 3
-                end = content.find('```', start)
-                if end > start:
-                    content = content[start:end].strip()
+            parsed = extract_json(content or '', expect=list)
+            # تحقق من صحة البيانات
+            valid_notes = []
+            for note in parsed:
+                if isinstance(note, dict) and note.get('name_en') and note.get('name_ar'):
+                    valid_notes.append(note)
             
-            parsed = json.loads(content)
-            if isinstance(parsed, list):
-                # تحقق من صحة البيانات
-                valid_notes = []
-                for note in parsed:
-                    if isinstance(note, dict) and note.get('name_en') and note.get('name_ar'):
-                        valid_notes.append(note)
-                
-                if valid_notes:
-                    return {
-                        'success': True,
-                        'notes': valid_notes,
-                        'error': None
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'error': 'لم يتم استخراج نوتات صحيحة من النص',
-                        'notes': []
-                    }
+            if valid_notes:
+                return {
+                    'success': True,
+                    'notes': valid_notes,
+                    'error': None
+                }
             else:
                 return {
                     'success': False,
-                    'error': 'صيغة الرد غير صحيحة',
+                    'error': 'لم يتم استخراج نوتات صحيحة من النص',
                     'notes': []
                 }
-        except json.JSONDecodeError as e:
+        except JSONExtractError as e:
             return {
                 'success': False,
                 'error': f'خطأ في تحليل الرد: {str(e)[:100]}',
@@ -1481,6 +1090,11 @@ def analyze_perfume_notes_bulk_import(text: str) -> dict:
         }
 
 
+def analyze_perfume_notes_bulk_import(text: str, on_progress=None) -> dict:
+    """الواجهة المتزامنة لـ aanalyze_perfume_notes_bulk_import"""
+    return run_sync(aanalyze_perfume_notes_bulk_import(text, on_progress))
+
+
 def find_similar_notes(name_en: str, threshold: float = 0.7) -> list:
     """
     البحث عن نوتات متشابهة في قاعدة البيانات باستخدام fuzzy matching
@@ -1608,37 +1222,24 @@ def generate_daily_scent_suggestion(user):
         if not context_data:
             return {'success': False, 'error': 'لا توجد تحليلات سابقة'}
         
-        # بناء الـ prompt بناءً على نوع المصدر
-        if source_type == 'analysis_results':
-            prompt = f"""أنت خبير عطور متخصص. بناءً على تحليلات المستخدم الشاملة أدناه، قدم اقتراح عطر يومي مخصص بصيغة JSON:
-
-التحليلات: {json.dumps(context_data, ensure_ascii=False)[:1200]}
-
-صيغة JSON (فقط):
-{{"perfume_name": "...", "character_type": "...", "description": "...", "reasoning": "..."}}"""
-        elif source_type == 'scent_profile':
-            prompt = f"""أنت خبير عطور متخصص. بناءً على بصمة عطرية للمستخدم (Scent DNA) أدناه، قدم اقتراح عطر يومي مخصص بصيغة JSON:
-
-بصمته العطرية: {json.dumps(context_data, ensure_ascii=False)[:1200]}
-
-صيغة JSON (فقط):
-{{"perfume_name": "...", "character_type": "...", "description": "...", "reasoning": "..."}}"""
-        else:  # custom_perfume
-            prompt = f"""أنت خبير عطور متخصص. بناءً على العطور المصممة من قبل المستخدم أدناه، قدم اقتراح عطر يومي مخصص بصيغة JSON:
-
-عطوره المصممة: {json.dumps(context_data, ensure_ascii=False)[:1200]}
-
-صيغة JSON (فقط):
-{{"perfume_name": "...", "character_type": "...", "description": "...", "reasoning": "..."}}"""
+        # بناء الـ prompt بناءً على نوع المصدر (تُحذف أقدم السجلات أولاً عند تجاوز الميزانية)
+        source_intro, source_label = DAILY_SUGGESTION_SOURCES[source_type]
+        rendered = render_prompt(
+            'daily_suggestion',
+            source_intro=source_intro,
+            source_label=source_label,
+            context=Items(context_data, render=lambda entries: json.dumps(entries, ensure_ascii=False))
+        )
 
-        response = client.chat.completions.create(
+        # الاقتراح اليومي محفوظ مسبقاً في قاعدة البيانات، ودرجة الحرارة العالية مقصودة للتنويع
+        text = chat_completion(
+            rendered.prompt,
             model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.8,
-            max_tokens=500
+            max_completion_tokens=500,
+            use_cache=False,
+            label='daily_suggestion',
+            temperature=0.8
         )
-        
-        text = response.choices[0].message.content
         match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text, re.DOTALL)
         
         if match:
@@ -0,0 +1,381 @@
+"""
+Embeddings - توليد embeddings للنوتات والاستعلامات (محلي، بدون شبكة، CPU فقط)
+
+واجهة Embedder قابلة للاستبدال (EMBEDDER):
+- 'ngram' (الافتراضي): char n-grams مع TF-IDF (hashing) ثم SVD، مع توحيد الكتابة العربية
+  (الهمزات، التاء المربوطة، التشكيل، التطويل) - الاستعلام يطابق النوتة بمعناها
+  القريب وليس فقط بالنص المطابق
+- 'hash': الطريقة السابقة (متجه عشوائي من MD5 لكل نص) للفهارس القديمة
+
+embedder الفهرس يُحفظ اسمه في notes_embeddings.json ونموذجه في app/data، والاستعلام
+يستخدم نفس النموذج دائماً. encode_query تحفظ آخر الاستعلامات في كاش LRU.
+
+دوال الطريقة hash (embed_texts / embed_text) تكتب مباشرة في مصفوفة float32 مخصصة
+مسبقاً وتطبّع كل الصفوف بعملية واحدة، والمجموعات الكبيرة تُقسم على process pool.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+EMBEDDING_DIM = 384
+EMBEDDER = os.environ.get('EMBEDDER', 'ngram')
+EMBEDDER_DIR = 'app/data'
+EMBED_QUERY_CACHE_SIZE = int(os.environ.get('EMBED_QUERY_CACHE_SIZE', 1024))
+# عدد العمليات للمجموعات الكبيرة (0 = عدد المعالجات)
+EMBED_WORKERS = int(os.environ.get('EMBED_WORKERS', 0))
+EMBED_PARALLEL_MIN = int(os.environ.get('EMBED_PARALLEL_MIN', 50000))
+EMBED_BLOCK_SIZE = 20000
+
+_local = threading.local()
+
+
+def text_seed(text: str) -> int:
+    """seed ثابت للنص (نفس حساب الطريقة السابقة: MD5 mod 2^31)"""
+    return int.from_bytes(hashlib.md5(text.encode()).digest(), 'big') % (2 ** 31)
+
+
+def _generator() -> np.random.RandomState:
+    rng = getattr(_local, 'rng', None)
+    if rng is None:
+        rng = _local.rng = np.random.RandomState()
+    return rng
+
+
+def _fill(texts: Sequence[str], out: np.ndarray):
+    """كتابة المتجهات غير المطبّعة في صفوف out"""
+    rng = _generator()
+    dim = out.shape[1]
+    for i, text in enumerate(texts):
+        rng.seed(text_seed(text))
+        out[i] = rng.standard_normal(dim)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """تطبيع L2 لكل صف في مكانه"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms += 1e-10
+    matrix /= norms
+    return matrix
+
+
+def _embed_block(args) -> np.ndarray:
+    texts, dim = args
+    block = np.empty((len(texts), dim), dtype=np.float32)
+    _fill(texts, block)
+    return block
+
+
+def embed_texts(texts: Sequence[str], dim: int = EMBEDDING_DIM, workers: Optional[int] = None,
+                out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    توليد embeddings لمجموعة نصوص في مصفوفة float32 واحدة (n × dim) مطبّعة
+
+    Args:
+        texts: النصوص
+        dim: عدد الأبعاد
+        workers: عدد العمليات (None: تلقائي حسب حجم المجموعة، 1: في نفس العملية)
+        out: مصفوفة float32 جاهزة بالشكل (n, dim) للكتابة فيها بدلاً من تخصيص جديدة
+
+    Returns:
+        المصفوفة (out إذا مُررت)
+    """
+    n = len(texts)
+    if out is None:
+        out = np.empty((n, dim), dtype=np.float32)
+    elif out.shape != (n, dim) or out.dtype != np.float32:
+        raise ValueError(f"out يجب أن تكون float32 بالشكل {(n, dim)}")
+
+    if workers is None:
+        workers = (EMBED_WORKERS or os.cpu_count() or 1) if n >= EMBED_PARALLEL_MIN else 1
+
+    if workers <= 1 or n < 2 * EMBED_BLOCK_SIZE:
+        _fill(texts, out)
+    else:
+        starts = range(0, n, EMBED_BLOCK_SIZE)
+        blocks = ((list(texts[start:start + EMBED_BLOCK_SIZE]), dim) for start in starts)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for start, block in zip(starts, pool.map(_embed_block, blocks)):
+                out[start:start + len(block)] = block
+
+    return normalize_rows(out)
+
+
+def embed_text(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """embedding لنص واحد (متجه float32 مطبّع بطول dim)"""
+    vector = np.empty((1, dim), dtype=np.float32)
+    _fill([text], vector)
+    return normalize_rows(vector)[0]
+
+
+# ═══ توحيد النص (عربي/إنجليزي) ═══
+
+_ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_ARABIC_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_text(text: str) -> str:
+    """أحرف صغيرة، حذف التشكيل والتطويل، توحيد الألف والياء والتاء المربوطة، وحذف الرموز"""
+    text = _ARABIC_MARKS.sub('', text.lower()).translate(_ARABIC_LETTERS)
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+# ═══ واجهة Embedder ═══
+
+class Embedder:
+    """
+    الواجهة المشتركة: fit (للنماذج التي تتعلم من النوتات) ثم encode لمجموعة نصوص
+    و encode_query لاستعلام واحد مع كاش LRU. المتجهات float32 مطبّعة بطول dim.
+    """
+
+    name = 'base'
+
+    def __init__(self, dim: int = EMBEDDING_DIM, cache_size: int = EMBED_QUERY_CACHE_SIZE):
+        self.dim = dim
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def is_fitted(self) -> bool:
+        return True
+
+    def fit(self, texts: Sequence[str]) -> 'Embedder':
+        return self
+
+    def encode(self, texts: Sequence[str], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """مصفوفة (len(texts) × dim) float32 مطبّعة (تُكتب في out إذا مُررت)"""
+        raise NotImplementedError
+
+    def query_key(self, text: str) -> str:
+        """مفتاح الاستعلام للكاش: نصان بنفس المفتاح لهما نفس الـ embedding"""
+        return text
+
+    def encode_query(self, text: str) -> np.ndarray:
+        """embedding استعلام واحد مع كاش (المتجه المعاد للقراءة فقط)"""
+        key = self.query_key(text)
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return vector
+            self.cache_misses += 1
+
+        vector = self.encode([text])[0]
+        vector.flags.writeable = False
+
+        with self._cache_lock:
+            self._cache[key] = vector
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict:
+        total = self.cache_hits + self.cache_misses
+        return {
+            'embedder': self.name,
+            'dim': self.dim,
+            'query_cache_size': len(self._cache),
+            'query_cache_hits': self.cache_hits,
+            'query_cache_misses': self.cache_misses,
+            'query_cache_hit_rate': round(self.cache_hits / total, 3) if total else 0.0
+        }
+
+    def save(self, directory: str = EMBEDDER_DIR):
+        """حفظ النموذج المدرّب بجانب الفهرس (لا شيء للنماذج الثابتة)"""
+
+    def load(self, directory: str = EMBEDDER_DIR) -> bool:
+        return True
+
+
+class HashEmbedder(Embedder):
+    """الطريقة السابقة: متجه عشوائي ثابت من MD5 النص (لا يحمل معنى، للفهارس القديمة)"""
+
+    name = 'hash'
+
+    def encode(self, texts, out=None):
+        return embed_texts(texts, self.dim, out=out)
+
+
+class NgramEmbedder(Embedder):
+    """
+    Char n-grams (2-4) بعد normalize_text → hashing في n_features خانة → TF-IDF
+    (tf لوغاريتمي، idf من النوتات) → إسقاط SVD على أهم dim مكوّن.
+
+    إذا كانت النوتات أقل من dim يكون عدد المكونات بعددها وتُملأ بقية الأبعاد بأصفار
+    حتى يبقى طول المتجه ثابتاً للفهرس.
+    """
+
+    name = 'ngram'
+    FILENAME = 'embedder_ngram.npz'
+    ENCODE_BATCH = 512
+
+    def __init__(self, dim: int = EMBEDDING_DIM, n_features: int = 2 ** 13,
+                 ngram_range=(2, 4), max_fit_docs: int = 4000, **kwargs):
+        super().__init__(dim, **kwargs)
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.max_fit_docs = max_fit_docs
+        self.idf: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.components is not None
+
+    def query_key(self, text: str) -> str:
+        # النص يُوحّد قبل الـ n-grams، فالاختلاف في الحالة والتشكيل والرموز لا يغيّر المتجه
+        return normalize_text(text)
+
+    def _counts(self, text: str, row: np.ndarray):
+        """عدد كل n-gram (بعد الـ hashing) في row"""
+        text = f" {normalize_text(text)} "
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            if len(codes) < n:
+                break
+            # polynomial hash لكل n-gram دفعة واحدة على كل المواضع
+            h = np.zeros(len(codes) - n + 1, dtype=np.uint64)
+            for offset in range(n):
+                h = h * np.uint64(1000003) + codes[offset:len(codes) - n + 1 + offset]
+            h += np.uint64(n)
+            row += np.bincount((h % np.uint64(self.n_features)).astype(np.int64), minlength=self.n_features)
+
+    def _tfidf(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for i, text in enumerate(texts):
+            self._counts(text, matrix[i])
+        np.log1p(matrix, out=matrix)
+        if self.idf is not None:
+            matrix *= self.idf
+        return normalize_rows(matrix)
+
+    def fit(self, texts):
+        sample = list(texts)
+        if len(sample) > self.max_fit_docs:
+            rng = np.random.RandomState(0)
+            sample = [sample[i] for i in rng.choice(len(sample), self.max_fit_docs, replace=False)]
+
+        self.idf = None
+        counts = self._tfidf(sample)
+        df = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(sample)) / (1 + df)) + 1).astype(np.float32)
+
+        matrix = counts * self.idf
+        normalize_rows(matrix)
+        self.components = _top_components(matrix, min(self.dim, len(sample)))
+        self.clear_cache()
+        return self
+
+    def encode(self, texts, out=None):
+        if not self.is_fitted:
+            raise RuntimeError("NgramEmbedder غير مدرّب - أعد بناء الفهرس")
+
+        n = len(texts)
+        if out is None:
+            out = np.zeros((n, self.dim), dtype=np.float32)
+        else:
+            out[:, self.components.shape[0]:] = 0
+
+        k = self.components.shape[0]
+        for start in range(0, n, self.ENCODE_BATCH):
+            batch = self._tfidf(texts[start:start + self.ENCODE_BATCH])
+            np.matmul(batch, self.components.T, out=out[start:start + len(batch), :k])
+        return normalize_rows(out)
+
+    def save(self, directory=EMBEDDER_DIR):
+        np.savez(
+            os.path.join(directory, self.FILENAME),
+            idf=self.idf,
+            components=self.components,
+            n_features=self.n_features,
+            ngram_range=np.array(self.ngram_range),
+            dim=self.dim
+        )
+
+    def load(self, directory=EMBEDDER_DIR) -> bool:
+        path = os.path.join(directory, self.FILENAME)
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            self.idf = data['idf']
+            self.components = data['components']
+            self.n_features = int(data['n_features'])
+            self.ngram_range = tuple(int(n) for n in data['ngram_range'])
+            self.dim = int(data['dim'])
+        self.clear_cache()
+        return True
+
+
+def _top_components(matrix: np.ndarray, k: int) -> np.ndarray:
+    """أهم k متجهات يمنى (SVD) للمصفوفة (k × n_features) بإشارة ثابتة"""
+    if matrix.shape[0] <= 2 * k:
+        _, _, vt = np.linalg.svd(matrix, full_matrices=False)
+        vt = vt[:k]
+    else:
+        # randomized SVD (Halko et al.) للمجموعات الكبيرة
+        rng = np.random.RandomState(0)
+        q = matrix @ rng.standard_normal((matrix.shape[1], k + 10)).astype(np.float32)
+        for _ in range(3):
+            q, _ = np.linalg.qr(matrix @ (matrix.T @ q))
+        q, _ = np.linalg.qr(q)
+        _, _, vt = np.linalg.svd(q.T @ matrix, full_matrices=False)
+        vt = vt[:k]
+
+    # إشارة ثابتة لكل مكون (أكبر قيمة مطلقة موجبة) حتى لا تختلف بين الأجهزة
+    signs = np.sign(vt[np.arange(len(vt)), np.abs(vt).argmax(axis=1)])
+    signs[signs == 0] = 1
+    return np.ascontiguousarray(vt * signs[:, None], dtype=np.float32)
+
+
+EMBEDDERS = {
+    'hash': HashEmbedder,
+    'ngram': NgramEmbedder,
+}
+
+
+def register_embedder(name: str, cls):
+    """تسجيل embedder إضافي (مثل نموذج ONNX محلي) ليُختار عبر EMBEDDER"""
+    EMBEDDERS[name] = cls
+
+
+def create_embedder(name: Optional[str] = None) -> Embedder:
+    """embedder جديد غير مدرّب (EMBEDDER افتراضياً) لبناء فهرس"""
+    name = name or EMBEDDER
+    if name not in EMBEDDERS:
+        raise ValueError(f"embedder غير معروف: {name} (المتاح: {', '.join(EMBEDDERS)})")
+    return EMBEDDERS[name]()
+
+
+def load_embedder(name: Optional[str], directory: str = EMBEDDER_DIR) -> Embedder:
+    """
+    embedder الفهرس المحفوظ (الاسم من metadata؛ الفهارس القديمة بدون اسم تستخدم 'hash')
+
+    إذا لم يوجد نموذج محفوظ يُعاد HashEmbedder مع تنبيه حتى يُعاد بناء الفهرس.
+    """
+    embedder = EMBEDDERS.get(name or 'hash', HashEmbedder)()
+    if not embedder.load(directory):
+        print(f"⚠ نموذج embedder '{embedder.name}' غير موجود في {directory}، استخدام hash حتى إعادة بناء الفهرس")
+        return HashEmbedder()
+    return embedder
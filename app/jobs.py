@@ -0,0 +1,413 @@
+"""
+Jobs - طابور مهام خلفية لعمليات AI الطويلة مع جدول SQLite (jobs)
+
+- enqueue() تحفظ المهمة وتعيد فوراً، والمسار يعيد job id للمتصفح
+- كل عملية (عامل gunicorn) تشغّل dispatcher يحجز المهام من الجدول وينفذها
+  في thread pool صغير؛ الحجز بتحديث مشروط لذلك لا تُنفذ المهمة مرتين
+- أو عملية منفصلة: python -m app.jobs (مع JOBS_IN_PROCESS=false لعمال الويب)
+- إعادة المحاولة مع تأخير متزايد، والإلغاء قبل التنفيذ أو أثناءه
+
+المعالجات تُسجل بـ @job_handler في ملفات المسارات وتستقبل (payload, ctx).
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from app import db
+
+
+JOBS_IN_PROCESS = os.environ.get('JOBS_IN_PROCESS', 'true').lower() == 'true'
+JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 2))
+JOBS_RETRY_BACKOFF = float(os.environ.get('JOBS_RETRY_BACKOFF', 10))
+# مهمة في حالة running لأكثر من هذه المدة تعتبر متروكة (توقف العامل) وتُعاد للطابور
+JOBS_STALE_AFTER = float(os.environ.get('JOBS_STALE_AFTER', 900))
+# الإبقاء على المهام المنتهية في الجدول (أيام)
+JOBS_RETENTION_DAYS = float(os.environ.get('JOBS_RETENTION_DAYS', 7))
+
+
+class JobCancelled(Exception):
+    """طُلب إلغاء المهمة أثناء تنفيذها"""
+
+
+class JobFailed(Exception):
+    """فشل نهائي لا يستحق إعادة المحاولة (مثل بيانات إدخال غير صالحة)"""
+
+
+class _Handler:
+    def __init__(self, kind: str, func: Callable, max_attempts: int, deadline: float,
+                 admin_only: bool, keep_payload: bool):
+        self.kind = kind
+        self.func = func
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.admin_only = admin_only
+        self.keep_payload = keep_payload
+
+
+_handlers: Dict[str, _Handler] = {}
+
+
+def job_handler(kind: str, max_attempts: int = 3, deadline: float = 180,
+                admin_only: bool = False, keep_payload: bool = True):
+    """
+    تسجيل دالة كمعالج لنوع مهمة
+
+    Args:
+        kind: اسم نوع المهمة (مثل 'article.generate')
+        max_attempts: أقصى عدد محاولات قبل اعتبار المهمة فاشلة
+        deadline: مهلة طلبات AI داخل المهمة بالثواني (انظر ai_resilience)
+        admin_only: لا يضيفها عبر /jobs/<kind> إلا المدير
+        keep_payload: False لحذف البيانات المدخلة بعد الانتهاء (مثل الصور)
+    """
+    def decorator(func):
+        _handlers[kind] = _Handler(kind, func, max_attempts, deadline, admin_only, keep_payload)
+        return func
+    return decorator
+
+
+def get_handler(kind: str) -> Optional[_Handler]:
+    return _handlers.get(kind)
+
+
+class JobContext:
+    """سياق المهمة الجارية: معرفها والمستخدم والتحقق من طلب الإلغاء"""
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self.user_id = job.user_id
+        self.attempt = job.attempts
+        self._progress = None
+        self._progress_saved = None
+        self._progress_lock = threading.Lock()
+
+    def cancelled(self) -> bool:
+        from app.models import Job
+        return bool(db.session.query(Job.cancel_requested).filter_by(id=self.job_id).scalar())
+
+    def check_cancelled(self):
+        """يرفع JobCancelled إذا طُلب الإلغاء (يُستدعى قبل أي أثر جانبي مثل الحفظ)"""
+        if self.cancelled():
+            raise JobCancelled()
+
+    def set_progress(self, done: int, total: int, failed: int = 0):
+        """
+        تسجيل تقدم المهمة (مثل on_progress في run_batch)
+
+        آمنة للاستدعاء من حلقة أحداث AI: القيمة تُحفظ في الذاكرة فقط،
+        وتُكتب في الجدول من thread المهمة أثناء run() وعند نهايتها.
+        """
+        with self._progress_lock:
+            self._progress = {'done': done, 'total': total, 'failed': failed}
+
+    def save_progress(self):
+        from app.models import Job
+        with self._progress_lock:
+            progress = self._progress
+        if progress is None or progress == self._progress_saved:
+            return
+        Job.query.filter_by(id=self.job_id).update({'progress': json.dumps(progress)})
+        db.session.commit()
+        self._progress_saved = progress
+
+    def run(self, coro, poll_interval: float = 1.0):
+        """
+        تنفيذ coroutine من ai_service على حلقة أحداث AI مع إمكانية الإلغاء
+
+        يلغي الطلب الجاري إلى OpenAI فور طلب إلغاء المهمة بدلاً من انتظار اكتماله.
+        """
+        from app.ai_client import submit
+        future = submit(coro)
+        try:
+            while True:
+                try:
+                    return future.result(timeout=poll_interval)
+                except TimeoutError:
+                    self.save_progress()
+                    if self.cancelled():
+                        future.cancel()
+                        raise JobCancelled()
+        finally:
+            self.save_progress()
+
+
+def enqueue(kind: str, payload: Dict, user_id: Optional[int] = None, max_attempts: Optional[int] = None):
+    """إضافة مهمة للطابور وإعادة سجلها (Job) فوراً"""
+    from app.models import Job
+
+    handler = _handlers.get(kind)
+    if handler is None:
+        raise ValueError(f"نوع مهمة غير معروف: {kind}")
+
+    job = Job(
+        kind=kind,
+        user_id=user_id,
+        payload=json.dumps(payload, ensure_ascii=False),
+        max_attempts=max_attempts or handler.max_attempts
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    runner = get_runner()
+    if runner is not None:
+        runner.wake()
+    return job
+
+
+def cancel(job) -> bool:
+    """
+    إلغاء مهمة: المهام في الطابور تُلغى فوراً، والجارية يُطلب إيقافها
+
+    Returns:
+        False إذا كانت المهمة منتهية أصلاً
+    """
+    from app.models import Job
+
+    if job.is_finished:
+        return False
+
+    cancelled_now = Job.query.filter_by(id=job.id, status=Job.QUEUED).update({
+        'status': Job.CANCELLED,
+        'cancel_requested': True,
+        'finished_at': datetime.utcnow()
+    })
+    if not cancelled_now:
+        Job.query.filter_by(id=job.id).update({'cancel_requested': True})
+    db.session.commit()
+    db.session.refresh(job)
+    return True
+
+
+def retry(job) -> bool:
+    """إعادة مهمة فاشلة أو ملغاة إلى الطابور (بعدد محاولات جديد)"""
+    from app.models import Job
+
+    if job.status not in (Job.FAILED, Job.CANCELLED):
+        return False
+
+    job.status = Job.QUEUED
+    job.attempts = 0
+    job.error = None
+    job.cancel_requested = False
+    job.run_after = datetime.utcnow()
+    job.started_at = None
+    job.finished_at = None
+    db.session.commit()
+
+    runner = get_runner()
+    if runner is not None:
+        runner.wake()
+    return True
+
+
+class JobRunner:
+    """Dispatcher يحجز المهام من جدول jobs وينفذها في thread pool (واحد لكل عملية)"""
+
+    def __init__(self, app, workers: int = JOBS_WORKERS):
+        self.app = app
+        self.pid = os.getpid()
+        self.worker_id = f"{socket.gethostname()}:{self.pid}"
+        self.workers = workers
+        self._slots = threading.Semaphore(workers)
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._thread = threading.Thread(target=self._loop, name='job-dispatcher', daemon=True)
+        self._last_maintenance = 0.0
+
+    def start(self):
+        self._thread.start()
+        print(f"🧵 Job runner [{self.worker_id}]: {self.workers} عمال")
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, wait: bool = True):
+        self._stopped.set()
+        self._wake.set()
+        self._pool.shutdown(wait=wait)
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self._maintenance()
+                    while self._slots.acquire(blocking=False):
+                        job_id = self._claim()
+                        if job_id is None:
+                            self._slots.release()
+                            break
+                        self._pool.submit(self._execute, job_id)
+            except Exception as e:
+                print(f"⚠️ Job dispatcher error: {e}")
+
+            self._wake.wait(JOBS_POLL_INTERVAL)
+            self._wake.clear()
+
+    def _claim(self) -> Optional[str]:
+        """حجز أقدم مهمة جاهزة بتحديث مشروط (آمن بين عدة عمليات)"""
+        from app.models import Job
+
+        now = datetime.utcnow()
+        candidates = (db.session.query(Job.id)
+                      .filter(Job.status == Job.QUEUED, Job.run_after <= now)
+                      .order_by(Job.created_at)
+                      .limit(5)
+                      .all())
+        for (job_id,) in candidates:
+            claimed = Job.query.filter_by(id=job_id, status=Job.QUEUED).update({
+                'status': Job.RUNNING,
+                'locked_by': self.worker_id,
+                'started_at': now,
+                'attempts': Job.attempts + 1
+            })
+            db.session.commit()
+            if claimed:
+                return job_id
+        return None
+
+    def _maintenance(self):
+        """إعادة المهام المتروكة للطابور وحذف المهام المنتهية القديمة (كل دقيقة)"""
+        from app.models import Job
+
+        if time.monotonic() - self._last_maintenance < 60:
+            return
+        self._last_maintenance = time.monotonic()
+
+        stale_before = datetime.utcnow() - timedelta(seconds=JOBS_STALE_AFTER)
+        stale = Job.query.filter(Job.status == Job.RUNNING, Job.started_at < stale_before).all()
+        for job in stale:
+            print(f"⚠️ Job {job.kind} [{job.id}]: متروكة لدى {job.locked_by}، إعادة للطابور")
+            self._finish_attempt(job, "توقف العامل أثناء التنفيذ")
+
+        expired_before = datetime.utcnow() - timedelta(days=JOBS_RETENTION_DAYS)
+        Job.query.filter(Job.status.in_(Job.FINISHED_STATES), Job.finished_at < expired_before).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    def _execute(self, job_id: str):
+        from app import ai_resilience
+        from app.models import Job
+
+        try:
+            with self.app.app_context():
+                job = db.session.get(Job, job_id)
+                handler = _handlers.get(job.kind)
+                if handler is None:
+                    self._finish(job, Job.FAILED, error=f"لا يوجد معالج للنوع {job.kind}")
+                    return
+
+                ctx = JobContext(job)
+                payload = json.loads(job.payload or '{}')
+                token = ai_resilience.set_deadline(handler.deadline)
+                started = time.perf_counter()
+                try:
+                    result = handler.func(payload, ctx)
+                    if ctx.cancelled():
+                        raise JobCancelled()
+                except JobCancelled:
+                    db.session.rollback()
+                    self._finish(db.session.get(Job, job_id), Job.CANCELLED, handler=handler)
+                    print(f"🛑 Job {job.kind} [{job_id}]: أُلغيت")
+                except JobFailed as e:
+                    db.session.rollback()
+                    self._finish(db.session.get(Job, job_id), Job.FAILED, error=str(e), handler=handler)
+                    print(f"❌ Job {job.kind} [{job_id}]: {e}")
+                except Exception as e:
+                    db.session.rollback()
+                    self._finish_attempt(db.session.get(Job, job_id), str(e), handler=handler)
+                else:
+                    self._finish(db.session.get(Job, job_id), Job.SUCCEEDED, result=result, handler=handler)
+                    print(f"✅ Job {job.kind} [{job_id}]: اكتملت في {time.perf_counter() - started:.1f}s")
+                finally:
+                    ai_resilience.reset_deadline(token)
+        except Exception as e:
+            print(f"⚠️ Job [{job_id}] execution error: {e}")
+        finally:
+            self._slots.release()
+            self._wake.set()
+
+    def _finish_attempt(self, job, error: str, handler: Optional[_Handler] = None):
+        """فشل محاولة: إعادة للطابور مع تأخير متزايد، أو فشل نهائي بعد آخر محاولة"""
+        from app.models import Job
+
+        if job.cancel_requested:
+            self._finish(job, Job.CANCELLED, error=error, handler=handler)
+        elif job.attempts < job.max_attempts:
+            delay = JOBS_RETRY_BACKOFF * (2 ** (job.attempts - 1))
+            job.status = Job.QUEUED
+            job.error = error
+            job.locked_by = None
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            db.session.commit()
+            print(f"🔁 Job {job.kind} [{job.id}]: محاولة {job.attempts}/{job.max_attempts} فشلت ({error})، إعادة بعد {delay:.0f}s")
+        else:
+            self._finish(job, Job.FAILED, error=error, handler=handler)
+            print(f"❌ Job {job.kind} [{job.id}]: فشلت بعد {job.attempts} محاولات ({error})")
+
+    def _finish(self, job, status: str, result=None, error: Optional[str] = None,
+                handler: Optional[_Handler] = None):
+        job.status = status
+        job.finished_at = datetime.utcnow()
+        job.locked_by = None
+        if result is not None:
+            job.result = json.dumps(result, ensure_ascii=False, default=str)
+        if error is not None:
+            job.error = error
+        if handler is not None and not handler.keep_payload:
+            job.payload = None
+        db.session.commit()
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+_app = None
+
+
+def get_runner() -> Optional[JobRunner]:
+    """runner العملية الحالية (يُنشأ عند أول استخدام وبعد fork)، أو None إذا كان التنفيذ في عملية منفصلة"""
+    global _runner
+    if not JOBS_IN_PROCESS or _app is None:
+        return _runner
+    if _runner is None or _runner.pid != os.getpid():
+        with _runner_lock:
+            if _runner is None or _runner.pid != os.getpid():
+                _runner = JobRunner(_app)
+                _runner.start()
+    return _runner
+
+
+def init_app(app):
+    """تشغيل runner المهام في كل عامل ويب عند أول طلب (بعد fork)"""
+    global _app
+    _app = app
+
+    if JOBS_IN_PROCESS:
+        @app.before_request
+        def _ensure_job_runner():
+            get_runner()
+
+
+def run_worker(app, workers: int = JOBS_WORKERS):
+    """تشغيل عملية مهام منفصلة (لا تعود إلا عند الإيقاف)"""
+    global _runner
+    _runner = JobRunner(app, workers)
+    _runner.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        _runner.stop(wait=True)
+
+
+if __name__ == '__main__':
+    # عبر app.jobs وليس __main__ حتى يرى العامل المعالجات المسجلة من ملفات المسارات
+    from app import create_app, jobs
+    jobs.run_worker(create_app())
@@ -0,0 +1,301 @@
+"""
+JSON Stream - تحليل JSON تدريجي لمخرجات النماذج أثناء البث (streaming)
+- JSONExtractor: استخراج أول كائن/مصفوفة JSON متوازنة (أو كائن فقط مع expect=dict) في مرور واحد
+- JSONFieldStream: يستخرج كل حقل في المستوى الأعلى من أول كائن JSON بمجرد اكتماله
+"""
+
+import json
+import re
+from typing import Any, List, Tuple
+
+
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*')
+_NON_WS = re.compile(r'\S')
+
+# أول حرف مقبول بعد القوس المفتوح؛ يُستبعد مثل {العود} و [انظر أدناه] في الشرح النصي
+_VALID_FIRST = {
+    '{': frozenset('"}'),
+    '[': frozenset('"{[]-0123456789tfn'),
+}
+
+_decoder = json.JSONDecoder()
+
+
+_OPENERS = {None: None, dict: '{', list: '['}
+
+
+def _find_opener(text: str, pos: int, only: str = None) -> int:
+    """
+    موضع أول '{' أو '[' بدءاً من pos (str.find أسرع بكثير من regex لهذا البحث)،
+    أو أول only فقط إذا مُرر
+    """
+    if only is not None:
+        return text.find(only, pos)
+    brace = text.find('{', pos)
+    bracket = text.find('[', pos, brace if brace >= 0 else len(text))
+    return bracket if bracket >= 0 else brace
+
+
+class JSONExtractError(ValueError):
+    """فشل استخراج JSON، مع موضع الخطأ في النص الكامل"""
+
+    def __init__(self, msg: str, pos: int):
+        super().__init__(f"{msg} (الموضع {pos})")
+        self.msg = msg
+        self.pos = pos
+
+
+class JSONExtractor:
+    """
+    مستخرج JSON تدريجي أحادي المرور
+
+    يبحث عن أول كائن أو مصفوفة متوازنة (مع مراعاة النصوص وعلامات الهروب)
+    ويتجاهل ما قبلها وما بعدها، مثل ```json أو شرح نصي من النموذج.
+    يتم تحليل الجزء المتوازن بـ json.loads مرة واحدة فقط؛ وإذا فشل يُتخطى
+    بالكامل (وليس ما بداخله) ويستمر البحث بعده. الأقواس التي لا يمكن أن
+    تبدأ JSON (مثل {العود}) تُتخطى كذلك دون تحليل.
+
+    عندما يحتوي الجزء الحالي على القيمة كاملة (الحالة الشائعة عند تحليل
+    استجابة كاملة) يتم فكها مباشرة بـ raw_decode دون مسح حرف بحرف.
+
+    expect=dict (أو list): يُبحث عن كائنات (أو مصفوفات) فقط، فشرح مثل "[1] {...}"
+    أو قائمة بين أقواس قبل الكائن لا تُعاد بدلاً منه.
+
+    Example:
+        extractor = JSONExtractor()
+        for delta in deltas:
+            if extractor.feed(delta):
+                break
+        data = extractor.close()
+    """
+
+    def __init__(self, expect: type = None):
+        if expect not in _OPENERS:
+            raise ValueError(f"expect يجب أن يكون dict أو list وليس {expect!r}")
+        self._only = _OPENERS[expect]
+        self._offset = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = 0
+        self._opener = None
+        self._plausible = None
+        self._chunk_start = 0
+        self._parts = []
+        self._done = False
+        self._value = None
+        self._error = None
+
+    @property
+    def done(self) -> bool:
+        """هل تم استخراج قيمة JSON صالحة"""
+        return self._done
+
+    @property
+    def value(self) -> Any:
+        return self._value
+
+    def feed(self, chunk: str) -> bool:
+        """تغذية جزء جديد من النص، ويعيد True عند اكتمال قيمة صالحة"""
+        if self._done or not chunk:
+            return self._done
+
+        pos = 0
+        n = len(chunk)
+        while pos < n:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    pos += 1
+                pos = _STRING_BODY.match(chunk, pos).end()
+                if pos >= n:
+                    break
+                if chunk[pos] == '"':
+                    self._in_string = False
+                else:
+                    # '\\' في نهاية الجزء: الحرف المهرَّب في الجزء القادم
+                    self._escape = True
+                pos += 1
+                continue
+
+            if self._depth == 0:
+                start = _find_opener(chunk, pos, self._only)
+                if start < 0:
+                    break
+                self._begin(start, chunk[start])
+                pos = start + 1
+                continue
+
+            if self._plausible is None:
+                # أول حرف بعد القوس (قد يصل في الجزء القادم)
+                m = _NON_WS.search(chunk, pos)
+                if m is None:
+                    break
+                self._plausible = m.group() in _VALID_FIRST[self._opener]
+                if not self._plausible:
+                    self._parts = []
+                elif not self._parts and self._decode(chunk):
+                    return True
+
+            m = _STRUCTURAL.search(chunk, pos)
+            if m is None:
+                break
+            ch = m.group()
+            pos = m.end()
+            if ch == '"':
+                self._in_string = True
+            elif ch == '{' or ch == '[':
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0 and self._complete(chunk, pos):
+                    return True
+
+        if self._depth > 0 and self._plausible is not False:
+            self._parts.append(chunk[self._chunk_start:])
+            self._chunk_start = 0
+        self._offset += n
+        return False
+
+    def close(self) -> Any:
+        """
+        إنهاء التغذية وإرجاع القيمة المستخرجة
+
+        Raises:
+            JSONExtractError: إذا لم توجد قيمة صالحة (مع موضع الخطأ)
+        """
+        if self._done:
+            return self._value
+        if self._depth > 0 and self._plausible:
+            raise JSONExtractError("JSON غير مكتمل", self._offset)
+        if self._error is not None:
+            raise self._error
+        raise JSONExtractError("لم يتم العثور على JSON", self._offset)
+
+    def _begin(self, index: int, opener: str):
+        self._start = self._offset + index
+        self._chunk_start = index
+        self._depth = 1
+        self._opener = opener
+        self._plausible = None
+
+    def _decode(self, chunk: str) -> bool:
+        try:
+            self._value, _ = _decoder.raw_decode(chunk, self._chunk_start)
+        except json.JSONDecodeError:
+            return False
+        self._done = True
+        return True
+
+    def _complete(self, chunk: str, end: int) -> bool:
+        if not self._plausible:
+            return False
+
+        self._parts.append(chunk[self._chunk_start:end])
+        text = ''.join(self._parts)
+        self._parts = []
+
+        try:
+            self._value = json.loads(text)
+        except json.JSONDecodeError as e:
+            self._error = JSONExtractError(e.msg, self._start + e.pos)
+            return False
+
+        self._done = True
+        return True
+
+
+def extract_json(text: str, expect: type = None) -> Any:
+    """
+    استخراج أول كائن أو مصفوفة JSON صالحة من نص كامل (أول كائن فقط مع expect=dict)
+
+    Raises:
+        JSONExtractError: إذا لم توجد قيمة صالحة (مع موضع الخطأ)
+    """
+    extractor = JSONExtractor(expect)
+    extractor.feed(text)
+    return extractor.close()
+
+
+class JSONFieldStream:
+    """
+    محلل تدريجي لحقول الكائن الأعلى
+
+    يتم تغذيته بأجزاء النص كما تصل من النموذج، ويعيد أزواج (key, value)
+    لكل حقل اكتمل. يتجاهل أي نص قبل أول '{' (مثل ```json أو مقدمة نصية).
+
+    Example:
+        stream = JSONFieldStream()
+        for delta in deltas:
+            for key, value in stream.feed(delta):
+                ...
+    """
+
+    def __init__(self):
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member = []
+
+    @property
+    def done(self) -> bool:
+        """هل اكتمل الكائن الأعلى"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """تغذية جزء جديد من النص وإرجاع الحقول التي اكتملت"""
+        fields = []
+        if self._done or not chunk:
+            return fields
+
+        member = self._member
+        for ch in chunk:
+            if not self._started:
+                if ch == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                member.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(fields)
+                    self._done = True
+                    break
+            elif ch == ',' and self._depth == 1:
+                self._emit(fields)
+                continue
+
+            member.append(ch)
+
+        return fields
+
+    def _emit(self, fields: List[Tuple[str, Any]]):
+        text = ''.join(self._member).strip()
+        self._member.clear()
+        if not text:
+            return
+
+        try:
+            parsed = json.loads('{' + text + '}')
+        except json.JSONDecodeError:
+            return
+
+        fields.extend(parsed.items())
@@ -271,9 +271,9 @@ class PerfumeNote(db.Model):
     
     @staticmethod
     def get_all_notes_as_dict():
-        """جلب جميع النوتات الفعّالة كقائمة قواميس"""
-        notes = PerfumeNote.get_active_notes()
-        return [note.to_dict() for note in notes]
+        """جلب جميع النوتات الفعّالة كقائمة قواميس (من مخزن النوتات المشترك، app/notes_store.py)"""
+        from app.notes_store import get_notes_store
+        return get_notes_store().all()
 
 
 class DailyScentSuggestion(db.Model):
@@ -291,3 +291,56 @@ class DailyScentSuggestion(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     user = db.relationship('User', backref=db.backref('daily_suggestions', lazy=True))
+
+
+class Job(db.Model):
+    """مهمة خلفية لعمليات AI الطويلة (توليد مقال، استيراد نوتات، تحليل وجه) - انظر app/jobs.py"""
+    __tablename__ = 'jobs'
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: secrets.token_hex(16))
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=QUEUED, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    payload = db.Column(db.Text)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    progress = db.Column(db.Text)  # JSON: {'done', 'total', 'failed'} للمهام متعددة الأجزاء
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATES
+    
+    def to_dict(self, include_result=False):
+        import json
+        
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'cancel_requested': self.cancel_requested,
+            'error': self.error,
+            'progress': json.loads(self.progress) if self.progress else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if include_result:
+            data['result'] = json.loads(self.result) if self.result else None
+        return data
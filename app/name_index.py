@@ -0,0 +1,81 @@
+"""
+Name Index - فهرس trigrams لأسماء النوتات (الإنجليزية والعربية) للبحث التقريبي بالاسم
+
+بدلاً من SequenceMatcher مع كل أسماء الكتالوج في كل بحث:
+- الأسماء تُوحّد بـ normalize_text (app/embeddings.py): الحالة، التشكيل، التطويل، الهمزات،
+  التاء المربوطة والألف المقصورة، فـ "عنبر" و "عَنْبَر" و "ﺃمبر"/"امبر" تتطابق
+- كل اسم → مجموعة trigrams أحرف (مع مسافة في الطرفين) → قوائم posting لكل trigram
+- البحث: عدد الـ trigrams المشتركة مع كل اسم (bincount على قوائم trigrams الاستعلام فقط)
+  → معامل Dice → أفضل FUZZY_NAME_CANDIDATES مرشح فقط يُقارن بـ SequenceMatcher
+"""
+
+import os
+from difflib import SequenceMatcher
+from typing import Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.embeddings import normalize_text
+
+
+FUZZY_NAME_CANDIDATES = int(os.environ.get('FUZZY_NAME_CANDIDATES', 32))
+
+
+def trigrams(text: str) -> Set[str]:
+    """trigrams أحرف نص موحّد (المسافة في الطرفين تميّز بداية ونهاية الكلمة)"""
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    فهرس أسماء → مفاتيح (معرفات النوتات). الاسم الواحد قد يظهر لعدة مفاتيح، والمفتاح
+    لعدة أسماء (الإنجليزي والعربي)
+    """
+
+    def __init__(self, entries: Iterable[Tuple[Hashable, Optional[str]]]):
+        self.keys: List = []
+        self.names: List[str] = []
+        postings = {}
+        for key, name in entries:
+            name = normalize_text(name or '')
+            entry = len(self.names)
+            self.keys.append(key)
+            self.names.append(name)
+            if name:
+                for gram in trigrams(name):
+                    postings.setdefault(gram, []).append(entry)
+        self.postings = {gram: np.array(entries, dtype=np.int32) for gram, entries in postings.items()}
+        self.sizes = np.array([len(trigrams(name)) if name else 0 for name in self.names], dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def candidates(self, query: str, limit: int = FUZZY_NAME_CANDIDATES) -> np.ndarray:
+        """أرقام الأسماء الأكثر trigrams مشتركة مع الاستعلام الموحّد (Dice)، بترتيب الإدخال"""
+        grams = trigrams(query)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return np.empty(0, dtype=np.int64)
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.names))
+        matched = np.flatnonzero(shared)
+        if len(matched) > limit:
+            dice = 2.0 * shared[matched] / (len(grams) + self.sizes[matched])
+            matched = matched[np.argpartition(-dice, limit)[:limit]]
+        return np.sort(matched)
+
+    def search(self, query: str, threshold: float = 0.3,
+               limit: int = FUZZY_NAME_CANDIDATES) -> Tuple[Optional[Hashable], float]:
+        """
+        (المفتاح، الدرجة) لأفضل اسم بتشابه SequenceMatcher أعلى من threshold بين المرشحين،
+        أو (None, threshold). عند التساوي يفوز الاسم الأسبق في الإدخال
+        """
+        query = normalize_text(query or '')
+        best, best_score = None, threshold
+        if not query:
+            return best, best_score
+        for entry in self.candidates(query, limit).tolist():
+            score = SequenceMatcher(None, query, self.names[entry]).ratio()
+            if score > best_score:
+                best, best_score = entry, score
+        return (self.keys[best] if best is not None else None), best_score
@@ -0,0 +1,103 @@
+"""
+Note Graph - رسم التوافق بين النوتات من works_well_with و avoid_with
+
+يُبنى مرة واحدة لكل مخزن نوتات (NotesStore.compatibility) بدلاً من مقارنة قوائم الأسماء
+لكل زوج في كل طلب:
+- كل اسم في قوائم النوتة يُحوّل إلى صف نوتة في المخزن (الاسم الإنجليزي أو العربي، تطابق تام)؛
+  الأسماء العامة ("woods"، "heavy oud") التي لا تطابق نوتة تُتجاهل كما في المقارنة السابقة
+- الرسم متماثل: الزوج متوافق إذا ذكرت إحدى النوتتين الأخرى في works_well_with (الوزن 2 إذا
+  ذكرتها الاثنتان)، وإلا متعارض إذا ذكرتها في avoid_with
+- مصفوفة متفرقة (CSR): لكل صف جيرانه مرتبين وأوزانهم، فالذاكرة بعدد الروابط وليس n²
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+WORKS_MUTUAL = 2
+WORKS = 1
+AVOID = -1
+
+
+class CompatibilityGraph:
+    """
+    علاقات التوافق بين نوتات مخزن واحد (بمعرفات المخزن)
+
+    relation(a, b): 2 / 1 متوافقة (متبادلة / من طرف واحد)، -1 متعارضة، 0 بدون علاقة معروفة
+    """
+
+    def __init__(self, store):
+        self.store = store
+        works, avoid = {}, set()
+        for row, (works_with, avoid_with) in enumerate(zip(store.column('works_well_with'),
+                                                          store.column('avoid_with'))):
+            for partner in self._resolve(works_with, row):
+                pair = (min(row, partner), max(row, partner))
+                works[pair] = works.get(pair, 0) + 1
+            for partner in self._resolve(avoid_with, row):
+                avoid.add((min(row, partner), max(row, partner)))
+
+        # التوافق يتقدم على التعارض (نفس أولوية المقارنة السابقة)
+        edges = dict.fromkeys(avoid - works.keys(), AVOID)
+        edges.update(works)
+
+        pairs = np.array(list(edges), dtype=np.int32).reshape(-1, 2)
+        weights = np.array(list(edges.values()), dtype=np.int8)
+        # الاتجاهان لكل زوج، مرتبة حسب (الصف، الجار)
+        source = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        target = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        weights = np.concatenate([weights, weights])
+        order = np.lexsort((target, source))
+        self.indices = target[order]
+        self.weights = weights[order]
+        self.indptr = np.zeros(len(store.ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source, minlength=len(store.ids)), out=self.indptr[1:])
+
+    def _resolve(self, names, row: int) -> List[int]:
+        """صفوف النوتات المذكورة في قائمة أسماء (بدون النوتة نفسها)"""
+        if not isinstance(names, list):
+            return []
+        rows = []
+        for name in names:
+            note_id = self.store.find_id(str(name))
+            partner = self.store.row_of(note_id) if note_id is not None else None
+            if partner is not None and partner != row:
+                rows.append(partner)
+        return rows
+
+    def __len__(self) -> int:
+        """عدد الأزواج"""
+        return len(self.indices) // 2
+
+    def _neighbors(self, note_id) -> Tuple[np.ndarray, np.ndarray]:
+        row = self.store.row_of(note_id)
+        if row is None:
+            return self.indices[:0], self.weights[:0]
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def relation(self, note_id, other_id) -> int:
+        """وزن العلاقة بين نوتتين (بحث ثنائي في جيران الأولى)"""
+        other = self.store.row_of(other_id)
+        if other is None:
+            return 0
+        neighbors, weights = self._neighbors(note_id)
+        position = int(np.searchsorted(neighbors, other))
+        if position < len(neighbors) and neighbors[position] == other:
+            return int(weights[position])
+        return 0
+
+    def partners(self, note_id, limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """أفضل شركاء النوتة: (المعرف، الوزن) للمتوافقة، المتبادلة أولاً ثم بترتيب المخزن"""
+        neighbors, weights = self._neighbors(note_id)
+        keep = weights > 0
+        neighbors, weights = neighbors[keep], weights[keep]
+        order = np.lexsort((neighbors, -weights.astype(np.int16)))[:limit]
+        ids = self.store.ids_at(neighbors[order])
+        return list(zip(ids, weights[order].tolist()))
+
+    def avoided(self, note_id) -> List:
+        """معرفات النوتات المتعارضة معها بترتيب المخزن"""
+        neighbors, weights = self._neighbors(note_id)
+        return self.store.ids_at(neighbors[weights < 0])
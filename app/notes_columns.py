@@ -0,0 +1,212 @@
+"""
+Notes Columns - ملف ثنائي عمودي لبيانات النوتات يُفتح بـ mmap بدلاً من تحليل JSON
+
+كل حقل عمود مستقل في ملف واحد (notes.columns):
+- int / float: مصفوفة numpy (int64 / float64)
+- str: جدول offsets (int64، n+1) + بايتات UTF-8 متتالية
+- list (قوائم نصوص مثل works_well_with): offsets الصفوف → offsets العناصر → البايتات
+- json: أي قيم أخرى (None، bool، أنواع مختلطة) كنص JSON لكل صف بنفس جدول offsets
+
+التخطيط: MAGIC (8 بايت) + طول الترويسة (uint64) + ترويسة JSON صغيرة (الأعمدة ومواقعها)
+ثم المصفوفات بمحاذاة 8 بايت. الفتح يقرأ الترويسة فقط؛ المصفوفات views على نفس الـ mmap
+(بدون نسخ)، فكل workers الخادم يتشاركون صفحات الملف من page cache نظام التشغيل،
+والصف يُحوّل إلى dict فقط عند طلبه.
+"""
+
+import json
+import os
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+MAGIC = b'NOTECOL1'
+ALIGN = 8
+
+
+def _kind_of(values: List) -> str:
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return 'int'
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return 'float'
+    if all(isinstance(v, str) for v in values):
+        return 'str'
+    if all(isinstance(v, list) and all(isinstance(item, str) for item in v) for v in values):
+        return 'list'
+    return 'json'
+
+
+def _strings(values: List[str]):
+    """(offsets، بايتات) لقائمة نصوص"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def write_columns(path: str, notes: List[Dict], key: str = 'id'):
+    """
+    كتابة النوتات (نفس الترتيب) بالتخطيط العمودي، ذرياً (ملف مؤقت ثم os.replace)
+    حتى لا يرى قارئ يستخدم الملف عبر mmap محتوى نصف مكتوب
+
+    key: حقل المعرف الرقمي الذي يُبنى له جدول بحث مرتب (searchsorted)
+    """
+    fields = list(dict.fromkeys(field for note in notes for field in note))
+    buffers = []
+    columns = []
+
+    def add(array: np.ndarray) -> List:
+        array = np.ascontiguousarray(array)
+        buffers.append(array)
+        return [len(buffers) - 1, array.dtype.str, len(array)]
+
+    for field in fields:
+        values = [note.get(field) for note in notes]
+        kind = _kind_of(values)
+        if kind == 'int':
+            spec = {'values': add(np.array(values, dtype=np.int64))}
+        elif kind == 'float':
+            spec = {'values': add(np.array(values, dtype=np.float64))}
+        elif kind == 'list':
+            rows = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in values], out=rows[1:])
+            offsets, data = _strings([item for value in values for item in value])
+            spec = {'rows': add(rows), 'offsets': add(offsets), 'data': add(data)}
+        else:
+            if kind == 'json':
+                values = [json.dumps(value, ensure_ascii=False) for value in values]
+            offsets, data = _strings(values)
+            spec = {'offsets': add(offsets), 'data': add(data)}
+        columns.append({'name': field, 'kind': kind, 'buffers': spec})
+
+    header = {'rows': len(notes), 'columns': columns}
+    keys = [note.get(key) for note in notes]
+    if notes and _kind_of(keys) == 'int':
+        keys = np.array(keys, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        header['key'] = {'name': key, 'sorted': add(keys[order]), 'rows': add(order.astype(np.int64))}
+
+    # مواقع المصفوفات (نسبة لبداية قسم البيانات) تُحسب قبل كتابة الترويسة
+    positions, data_size = [], 0
+    for array in buffers:
+        positions.append(data_size)
+        data_size += -(-array.nbytes // ALIGN) * ALIGN
+    for spec in [column['buffers'] for column in columns] + ([header['key']] if 'key' in header else []):
+        for name, value in spec.items():
+            if isinstance(value, list):
+                value[0] = positions[value[0]]
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGN) * ALIGN
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header_bytes)).tobytes())
+        f.write(header_bytes)
+        for array, position in zip(buffers, positions):
+            f.seek(data_start + position)
+            f.write(array.tobytes())
+        f.truncate(data_start + data_size)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class NoteColumns(Mapping):
+    """
+    قارئ notes.columns عبر mmap: Mapping من المعرف (أو رقم الصف) إلى dict النوتة
+
+    keyed=True: المفاتيح = حقل المعرف (PerfumeNote.id، معرفات FAISS في IndexIDMap2)
+    keyed=False: المفاتيح = رقم الصف (الفهارس القديمة)
+    """
+
+    def __init__(self, path: str, keyed: bool = True):
+        self.path = path
+        self._buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"ملف أعمدة غير صالح: {path}")
+        header_size = int(self._buffer[len(MAGIC):len(MAGIC) + 8].view(np.uint64)[0])
+        header_end = len(MAGIC) + 8 + header_size
+        header = json.loads(bytes(self._buffer[len(MAGIC) + 8:header_end]).decode('utf-8'))
+        self._data_start = -(-header_end // ALIGN) * ALIGN
+
+        self.rows = header['rows']
+        self.fields = [column['name'] for column in header['columns']]
+        self._columns = {
+            column['name']: (column['kind'], {name: self._array(spec) for name, spec in column['buffers'].items()})
+            for column in header['columns']
+        }
+        key = header.get('key')
+        self.keyed = keyed and key is not None
+        self._key_name = key['name'] if self.keyed else None
+        self._sorted_keys = self._array(key['sorted']) if self.keyed else None
+        self._key_rows = self._array(key['rows']) if self.keyed else None
+
+    def _array(self, spec: List) -> np.ndarray:
+        """view على الـ mmap بدون نسخ"""
+        position, dtype, count = spec
+        dtype = np.dtype(dtype)
+        start = self._data_start + position
+        return self._buffer[start:start + count * dtype.itemsize].view(dtype)
+
+    @staticmethod
+    def _text(buffers: Dict, item: int) -> str:
+        offsets = buffers['offsets']
+        return bytes(buffers['data'][offsets[item]:offsets[item + 1]]).decode('utf-8')
+
+    def value(self, field: str, row: int):
+        """قيمة حقل واحد في صف واحد (بدون تحويل بقية الصف)"""
+        kind, buffers = self._columns[field]
+        if kind == 'int':
+            return int(buffers['values'][row])
+        if kind == 'float':
+            return float(buffers['values'][row])
+        if kind == 'str':
+            return self._text(buffers, row)
+        if kind == 'list':
+            rows = buffers['rows']
+            return [self._text(buffers, item) for item in range(rows[row], rows[row + 1])]
+        return json.loads(self._text(buffers, row))
+
+    def row(self, row: int) -> Dict:
+        """الصف كـ dict جديد (نفس شكل PerfumeNote.to_dict())"""
+        return {field: self.value(field, row) for field in self.fields}
+
+    def column(self, field: str):
+        """العمود كاملاً: مصفوفة numpy (view) للأرقام أو قائمة قيم للباقي (None لحقل غير موجود)"""
+        if field not in self._columns:
+            return [None] * self.rows
+        kind, buffers = self._columns[field]
+        if kind in ('int', 'float'):
+            return buffers['values']
+        return [self.value(field, row) for row in range(self.rows)]
+
+    def row_of(self, key) -> Optional[int]:
+        """رقم صف المفتاح (بحث ثنائي في المعرفات المرتبة) أو None"""
+        if not self.keyed:
+            return key if isinstance(key, (int, np.integer)) and 0 <= key < self.rows else None
+        if not isinstance(key, (int, np.integer)):
+            return None
+        position = int(np.searchsorted(self._sorted_keys, key))
+        if position < self.rows and self._sorted_keys[position] == key:
+            return int(self._key_rows[position])
+        return None
+
+    def __getitem__(self, key) -> Dict:
+        row = self.row_of(key)
+        if row is None:
+            raise KeyError(key)
+        return self.row(row)
+
+    def __contains__(self, key) -> bool:
+        return self.row_of(key) is not None
+
+    def __iter__(self) -> Iterator:
+        if self.keyed:
+            return iter(self.column(self._key_name).tolist())
+        return iter(range(self.rows))
+
+    def __len__(self) -> int:
+        return self.rows
@@ -0,0 +1,253 @@
+"""
+Notes Index - نسخ الفهرس (snapshots) وتحديثه تدريجياً عند إضافة/تعديل/تعطيل/حذف نوتة
+
+نسخ الفهرس:
+- كل إعادة بناء أو ضغط تكتب نسخة كاملة (notes.index، notes.columns، notes_embeddings.json،
+  notes_cache.json، ملف الـ embedder) في مجلد مؤقت ثم تعيد تسميته إلى app/data/snapshots/<generation>
+  (rename ذري)، ثم تكتب رقم النسخة في app/data/CURRENT (os.replace ذري)
+- القارئ لا يرى ملفاً نصف مكتوب أبداً، وكل worker يقارن CURRENT (stat فقط) في كل طلب
+  ويحمّل النسخة الجديدة عند تغيّرها (NotesRetriever.sync)
+- بدون CURRENT (النسخة 0): الملفات المرفقة مع المشروع في app/data مباشرة
+- ملفات النسخة لا تُعدّل بعد نشرها، لذلك الفهرس (read_index) وبيانات النوتات
+  (notes.columns، app/notes_columns.py) تُفتح بـ mmap وتتشاركها كل الـ workers
+
+التحديث التدريجي:
+بدلاً من rebuild_faiss_index() (جلب كل النوتات، embeddings للكل، كتابة كل الملفات)
+كل تعديل يُسجّل كسطر JSON في سجل الكتابة المسبقة (WAL) الخاص بالنسخة الحالية ويُطبّق
+في الذاكرة كتعديل صغير فوق النسخة (notes_retriever.IndexView):
+- upsert: embedding لنوتة واحدة
+- delete: إخفاء متجه النوتة من نتائج النسخة
+الضغط (compact) يدمج التعديلات في نسخة جديدة: تلقائياً كل INDEX_COMPACT_OPS عملية
+أو يدوياً من لوحة الإدارة.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from app.notes_columns import write_columns
+from app.rag_builder import create_note_text
+from app.vector_index import build_index, has_id_map, index_type_of, read_index
+
+
+DATA_DIR = 'app/data'
+SNAPSHOTS_DIR = 'snapshots'
+INDEX_COMPACT_OPS = int(os.environ.get('INDEX_COMPACT_OPS', 200))
+INDEX_SNAPSHOT_KEEP = int(os.environ.get('INDEX_SNAPSHOT_KEEP', 3))
+
+INDEX_FILE = 'notes.index'
+METADATA_FILE = 'notes_embeddings.json'
+COLUMNS_FILE = 'notes.columns'
+CACHE_FILE = 'notes_cache.json'
+WAL_FILE = 'notes_wal.jsonl'
+
+
+def current_generation(data_dir: str = DATA_DIR) -> int:
+    """رقم النسخة الحالية من app/data/CURRENT (0 = الملفات المرفقة في app/data)"""
+    try:
+        with open(os.path.join(data_dir, 'CURRENT'), 'r') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def generation_token(data_dir: str = DATA_DIR) -> Optional[Tuple[int, int]]:
+    """بصمة رخيصة لـ CURRENT (stat فقط): تتغير مع كل نسخة جديدة لأن os.replace ينشئ inode جديداً"""
+    try:
+        stat = os.stat(os.path.join(data_dir, 'CURRENT'))
+        return stat.st_ino, stat.st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_dir(generation: int, data_dir: str = DATA_DIR) -> str:
+    if not generation:
+        return data_dir
+    return os.path.join(data_dir, SNAPSHOTS_DIR, f"{generation:06d}")
+
+
+@contextmanager
+def wal_lock(data_dir: str = DATA_DIR):
+    """قفل بين العمليات للكتابة في السجل ونشر النسخ (غير متداخل: لا تستدعه مرتين في نفس الخيط)"""
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, 'index.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def append_wal(entries: List[Dict], data_dir: str = DATA_DIR):
+    """إضافة عمليات إلى سجل النسخة الحالية (fsync قبل تطبيقها)"""
+    lines = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+    with wal_lock(data_dir):
+        path = os.path.join(snapshot_dir(current_generation(data_dir), data_dir), WAL_FILE)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def read_wal(offset: int, path: str) -> Tuple[List[Dict], int]:
+    """العمليات المكتملة بعد offset (بالبايت) والـ offset الجديد"""
+    if not os.path.exists(path):
+        return [], offset
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    # سطر غير مكتمل (كتابة جارية من عملية أخرى) يُقرأ في المرة القادمة
+    complete = data[:data.rfind(b'\n') + 1]
+    entries = [json.loads(line) for line in complete.decode('utf-8').splitlines() if line.strip()]
+    return entries, offset + len(complete)
+
+
+def _write_json(path: str, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def publish_snapshot(index, metadata: Dict, notes: List[Dict], embedder, data_dir: str = DATA_DIR) -> int:
+    """
+    كتابة نسخة كاملة جديدة ونشرها ذرياً (يُستدعى داخل wal_lock)
+
+    Returns:
+        رقم النسخة الجديدة
+    """
+    generation = current_generation(data_dir) + 1
+    snapshots = os.path.join(data_dir, SNAPSHOTS_DIR)
+    final_dir = snapshot_dir(generation, data_dir)
+    tmp_dir = os.path.join(snapshots, f".tmp-{generation:06d}-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    metadata = dict(metadata, generation=generation, notes_count=len(notes))
+    faiss.write_index(index, os.path.join(tmp_dir, INDEX_FILE))
+    _write_json(os.path.join(tmp_dir, METADATA_FILE), metadata)
+    write_columns(os.path.join(tmp_dir, COLUMNS_FILE), notes)
+    _write_json(os.path.join(tmp_dir, CACHE_FILE), notes)
+    embedder.save(tmp_dir)
+    os.rename(tmp_dir, final_dir)
+
+    current_tmp = os.path.join(data_dir, f".CURRENT-{os.getpid()}")
+    with open(current_tmp, 'w') as f:
+        f.write(str(generation))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_tmp, os.path.join(data_dir, 'CURRENT'))
+
+    _prune_snapshots(generation, data_dir)
+    return generation
+
+
+def _prune_snapshots(generation: int, data_dir: str):
+    """حذف النسخ الأقدم من آخر INDEX_SNAPSHOT_KEEP (العمليات التي حمّلتها تحتفظ بها في الذاكرة)"""
+    # سجل النسخة 0 (الملفات المرفقة) دُمج في النسخ المنشورة
+    if os.path.exists(os.path.join(data_dir, WAL_FILE)):
+        os.remove(os.path.join(data_dir, WAL_FILE))
+    snapshots = os.path.join(data_dir, SNAPSHOTS_DIR)
+    for name in os.listdir(snapshots):
+        if name.isdigit() and int(name) <= generation - INDEX_SNAPSHOT_KEEP:
+            shutil.rmtree(os.path.join(snapshots, name), ignore_errors=True)
+
+
+def upsert_notes(notes: List[Dict]) -> Dict:
+    """إضافة أو تحديث نوتات (PerfumeNote.to_dict()) في الفهرس"""
+    return _record([{'op': 'upsert', 'note': note} for note in notes])
+
+
+def remove_notes(note_ids: Iterable[int]) -> Dict:
+    """إزالة نوتات من الفهرس"""
+    return _record([{'op': 'delete', 'id': int(note_id)} for note_id in note_ids])
+
+
+def sync_notes(notes) -> Dict:
+    """مزامنة نوتات PerfumeNote بعد حفظها: الفعّالة تُضاف/تُحدّث والمعطّلة تُزال"""
+    entries = [
+        {'op': 'upsert', 'note': note.to_dict()} if note.is_active else {'op': 'delete', 'id': note.id}
+        for note in notes
+    ]
+    return _record(entries)
+
+
+def _record(entries: List[Dict]) -> Dict:
+    from app.notes_retriever import get_retriever
+
+    if not entries:
+        return {'success': True, 'ops': 0}
+
+    try:
+        retriever = get_retriever()
+        if retriever.index is None or not has_id_map(retriever.index):
+            # فهرس قديم بمعرفات = رقم الصف: إعادة بناء كاملة مرة واحدة تحوّله إلى IndexIDMap2
+            from app.rag_builder import rebuild_faiss_index
+            return rebuild_faiss_index()
+
+        append_wal(entries)
+        retriever.sync()
+
+        if retriever.view.wal_ops >= INDEX_COMPACT_OPS:
+            compact()
+
+        return {'success': True, 'ops': len(entries)}
+
+    except Exception as e:
+        print(f"⚠ خطأ في تحديث الفهرس تدريجياً: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+
+def compact() -> Dict:
+    """
+    دمج تعديلات السجل في نسخة جديدة من الفهرس
+
+    الفهارس التي تدعم remove_ids (flat) تُنسخ وتُعدّل مباشرة، والباقي (HNSW، IVF-PQ مع refine)
+    يُعاد بناؤه من embeddings النوتات الحالية (بدون قاعدة البيانات ولا إعادة تدريب الـ embedder).
+    """
+    from app.notes_retriever import get_retriever
+
+    try:
+        retriever = get_retriever()
+        with wal_lock():
+            retriever.sync()
+            view = retriever.view
+            snapshot = view.snapshot
+            if snapshot.index is None or not has_id_map(snapshot.index):
+                return {'success': False, 'error': 'الفهرس الحالي لا يدعم التحديث التدريجي، أعد بناءه'}
+
+            notes = list(view.notes.values())
+            # نسخة قابلة للتعديل من الملف (clone_index لفهرس mmap يشارك صفحات القراءة فقط)
+            index = read_index(os.path.join(snapshot.directory, INDEX_FILE), mmap=False)
+            try:
+                if view.masked:
+                    index.remove_ids(np.array(sorted(view.masked), dtype=np.int64))
+                if view.upserts:
+                    index.add_with_ids(view.matrix, np.array(list(view.upserts), dtype=np.int64))
+            except RuntimeError:
+                vectors = snapshot.embedder.encode([create_note_text(n) for n in notes])
+                index = build_index(vectors, ids=[n['id'] for n in notes])
+
+            # قائمة النوتات في notes.columns (metadata الفهارس القديمة كانت تكررها)
+            metadata = {key: value for key, value in (snapshot.metadata or {}).items() if key != 'notes'}
+            metadata.update({
+                'compacted_at': datetime.utcnow().isoformat(),
+                'index_type': index_type_of(index)
+            })
+            generation = publish_snapshot(index, metadata, notes, snapshot.embedder)
+
+        retriever.sync()
+        print(f"✅ تم ضغط سجل الفهرس في النسخة {generation} ({view.wal_ops} عملية، {len(notes)} نوتة)")
+        return {'success': True, 'ops': view.wal_ops, 'notes_count': len(notes), 'generation': generation}
+
+    except Exception as e:
+        print(f"❌ خطأ في ضغط سجل الفهرس: {str(e)}")
+        return {'success': False, 'error': str(e)}
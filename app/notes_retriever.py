@@ -4,224 +4,472 @@ Uses FAISS index built from database for efficient similarity search
 """
 
 import json
-import faiss
 import numpy as np
 import os
-import hashlib
-from typing import List, Dict, Optional
+import threading
+from collections.abc import Mapping
+from typing import List, Dict, NamedTuple, Optional
+from app.embeddings import load_embedder, HashEmbedder
+from app.notes_columns import NoteColumns
+from app.notes_store import NotesStore
+from app.notes_index import (
+    DATA_DIR, INDEX_FILE, METADATA_FILE, CACHE_FILE, COLUMNS_FILE, WAL_FILE,
+    current_generation, generation_token, snapshot_dir, read_wal
+)
+from app.rag_builder import create_note_text
+from app.vector_index import ScoreCalibration, has_id_map, index_type_of, read_index, search
 
-class NotesRetriever:
+
+class IndexSnapshot:
     """
-    Retrieves relevant fragrance notes based on semantic and keyword queries.
-    Uses FAISS index built from database for efficient similarity search.
+    نسخة فهرس محمّلة من مجلد واحد (app/notes_index.py)، لا تتغير بعد التحميل
+
+    الفهرس والنوتات مربوطان بملفات النسخة عبر mmap (صفحات مشتركة بين الـ workers)،
+    والملفات تبقى صالحة للعملية حتى بعد حذف النسخة من القرص.
     """
     
-    def __init__(self, 
-                 index_path: str = "app/data/notes.index",
-                 embeddings_path: str = "app/data/notes_embeddings.json",
-                 cache_path: str = "app/data/notes_cache.json"):
-        """Initialize the retriever with FAISS index"""
-        self.index_path = index_path
-        self.embeddings_path = embeddings_path
-        self.cache_path = cache_path
+    def __init__(self, data_dir: str = DATA_DIR):
+        # البصمة قبل رقم النسخة: إذا نُشرت نسخة بينهما تُكتشف في sync التالي
+        self.token = generation_token(data_dir)
+        self.generation = current_generation(data_dir)
+        self.directory = snapshot_dir(self.generation, data_dir)
+        self.wal_path = os.path.join(self.directory, WAL_FILE)
         
-        self.notes_db = []
+        self.notes = {}
         self.index = None
         self.metadata = None
-        self.notes_map = {}
+        self.embedder = HashEmbedder()
+        self.calibration = ScoreCalibration()
         
-        self.load_resources()
+        self.load()
     
-    def load_resources(self):
-        """Load FAISS index and notes from cache"""
+    def load(self):
+        """Load FAISS index and notes (both memory-mapped; JSON cache for older snapshots)"""
         try:
-            if os.path.exists(self.cache_path):
-                with open(self.cache_path, 'r', encoding='utf-8') as f:
-                    self.notes_db = json.load(f)
-                print(f"✓ تم تحميل {len(self.notes_db)} نوتة من الكاش")
-            elif os.path.exists('notes_kb.json'):
-                with open('notes_kb.json', 'r', encoding='utf-8') as f:
-                    self.notes_db = json.load(f)
-                print(f"✓ تم تحميل {len(self.notes_db)} نوتة من JSON (fallback)")
-            
-            if os.path.exists(self.index_path):
-                self.index = faiss.read_index(self.index_path)
+            index_path = os.path.join(self.directory, INDEX_FILE)
+            if os.path.exists(index_path):
+                self.index = read_index(index_path)
                 print(f"✓ تم تحميل FAISS index: {self.index.ntotal} متجه")
             else:
-                print(f"⚠ FAISS index غير موجود في {self.index_path}")
+                print(f"⚠ FAISS index غير موجود في {index_path}")
+            
+            # معرفات FAISS = PerfumeNote.id، والفهارس القديمة: المعرف = رقم الصف
+            keyed = self.index is not None and has_id_map(self.index)
+            
+            columns_path = os.path.join(self.directory, COLUMNS_FILE)
+            cache_path = os.path.join(self.directory, CACHE_FILE)
+            if os.path.exists(columns_path):
+                # بدون تحليل: الترويسة فقط، والنوتة تُقرأ من الصفحات المشتركة عند طلبها
+                self.notes = NoteColumns(columns_path, keyed=keyed)
+                print(f"✓ تم فتح {len(self.notes)} نوتة من notes.columns (النسخة {self.generation})")
+            else:
+                notes = []
+                if os.path.exists(cache_path):
+                    with open(cache_path, 'r', encoding='utf-8') as f:
+                        notes = json.load(f)
+                    print(f"✓ تم تحميل {len(notes)} نوتة من الكاش (النسخة {self.generation})")
+                elif os.path.exists('notes_kb.json'):
+                    with open('notes_kb.json', 'r', encoding='utf-8') as f:
+                        notes = json.load(f)
+                    print(f"✓ تم تحميل {len(notes)} نوتة من JSON (fallback)")
+                self.notes = {note['id']: note for note in notes} if keyed else dict(enumerate(notes))
             
-            if os.path.exists(self.embeddings_path):
-                with open(self.embeddings_path, 'r', encoding='utf-8') as f:
+            embeddings_path = os.path.join(self.directory, METADATA_FILE)
+            if os.path.exists(embeddings_path):
+                with open(embeddings_path, 'r', encoding='utf-8') as f:
                     self.metadata = json.load(f)
-                
-                if 'notes' in self.metadata:
-                    for note_info in self.metadata['notes']:
-                        self.notes_map[note_info['id']] = note_info
                 print(f"✓ تم تحميل metadata")
+                
+                # نفس الـ embedder الذي بُني به الفهرس (الفهارس القديمة بدون اسم: hash)
+                self.embedder = load_embedder(self.metadata.get('embedder'), self.directory)
+                # بدون معايرة (فهارس قديمة): الدرجة = cosine كما هو
+                self.calibration = ScoreCalibration.from_dict(self.metadata.get('calibration')) or ScoreCalibration()
         
         except Exception as e:
             print(f"⚠ خطأ في تحميل الموارد: {str(e)}")
+
+
+class NotesOverlay(Mapping):
+    """
+    نوتات النسخة + تعديلات السجل بدون نسخ نوتات النسخة: المعرفات المخفية تُتجاهل
+    و upserts تُضاف فوقها (المخفية دائماً من معرفات النسخة)
+    """
+    
+    def __init__(self, base: Mapping, masked: frozenset, upserts: Dict):
+        self.base = base
+        self.masked = masked
+        self.upserts = upserts
+    
+    def __getitem__(self, note_id) -> Dict:
+        if note_id in self.upserts:
+            return self.upserts[note_id]
+        if note_id in self.masked:
+            raise KeyError(note_id)
+        return self.base[note_id]
+    
+    def __contains__(self, note_id) -> bool:
+        return note_id in self.upserts or (note_id not in self.masked and note_id in self.base)
+    
+    def __iter__(self):
+        for note_id in self.base:
+            if note_id not in self.masked:
+                yield note_id
+        yield from self.upserts
+    
+    def __len__(self) -> int:
+        return len(self.base) - len(self.masked) + len(self.upserts)
+    
+    def column(self, field: str) -> List:
+        """قيم حقل بترتيب المفاتيح (أعمدة النسخة مباشرة عند وجودها)"""
+        column = getattr(self.base, 'column', None)
+        if column is not None:
+            values = column(field)
+            values = values.tolist() if isinstance(values, np.ndarray) else values
+        else:
+            values = [note.get(field) for note in self.base.values()]
+        if self.masked:
+            values = [value for note_id, value in zip(self.base, values) if note_id not in self.masked]
+        return list(values) + [note.get(field) for note in self.upserts.values()]
+
+
+class IndexView:
+    """
+    نسخة فهرس + تعديلات السجل التي لم تُدمج بعد (upserts / حذف)
+
+    كائن ثابت: كل تعديل ينشئ IndexView جديداً (نسخ التعديلات فقط، أقل من INDEX_COMPACT_OPS)
+    ويستبدله الـ retriever بإسناد واحد، فالقارئ يأخذ المرجع مرة واحدة ويبحث بدون قفل.
+    """
+    
+    def __init__(self, snapshot: IndexSnapshot, upserts: Optional[Dict] = None,
+                 vectors: Optional[Dict] = None, masked: frozenset = frozenset(),
+                 wal_offset: int = 0, wal_ops: int = 0):
+        self.snapshot = snapshot
+        self.upserts = upserts or {}
+        self.vectors = vectors or {}
+        # معرفات النسخة التي يجب تجاهلها (محذوفة أو لها نسخة أحدث في upserts)
+        self.masked = masked
+        self.wal_offset = wal_offset
+        self.wal_ops = wal_ops
+        self._notes = None
+        self._matrix = None
+        self._store = None
+    
+    def apply(self, entries: List[Dict], wal_offset: int) -> 'IndexView':
+        """IndexView جديد بعد تطبيق عمليات السجل، O(1) embedding لكل نوتة"""
+        snapshot = self.snapshot
+        upserts, vectors, masked = dict(self.upserts), dict(self.vectors), set(self.masked)
+        
+        if snapshot.index is not None and has_id_map(snapshot.index):
+            for entry in entries:
+                if entry['op'] == 'upsert':
+                    note = entry['note']
+                    upserts[note['id']] = note
+                    vectors[note['id']] = snapshot.embedder.encode([create_note_text(note)])[0]
+                    note_id = note['id']
+                elif entry['op'] == 'delete':
+                    note_id = entry['id']
+                    upserts.pop(note_id, None)
+                    vectors.pop(note_id, None)
+                else:
+                    continue
+                if note_id in snapshot.notes:
+                    masked.add(note_id)
+        
+        return IndexView(snapshot, upserts, vectors, frozenset(masked), wal_offset, self.wal_ops + len(entries))
+    
+    @property
+    def notes(self) -> Mapping:
+        """النوتات الحالية (النسخة + التعديلات) كـ Mapping من المعرف إلى النوتة"""
+        if self._notes is None:
+            self._notes = NotesOverlay(self.snapshot.notes, self.masked, self.upserts)
+        return self._notes
+    
+    @property
+    def store(self) -> NotesStore:
+        """مخزن النوتات لهذا الـ IndexView (app/notes_store.py)، يُنشأ مرة واحدة"""
+        if self._store is None:
+            if len(self.notes):
+                self._store = NotesStore(self.notes, f"index generation {self.snapshot.generation}")
+            else:
+                self._store = NotesStore.fallback()
+        return self._store
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """متجهات upserts بترتيبها (بحث دقيق، عددها صغير حتى الضغط)"""
+        if self._matrix is None:
+            self._matrix = np.array(list(self.vectors.values()), dtype=np.float32).reshape(-1, self.snapshot.index.d)
+        return self._matrix
+    
+    def search(self, query: np.ndarray, top_k: int, ids: Optional[np.ndarray] = None) -> List:
+        """
+        (note_id, cosine) مرتبة: نتائج النسخة بدون المعرفات المخفية + نتائج التعديلات
+
+        ids: البحث داخل هذه النوتات فقط (معرفات من store.select)، الفلترة داخل FAISS
+        """
+        snapshot = self.snapshot
+        upsert_ids = np.fromiter(self.upserts, dtype=np.int64, count=len(self.upserts))
+        results = []
+        if snapshot.index is not None and snapshot.index.ntotal:
+            if ids is None:
+                cosines, labels = search(snapshot.index, query, top_k + len(self.masked))
+            else:
+                # معرفات المخزن بدون upserts هي معرفات النسخة غير المخفية
+                in_snapshot = ids[~np.isin(ids, upsert_ids)] if len(upsert_ids) else ids
+                cosines, labels = search(snapshot.index, query, top_k, ids=in_snapshot)
+            results = [
+                (note_id, cosine)
+                for note_id, cosine in zip(labels[0].tolist(), cosines[0].tolist())
+                if note_id >= 0 and note_id not in self.masked and note_id in snapshot.notes
+            ]
+        if self.upserts:
+            cosines = self.matrix @ query.reshape(-1)
+            keep = np.isin(upsert_ids, ids) if ids is not None else np.ones(len(upsert_ids), dtype=bool)
+            results += [(note_id, cosine) for note_id, cosine, kept
+                        in zip(upsert_ids.tolist(), cosines.tolist(), keep.tolist()) if kept]
+            results.sort(key=lambda item: item[1], reverse=True)
+        return results[:top_k]
+
+
+class Hit(NamedTuple):
+    """
+    نتيجة استرجاع خفيفة: معرف النوتة في مخزن النوتات + الدرجة + طريقة الاسترجاع
+    (+ cosine للبحث الدلالي). تتحول إلى dict فقط عند الإخراج (NotesRetriever.materialize)
+    """
+    note_id: int
+    score: float
+    method: str
+    cosine: Optional[float] = None
+
+
+class NotesRetriever:
+    """
+    Retrieves relevant fragrance notes based on semantic and keyword queries.
+    Uses FAISS index built from database for efficient similarity search.
+    """
+    
+    def __init__(self, data_dir: str = DATA_DIR):
+        """Initialize the retriever with FAISS index"""
+        self.data_dir = data_dir
+        self._sync_lock = threading.Lock()
+        self.view = IndexView(IndexSnapshot(data_dir))
+        self.sync()
+    
+    # القراءة من self.view الحالي؛ النسخة بأكملها تُستبدل بإسناد واحد
+    @property
+    def index(self):
+        return self.view.snapshot.index
+    
+    @property
+    def metadata(self) -> Optional[Dict]:
+        return self.view.snapshot.metadata
+    
+    @property
+    def embedder(self):
+        return self.view.snapshot.embedder
+    
+    @property
+    def calibration(self) -> ScoreCalibration:
+        return self.view.snapshot.calibration
+    
+    @property
+    def notes(self) -> Mapping:
+        return self.view.notes
+    
+    @property
+    def store(self) -> NotesStore:
+        return self.view.store
+    
+    @property
+    def notes_db(self) -> List[Dict]:
+        """النوتات الحالية (بعد تطبيق تعديلات السجل)"""
+        return self.store.all()
     
     def reload(self):
         """Reload resources after index rebuild"""
-        self.notes_db = []
-        self.index = None
-        self.metadata = None
-        self.notes_map = {}
-        self.load_resources()
+        with self._sync_lock:
+            self.view = IndexView(IndexSnapshot(self.data_dir))
+        self.sync()
     
-    def generate_embedding(self, text: str) -> np.ndarray:
-        """Generate consistent hash-based embedding for text"""
+    def sync(self):
+        """
+        مقارنة رخيصة (stat) لرقم النسخة وحجم السجل، وتحميل الجديد فقط عند التغيير
+
+        نسخة جديدة (إعادة بناء أو ضغط من أي عملية) تُحمّل بالكامل ثم تحل محل الحالية،
+        وأسطر السجل الجديدة تُطبّق كـ IndexView جديد. القراء لا ينتظرون أبداً.
+        """
         try:
-            hash_obj = hashlib.md5(text.encode())
-            seed = int(hash_obj.hexdigest(), 16) % (2**31)
+            view = self.view
+            if generation_token(self.data_dir) != view.snapshot.token:
+                with self._sync_lock:
+                    if generation_token(self.data_dir) != self.view.snapshot.token:
+                        self.view = IndexView(IndexSnapshot(self.data_dir))
+                view = self.view
             
-            rng = np.random.RandomState(seed)
-            vector = rng.randn(384).astype('float32')
-            vector = vector / (np.linalg.norm(vector) + 1e-10)
-            
-            return vector
+            try:
+                wal_size = os.path.getsize(view.snapshot.wal_path)
+            except FileNotFoundError:
+                wal_size = 0
+            if wal_size > view.wal_offset:
+                with self._sync_lock:
+                    view = self.view
+                    entries, offset = read_wal(view.wal_offset, view.snapshot.wal_path)
+                    if entries:
+                        self.view = view.apply(entries, offset)
+        except Exception as e:
+            print(f"⚠ خطأ في مزامنة الفهرس: {str(e)}")
+    
+    def get_index_stats(self) -> Dict:
+        """نوع فهرس FAISS وعدد متجهاته ومعايرة الدرجات ورقم النسخة وحالة سجل التعديلات"""
+        view = self.view
+        index = view.snapshot.index
+        return {
+            'type': index_type_of(index) if index is not None else None,
+            'generation': view.snapshot.generation,
+            'vectors': index.ntotal if index is not None else 0,
+            'notes': len(view.notes),
+            'notes_storage': 'columns' if isinstance(view.snapshot.notes, NoteColumns) else 'json',
+            'calibration': view.snapshot.calibration.to_dict(),
+            'wal_ops': view.wal_ops,
+            'pending_upserts': len(view.upserts),
+            'masked': len(view.masked)
+        }
+    
+    def generate_embedding(self, text: str) -> np.ndarray:
+        """Generate query embedding with the index's embedder (cached)"""
+        try:
+            return self.embedder.encode_query(text)
         except Exception as e:
             print(f"⚠ خطأ في توليد embedding: {str(e)}")
             return None
     
-    def retrieve_by_similarity(self, query: str, top_k: int = 5) -> List[Dict]:
+    def materialize(self, hits: List[Hit], store: Optional[NotesStore] = None) -> List[Dict]:
+        """
+        تحويل النتائج إلى dicts (حدود JSON/البرومبت): dict واحد جديد لكل نتيجة
+        مع similarity_score و retrieval_method (و cosine للبحث الدلالي)
         """
-        Retrieve notes similar to the query using vector similarity
+        store = store or self.store
+        results = []
+        for hit in hits:
+            record = store.get(hit.note_id)
+            if record is None:
+                continue
+            note = record.to_dict()
+            note['similarity_score'] = hit.score
+            if hit.cosine is not None:
+                note['cosine'] = hit.cosine
+            note['retrieval_method'] = hit.method
+            results.append(note)
+        return results
+    
+    def similarity_hits(self, query: str, top_k: int = 5, view: Optional[IndexView] = None,
+                        ids: Optional[np.ndarray] = None) -> List[Hit]:
+        """
+        Notes similar to the query using vector similarity, as (note_id, score, method, cosine) hits
+        (only among ids when given: pre-filtered search)
         """
-        if self.index is None or not self.notes_db:
+        view = view or self.view
+        if view.snapshot.index is None or not view.notes:
             return []
         
         try:
-            query_embedding = self.generate_embedding(query)
-            if query_embedding is None:
-                return []
-            
-            query_vec = np.array([query_embedding]).astype('float32')
-            distances, indices = self.index.search(query_vec, min(top_k, self.index.ntotal))
-            
-            results = []
-            for idx, distance in zip(indices[0], distances[0]):
-                if idx < 0 or idx >= len(self.notes_db):
-                    continue
-                
-                note = self.notes_db[idx].copy()
-                note['similarity_score'] = float(1 / (1 + distance))
-                note['retrieval_method'] = 'semantic'
-                results.append(note)
-            
-            return results
+            query_embedding = view.snapshot.embedder.encode_query(query)
+            matches = view.search(query_embedding, top_k, ids)
+            scores = view.snapshot.calibration.calibrate([cosine for _, cosine in matches]).tolist()
+            return [
+                Hit(note_id, score, 'semantic', cosine)
+                for (note_id, cosine), score in zip(matches, scores)
+            ]
         
         except Exception as e:
             print(f"⚠ خطأ في البحث الدلالي: {str(e)}")
             return []
     
-    def retrieve_by_family(self, family: str, top_k: int = 5) -> List[Dict]:
-        """Retrieve notes by fragrance family"""
-        if not self.notes_db:
-            return []
-        
+    def family_hits(self, family: str, top_k: int = 5) -> List[Hit]:
+        """Notes of a fragrance family"""
         try:
-            family_lower = family.lower()
-            results = [note.copy() for note in self.notes_db 
-                      if family_lower in note.get('family', '').lower()]
-            
-            for note in results:
-                note['retrieval_method'] = 'family_filter'
-                note['similarity_score'] = 1.0
-            
-            return results[:top_k]
+            return [Hit(note_id, 1.0, 'family_filter') for note_id in self.store.matching('family', family)[:top_k]]
         except Exception as e:
             print(f"⚠ خطأ في البحث حسب العائلة: {str(e)}")
             return []
     
-    def retrieve_by_role(self, role: str, top_k: int = 5) -> List[Dict]:
-        """Retrieve notes by their role (Top, Heart, Base)"""
-        if not self.notes_db:
-            return []
-        
+    def role_hits(self, role: str, top_k: int = 5) -> List[Hit]:
+        """Notes by their role (Top, Heart, Base)"""
         try:
-            role_lower = role.lower()
-            results = [note.copy() for note in self.notes_db 
-                      if role_lower in note.get('role', '').lower()]
-            
-            for note in results:
-                note['retrieval_method'] = 'role_filter'
-                note['similarity_score'] = 1.0
-            
-            return results[:top_k]
+            return [Hit(note_id, 1.0, 'role_filter') for note_id in self.store.matching('role', role)[:top_k]]
         except Exception as e:
             print(f"⚠ خطأ في البحث حسب الدور: {str(e)}")
             return []
     
-    def retrieve_by_use_case(self, use_case: str, top_k: int = 5) -> List[Dict]:
-        """Retrieve notes suitable for specific use cases"""
-        if not self.notes_db:
-            return []
-        
+    def use_case_hits(self, use_case: str, top_k: int = 5) -> List[Hit]:
+        """Notes suitable for a use case (best_for)"""
         try:
-            use_case_lower = use_case.lower()
-            results = []
-            
-            for note in self.notes_db:
-                best_for = note.get('best_for', [])
-                if isinstance(best_for, list):
-                    if any(use_case_lower in case.lower() for case in best_for):
-                        results.append(note.copy())
-            
-            for note in results:
-                note['retrieval_method'] = 'use_case_filter'
-                note['similarity_score'] = 1.0
-            
-            return results[:top_k]
+            note_ids = self.store.matching('best_for', use_case)
+            return [Hit(note_id, 1.0, 'use_case_filter') for note_id in note_ids[:top_k]]
         except Exception as e:
             print(f"⚠ خطأ في البحث حسب الاستخدام: {str(e)}")
             return []
     
-    def hybrid_retrieve(self, query: str, filters: Optional[Dict] = None, top_k: int = 5) -> List[Dict]:
-        """Hybrid retrieval combining semantic search with optional filters"""
+    def hybrid_hits(self, query: str, filters: Optional[Dict] = None, top_k: int = 5) -> List[Hit]:
+        """
+        Semantic hits among the notes matching the filters (family, role, volatility, best_for,
+        incense_style, min_formality, max_intensity): the matching ids go into the FAISS search
+        itself, so top_k hits come back whenever that many notes match
+        """
         try:
-            results = self.retrieve_by_similarity(query, top_k * 2)
-            
-            if filters:
-                if 'family' in filters and filters['family']:
-                    family_ids = {n['note'] for n in self.retrieve_by_family(filters['family'], 100)}
-                    results = [n for n in results if n.get('note') in family_ids]
-                
-                if 'role' in filters and filters['role']:
-                    role_ids = {n['note'] for n in self.retrieve_by_role(filters['role'], 100)}
-                    results = [n for n in results if n.get('note') in role_ids]
-            
-            results.sort(key=lambda x: x.get('similarity_score', 0), reverse=True)
-            return results[:top_k]
+            view = self.view
+            store = view.store
+            rows = store.select(filters or {})
+            if rows is None:
+                return self.similarity_hits(query, top_k, view)
+            if not len(rows):
+                return []
+            return self.similarity_hits(query, top_k, view, store.id_array[rows])
         except Exception as e:
             print(f"⚠ خطأ في البحث الهجين: {str(e)}")
             return []
     
+    def retrieve_by_similarity(self, query: str, top_k: int = 5) -> List[Dict]:
+        """Retrieve notes similar to the query using vector similarity"""
+        return self.materialize(self.similarity_hits(query, top_k))
+    
+    def retrieve_by_family(self, family: str, top_k: int = 5) -> List[Dict]:
+        """Retrieve notes by fragrance family"""
+        return self.materialize(self.family_hits(family, top_k))
+    
+    def retrieve_by_role(self, role: str, top_k: int = 5) -> List[Dict]:
+        """Retrieve notes by their role (Top, Heart, Base)"""
+        return self.materialize(self.role_hits(role, top_k))
+    
+    def retrieve_by_use_case(self, use_case: str, top_k: int = 5) -> List[Dict]:
+        """Retrieve notes suitable for specific use cases"""
+        return self.materialize(self.use_case_hits(use_case, top_k))
+    
+    def hybrid_retrieve(self, query: str, filters: Optional[Dict] = None, top_k: int = 5) -> List[Dict]:
+        """Hybrid retrieval combining semantic search with optional filters"""
+        return self.materialize(self.hybrid_hits(query, filters, top_k))
+    
     def get_note_details(self, note_name: str) -> Optional[Dict]:
         """Get full details of a specific note"""
         try:
-            note_lower = note_name.lower()
-            for note in self.notes_db:
-                if (note_lower == note.get('note', '').lower() or 
-                    note_lower == note.get('arabic', '').lower()):
-                    return note.copy()
-            return None
+            note = self.store.find(note_name)
+            return note.to_dict() if note else None
         except:
             return None
     
     def is_ready(self) -> bool:
         """Check if retriever is ready to use"""
-        return self.index is not None and len(self.notes_db) > 0
+        return self.index is not None and len(self.notes) > 0
 
 
 _retriever = None
 
 def get_retriever() -> NotesRetriever:
-    """Get or create singleton retriever instance"""
+    """Get or create singleton retriever instance (synced with the index update log)"""
     global _retriever
     if _retriever is None:
         _retriever = NotesRetriever()
+    _retriever.sync()
     return _retriever
 
 
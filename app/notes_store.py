@@ -0,0 +1,403 @@
+"""
+Notes Store - مخزن النوتات الواحد المشترك في العملية
+
+كل واجهات النوتات تقرأ من نفس المخزن بدلاً من تحميل نسخها الخاصة:
+NotesRetriever، VectorNoteSearch، rag_service.FragranceKnowledgeBase،
+rag_builder.get_notes_from_cache و PerfumeNote.get_all_notes_as_dict
+
+- المصدر: نسخة الفهرس الحالية + تعديلات السجل (notes_retriever.IndexView، النوتات عبر mmap)،
+  وبدون نسخة فهرس: النوتات الفعّالة من قاعدة البيانات ثم notes_kb.json
+- المخزن لا يتغير بعد إنشائه، وجداول البحث (المعرفات، الأسماء، أعمدة الحقول) تُبنى مرة واحدة
+  عند أول استخدام ثم تُشارك بين كل الواجهات والطلبات
+- فهارس مقلوبة (posting lists) لحقول الفلترة FILTER_FIELDS تُبنى مرة واحدة لكل مخزن: الفلتر
+  يطابق النص مع القيم المختلفة للحقل (عشرات) بدلاً من كل النوتات، والفلاتر المتعددة تقاطع مجموعات
+- البحث التقريبي بالاسم من فهرس trigrams (app/name_index.py) ورسم التوافق بين النوتات
+  (app/note_graph.py) يُبنيان مرة واحدة لكل مخزن
+- النوتة داخل التطبيق سجل Note ثابت بـ __slots__ يُنشأ مرة واحدة لكل نوتة، والبحث يعيد معرفات؛
+  التحويل إلى dict (to_dict) فقط عند حدود JSON/البرومبت
+- نقطة إعادة التحميل الوحيدة: NotesRetriever.sync؛ نسخة جديدة أو سطر سجل جديد ينشئ IndexView
+  جديداً له مخزنه، و get_notes_store() يعيد دائماً مخزن الـ IndexView الحالي
+"""
+
+import json
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.name_index import NameIndex
+from app.note_graph import CompatibilityGraph
+
+
+KB_PATH = 'notes_kb.json'
+# حقول الفلترة التي تُبنى لها فهارس مقلوبة (القيمة أو كل عنصر في القائمة = مصطلح)
+FILTER_FIELDS = ('family', 'role', 'volatility', 'best_for', 'incense_style')
+# فلاتر RAG الرقمية: المفتاح → (الحقل، المقارنة)
+RANGE_FILTERS = {
+    'min_formality': ('formality_score', 'min'),
+    'max_intensity': ('intensity_weight', 'max'),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Note:
+    """
+    نوتة من الكتالوج: سجل ثابت بدون __dict__ (القوائم tuples) تتشاركه كل الطلبات بدلاً من
+    نسخة dict لكل نتيجة. note['arabic'] و note.get() متاحة للقراءة مثل dict النوتة
+    """
+    id: Optional[int] = None
+    note: str = ''
+    arabic: str = ''
+    family: str = ''
+    role: str = ''
+    volatility: str = ''
+    profile: str = ''
+    works_well_with: Tuple[str, ...] = ()
+    avoid_with: Tuple[str, ...] = ()
+    best_for: Tuple[str, ...] = ()
+    concentration: str = ''
+    origin: str = ''
+    incense_style: str = 'clean'
+    intensity_weight: int = 5
+    formality_score: int = 5
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Note':
+        """من dict بشكل PerfumeNote.to_dict() (الحقول الناقصة أو None بقيمها الافتراضية)"""
+        values = {}
+        for name in NOTE_FIELDS:
+            value = data.get(name)
+            if value is None:
+                continue
+            values[name] = tuple(value) if isinstance(value, list) else value
+        return cls(**values)
+
+    def __getitem__(self, key: str):
+        if key not in NOTE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in NOTE_FIELDS else default
+
+    def to_dict(self) -> Dict:
+        """dict جديد بنفس شكل PerfumeNote.to_dict() (القوائم lists)"""
+        return {
+            name: list(value) if isinstance(value, tuple) else value
+            for name, value in ((name, getattr(self, name)) for name in NOTE_FIELDS)
+        }
+
+
+NOTE_FIELDS = tuple(f.name for f in fields(Note))
+
+
+class NotesStore:
+    """
+    النوتات (Mapping من المعرف إلى dict بشكل PerfumeNote.to_dict()) وجداول البحث عنها
+    """
+
+    def __init__(self, notes: Mapping, source: str):
+        self.notes = notes
+        self.source = source
+        self._ids = None
+        self._columns = {}
+        self._lower_columns = {}
+        self._by_name = None
+        self._records = {}
+        self._postings = None
+        self._row_by_id = None
+        self._id_array = None
+        self._numeric = {}
+        self._name_index = None
+        self._compatibility = None
+        self._codes = {}
+
+    @classmethod
+    def fallback(cls) -> 'NotesStore':
+        """بدون نسخة فهرس: النوتات الفعّالة من قاعدة البيانات، ثم notes_kb.json"""
+        try:
+            from flask import has_app_context
+            if has_app_context():
+                from app.models import PerfumeNote
+                notes = [note.to_dict() for note in PerfumeNote.get_active_notes()]
+                if notes:
+                    return cls({note['id']: note for note in notes}, 'database')
+        except Exception as e:
+            print(f"⚠ خطأ في تحميل النوتات من قاعدة البيانات: {str(e)}")
+
+        try:
+            with open(KB_PATH, 'r', encoding='utf-8') as f:
+                notes = json.load(f)
+            print(f"✓ تم تحميل قاعدة النوتات: {len(notes)} نوتة ({KB_PATH})")
+            return cls(dict(enumerate(notes)), KB_PATH)
+        except FileNotFoundError:
+            print(f"⚠ تنبيه: لم يتم العثور على ملف قاعدة النوتات: {KB_PATH}")
+        except json.JSONDecodeError:
+            print(f"⚠ خطأ: فشل تحليل ملف JSON")
+        return cls({}, 'empty')
+
+    def __len__(self) -> int:
+        return len(self.notes)
+
+    @property
+    def ids(self) -> List:
+        """المعرفات بترتيب المخزن"""
+        if self._ids is None:
+            self._ids = list(self.notes)
+        return self._ids
+
+    @property
+    def id_array(self) -> np.ndarray:
+        """ids كمصفوفة int64 (معرفات FAISS لنفس الصفوف)"""
+        if self._id_array is None:
+            self._id_array = np.array(self.ids, dtype=np.int64)
+        return self._id_array
+
+    def column(self, field: str) -> List:
+        """قيم حقل لكل النوتات بترتيب ids (من أعمدة notes.columns مباشرة بدون تحويل الصفوف)"""
+        values = self._columns.get(field)
+        if values is None:
+            column = getattr(self.notes, 'column', None)
+            if column is not None:
+                values = column(field)
+                values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+            else:
+                values = [note.get(field) for note in self.notes.values()]
+            self._columns[field] = values
+        return values
+
+    def lower_column(self, field: str) -> List:
+        """column بحروف صغيرة (النصوص والقوائم) للمطابقة بدون تحويل في كل طلب"""
+        values = self._lower_columns.get(field)
+        if values is None:
+            values = [
+                [str(item).lower() for item in value] if isinstance(value, list) else str(value or '').lower()
+                for value in self.column(field)
+            ]
+            self._lower_columns[field] = values
+        return values
+
+    def get(self, note_id) -> Optional[Note]:
+        """سجل النوتة (يُنشأ مرة واحدة لكل نوتة في هذا المخزن) أو None"""
+        record = self._records.get(note_id)
+        if record is None:
+            data = self.notes.get(note_id)
+            if data is None:
+                return None
+            record = self._records[note_id] = Note.from_dict(data)
+        return record
+
+    def notes_for(self, note_ids) -> List[Note]:
+        """سجلات مجموعة معرفات (نتائج matching مثلاً) بنفس ترتيبها"""
+        return [self.get(note_id) for note_id in note_ids]
+
+    def all(self) -> List[Dict]:
+        """كل النوتات كـ dicts بترتيب المخزن (للواجهات التي تعيد قوائم JSON)"""
+        return [self.get(note_id).to_dict() for note_id in self.ids]
+
+    def find(self, name: str) -> Optional[Note]:
+        """النوتة بالاسم الإنجليزي أو العربي (مطابقة تامة بدون حالة الأحرف)"""
+        note_id = self.find_id(name)
+        return self.get(note_id) if note_id is not None else None
+
+    def find_id(self, name: str):
+        """معرف النوتة بالاسم الإنجليزي أو العربي أو None"""
+        if self._by_name is None:
+            by_name = {}
+            # عند تكرار الاسم تفوز أول نوتة (مثل البحث الخطي السابق)
+            for field in ('arabic', 'note'):
+                for note_id, value in reversed(list(zip(self.ids, self.lower_column(field)))):
+                    if value:
+                        by_name[value] = note_id
+            self._by_name = by_name
+        return self._by_name.get(name.lower().strip())
+
+    @property
+    def postings(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        الفهارس المقلوبة: {الحقل: {المصطلح بحروف صغيرة: أرقام الصفوف (مرتبة، int32)}}
+        لكل حقول FILTER_FIELDS في مرور واحد
+        """
+        if self._postings is None:
+            postings = {}
+            for field in FILTER_FIELDS:
+                rows_by_term, lowered = {}, {}
+                for row, value in enumerate(self.column(field)):
+                    for item in (value if isinstance(value, list) else [value]):
+                        term = lowered.get(item)
+                        if term is None:
+                            term = lowered[item] = str(item or '').lower()
+                        rows_by_term.setdefault(term, []).append(row)
+                # عنصر مكرر في قائمة نفس النوتة يظهر مرة واحدة
+                postings[field] = {term: np.unique(np.array(rows, dtype=np.int32))
+                                   for term, rows in rows_by_term.items()}
+            self._postings = postings
+        return self._postings
+
+    def rows_matching(self, field: str, text: str) -> np.ndarray:
+        """
+        صفوف النوتات التي يحتوي حقلها (أو أحد عناصر قائمتها) على text: المطابقة الجزئية
+        على مصطلحات الحقل فقط ثم اتحاد قوائمها (bitset)
+        """
+        text = text.lower()
+        matches = [rows for term, rows in self.postings[field].items() if text in term]
+        if not matches:
+            return np.empty(0, dtype=np.int32)
+        if len(matches) == 1:
+            return matches[0]
+        member = np.zeros(len(self.ids), dtype=bool)
+        for rows in matches:
+            member[rows] = True
+        return np.flatnonzero(member).astype(np.int32)
+
+    def filter_rows(self, filters: Dict) -> Optional[np.ndarray]:
+        """
+        تقاطع الفلاتر {الحقل: النص} (حقول FILTER_FIELDS، القيم الفارغة تُتجاهل) كأرقام صفوف مرتبة،
+        أو None بدون فلاتر. التقاطع يبدأ بأصغر قائمة
+        """
+        sets = sorted(
+            (self.rows_matching(field, text) for field, text in filters.items() if text),
+            key=len
+        )
+        if not sets:
+            return None
+        rows = sets[0]
+        if len(sets) > 1:
+            # bitset لكل قائمة أخرى ثم إبقاء صفوف الأصغر الموجودة فيها (بدون ترتيب)
+            member = np.empty(len(self.ids), dtype=bool)
+            for other in sets[1:]:
+                if not len(rows):
+                    break
+                member[:] = False
+                member[other] = True
+                rows = rows[member[rows]]
+        return rows
+
+    def codes(self, field: str) -> np.ndarray:
+        """
+        قيم حقل فئوي (family، role، volatility...) كرموز صحيحة صغيرة بترتيب ids:
+        نفس القيمة تماماً → نفس الرمز، فالمقارنة مع كل النوتات عملية numpy واحدة
+        """
+        values = self._codes.get(field)
+        if values is None:
+            vocabulary = {}
+            values = np.array([vocabulary.setdefault(value, len(vocabulary)) for value in self.column(field)],
+                              dtype=np.int32)
+            self._codes[field] = values
+        return values
+
+    def attribute_scores(self, note_id, weights: Dict[str, int]) -> np.ndarray:
+        """درجة تشابه كل النوتات مع نوتة: مجموع أوزان الحقول الفئوية المتساوية معها"""
+        row = self.row_of(note_id)
+        scores = np.zeros(len(self.ids), dtype=np.int32)
+        if row is None:
+            return scores
+        for field, weight in weights.items():
+            codes = self.codes(field)
+            scores += weight * (codes == codes[row])
+        return scores
+
+    def numeric_column(self, field: str) -> np.ndarray:
+        """column رقمي كمصفوفة float64 (القيم الناقصة = القيمة الافتراضية في Note)"""
+        values = self._numeric.get(field)
+        if values is None:
+            default = Note.__dataclass_fields__[field].default
+            values = np.array([default if value is None else value for value in self.column(field)], dtype=np.float64)
+            self._numeric[field] = values
+        return values
+
+    def select(self, filters: Dict) -> Optional[np.ndarray]:
+        """
+        صفوف النوتات المطابقة لفلاتر RAG كلها: نصية (FILTER_FIELDS) وحدود رقمية (RANGE_FILTERS)،
+        أو None بدون فلاتر. المفاتيح الأخرى تُتجاهل
+        """
+        rows = self.filter_rows({field: filters.get(field) for field in FILTER_FIELDS})
+        for key, (field, bound) in RANGE_FILTERS.items():
+            if filters.get(key) is None:
+                continue
+            values = self.numeric_column(field)
+            keep = values >= filters[key] if bound == 'min' else values <= filters[key]
+            rows = np.flatnonzero(keep) if rows is None else rows[keep[rows]]
+        return rows
+
+    def filter_mask(self, filters: Dict) -> Optional[np.ndarray]:
+        """filter_rows كمصفوفة bool بطول المخزن (لفحص نتائج البحث الدلالي بـ row_of)"""
+        rows = self.filter_rows(filters)
+        if rows is None:
+            return None
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def row_of(self, note_id) -> Optional[int]:
+        """رقم صف النوتة في ترتيب ids"""
+        if self._row_by_id is None:
+            self._row_by_id = {note_id: row for row, note_id in enumerate(self.ids)}
+        return self._row_by_id.get(note_id)
+
+    def ids_at(self, rows: np.ndarray) -> List:
+        """معرفات أرقام صفوف بنفس ترتيبها"""
+        ids = self.ids
+        return [ids[row] for row in rows.tolist()]
+
+    @property
+    def name_index(self) -> NameIndex:
+        """فهرس trigrams للاسم الإنجليزي ثم العربي لكل نوتة (بترتيب المخزن)"""
+        if self._name_index is None:
+            self._name_index = NameIndex(
+                (note_id, name)
+                for note_id, name_en, name_ar in zip(self.ids, self.column('note'), self.column('arabic'))
+                for name in (name_en, name_ar)
+            )
+        return self._name_index
+
+    def search_name_id(self, name: str, threshold: float = 0.3):
+        """معرف أقرب نوتة بالاسم (تطابق تام أولاً ثم فهرس trigrams) بتشابه أعلى من threshold، أو None"""
+        note_id = self.find_id(name)
+        if note_id is None:
+            note_id, _ = self.name_index.search(name, threshold)
+        return note_id
+
+    def search_name(self, name: str, threshold: float = 0.3) -> Optional[Note]:
+        """سجل أقرب نوتة بالاسم (search_name_id) أو None"""
+        note_id = self.search_name_id(name, threshold)
+        return self.get(note_id) if note_id is not None else None
+
+    @property
+    def compatibility(self) -> CompatibilityGraph:
+        """رسم التوافق بين النوتات (works_well_with / avoid_with)"""
+        if self._compatibility is None:
+            self._compatibility = CompatibilityGraph(self)
+        return self._compatibility
+
+    def matching(self, field: str, text: str) -> List:
+        """معرفات النوتات التي يحتوي حقلها (أو أحد عناصر قائمتها) على text، بترتيب المخزن"""
+        return self.ids_at(self.rows_matching(field, text))
+
+    def matching_all(self, filters: Dict) -> List:
+        """معرفات النوتات المطابقة لكل الفلاتر {الحقل: النص}، بترتيب المخزن"""
+        rows = self.filter_rows(filters)
+        return list(self.ids) if rows is None else self.ids_at(rows)
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    أرقام صفوف أعلى k درجات موجبة، مرتبة تنازلياً وعند التساوي بترتيب المخزن
+    (اختيار بـ argpartition بدلاً من ترتيب كل الدرجات)
+    """
+    rows = np.flatnonzero(scores > 0)
+    if len(rows) > k:
+        if k <= 0:
+            return rows[:0]
+        values = scores[rows]
+        kth = values[np.argpartition(-values, k - 1)[k - 1]]
+        above = rows[values > kth]
+        rows = np.concatenate([above, rows[values == kth][:k - len(above)]])
+    return rows[np.lexsort((rows, -scores[rows]))]
+
+
+def get_notes_store() -> NotesStore:
+    """مخزن النوتات الحالي في العملية (بعد مزامنة الفهرس مع سجل التعديلات)"""
+    from app.notes_retriever import get_retriever
+    return get_retriever().store
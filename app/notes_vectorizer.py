@@ -10,6 +10,16 @@ import faiss
 import numpy as np
 from openai import OpenAI
 
+try:
+    from app.embeddings import create_embedder
+    from app.notes_columns import write_columns
+    from app.vector_index import build_index, fit_calibration, index_type_of
+except ImportError:
+    # python app/notes_vectorizer.py
+    from embeddings import create_embedder
+    from notes_columns import write_columns
+    from vector_index import build_index, fit_calibration, index_type_of
+
 # Initialize OpenAI client
 try:
     api_key = os.environ.get("AI_INTEGRATIONS_OPENAI_API_KEY")
@@ -28,6 +38,7 @@ except Exception as e:
 KB_PATH = "notes_kb.json"
 INDEX_PATH = "app/data/notes.index"
 EMBEDDINGS_PATH = "app/data/notes_embeddings.json"
+COLUMNS_PATH = "app/data/notes.columns"
 DATA_DIR = "app/data"
 
 def ensure_data_directory():
@@ -72,32 +83,13 @@ def generate_embeddings(texts):
     """Generate embeddings using hash-based approach for local development"""
     print("⏳ جاري توليد Embeddings (استخدام طريقة محلية)...")
     
-    import hashlib
-    
-    # Use hash-based embeddings for consistency
-    # Each text generates a consistent embedding based on its hash
-    np.random.seed(42)  # For reproducibility
-    
-    vectors = []
-    embedding_dim = 384  # Dimension for embeddings
-    
-    for text in texts:
-        # Create a consistent hash-based seed
-        hash_obj = hashlib.md5(text.encode())
-        seed = int(hash_obj.hexdigest(), 16) % (2**31)
-        
-        # Generate consistent random vector using seed
-        rng = np.random.RandomState(seed)
-        vector = rng.randn(embedding_dim).astype('float32')
-        
-        # Normalize
-        vector = vector / (np.linalg.norm(vector) + 1e-10)
-        vectors.append(vector)
-    
-    vectors = np.array(vectors).astype("float32")
+    # Local embedder (EMBEDDER), fitted on the notes and saved next to the index
+    embedder = create_embedder()
+    vectors = embedder.fit(texts).encode(texts)
+    embedder.save(DATA_DIR)
     print(f"✓ تم توليد {len(vectors)} embedding بنجاح")
     print(f"  - حجم كل embedding: {len(vectors[0])} بُعد")
-    print(f"  - الطريقة: Hash-based embeddings (محلي، معيد الإنتاج)")
+    print(f"  - الطريقة: {embedder.name} (محلي، معيد الإنتاج)")
     
     return vectors
 
@@ -107,12 +99,12 @@ def create_faiss_index(vectors):
         dimension = len(vectors[0])
         print(f"⏳ جاري إنشاء FAISS Index ({dimension} بُعد)...")
         
-        # Create index
-        index = faiss.IndexFlatL2(dimension)
-        index.add(vectors)
+        # Inner product index (flat / hnsw / ivfpq via FAISS_INDEX_TYPE)
+        index = build_index(vectors)
         
         print(f"✓ تم إنشاء FAISS Index بنجاح")
         print(f"  - عدد المتجهات: {index.ntotal}")
+        print(f"  - النوع: {index_type_of(index)}")
         
         return index
     except Exception as e:
@@ -122,14 +114,22 @@ def create_faiss_index(vectors):
 def save_index(index, notes, texts, vectors):
     """Save FAISS index and metadata"""
     try:
-        # Save FAISS index
-        faiss.write_index(index, INDEX_PATH)
+        # Save FAISS index (temp file + rename: running workers memory-map the current file)
+        faiss.write_index(index, INDEX_PATH + ".tmp")
+        os.replace(INDEX_PATH + ".tmp", INDEX_PATH)
         print(f"✓ تم حفظ FAISS Index في: {INDEX_PATH}")
         
+        # Notes in index order (FAISS id = row number)
+        write_columns(COLUMNS_PATH, notes)
+        print(f"✓ تم حفظ بيانات النوتات في: {COLUMNS_PATH}")
+        
         # Save embeddings metadata
         embeddings_data = {
             "model": "text-embedding-3-small",
+            "embedder": create_embedder().name,
             "dimension": len(vectors[0]),
+            "index_type": index_type_of(index),
+            "calibration": fit_calibration(vectors).to_dict(),
             "total_notes": len(notes),
             "notes": [
                 {
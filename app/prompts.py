@@ -0,0 +1,226 @@
+"""
+Prompts - سجل قوالب البرومبت وتقدير التوكنز وميزانية كل وحدة
+- القوالب تُترجم مرة واحدة عند الاستيراد (الأجزاء الثابتة وتوكنزها محسوبة مسبقاً)
+- عند التوليد تُقص الأجزاء المرنة (سياق RAG، أمثلة JSON، قوائم المنتجات) حتى تناسب الميزانية
+"""
+
+import os
+import re
+import threading
+from string import Formatter
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from app.constants.prompts import PROMPT_SPECS
+
+
+PROMPT_BUDGETS_ENABLED = os.environ.get('PROMPT_BUDGETS_ENABLED', 'true').lower() == 'true'
+
+_ASCII = re.compile(r'[\x00-\x7f]+')
+_ARABIC = re.compile(r'[؀-ۿݐ-ݿﭐ-﷿ﹰ-﻿]+')
+_BLANK_LINES = re.compile(r'\s*\n\s*')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    تقدير عدد التوكنز بدون tokenizer
+
+    تقريبي لترميز نماذج gpt-4o: ~4 أحرف لاتينية للتوكن، ~2.5 حرف عربي،
+    وباقي الرموز (الإيموجي والخطوط الزخرفية) ~1.5 حرف. الأعداد الفعلية
+    تأتي من usage في رد OpenAI وتُسجل في ai_client.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(len(m) for m in _ASCII.findall(text))
+    arabic_chars = sum(len(m) for m in _ARABIC.findall(text))
+    other_chars = len(text) - ascii_chars - arabic_chars
+    return int(ascii_chars / 4 + arabic_chars / 2.5 + other_chars / 1.5) + 1
+
+
+def compact_json_example(example: str) -> str:
+    """نسخة مضغوطة من مثال JSON (بدون المسافات البادئة وفواصل الأسطر)"""
+    return _BLANK_LINES.sub(' ', example.strip())
+
+
+class Items:
+    """
+    جزء مرن مكون من عناصر مرتبة حسب الأهمية، يُقص من النهاية
+
+    Args:
+        items: العناصر (نوتات RAG، منتجات، أسطر...)
+        render: دالة تحول العناصر المتبقية إلى نص (افتراضياً الربط بـ joiner)
+        min_items: أقل عدد عناصر يُسمح بالبقاء
+    """
+
+    def __init__(self, items: Sequence, render: Optional[Callable[[Sequence], str]] = None,
+                 joiner: str = '\n', min_items: int = 1):
+        self._items = list(items)
+        self._render = render or (lambda xs: joiner.join(str(x) for x in xs))
+        self._min = min(min_items, len(self._items))
+        self._count = len(self._items)
+
+    @property
+    def text(self) -> str:
+        return self._render(self._items[:self._count])
+
+    def shrink(self) -> bool:
+        if self._count <= self._min:
+            return False
+        self._count -= 1
+        return True
+
+
+class Variants:
+    """جزء مرن له عدة صيغ من الأطول للأقصر (مثل مثال JSON كامل ثم مضغوط)"""
+
+    def __init__(self, *texts: str):
+        self._texts = texts
+        self._index = 0
+
+    @property
+    def text(self) -> str:
+        return self._texts[self._index]
+
+    def shrink(self) -> bool:
+        if self._index + 1 >= len(self._texts):
+            return False
+        self._index += 1
+        return True
+
+
+class _Compiled:
+    """قالب نصي مُحلل مسبقاً إلى (نص ثابت، اسم حقل)"""
+
+    def __init__(self, template: str):
+        self.parts = [(literal, field) for literal, field, _, _ in Formatter().parse(template)]
+        self.fields = [field for _, field in self.parts if field]
+        self.static_tokens = estimate_tokens(''.join(literal for literal, _ in self.parts))
+
+    def render(self, values: Dict[str, str]) -> str:
+        out = []
+        for literal, field in self.parts:
+            out.append(literal)
+            if field:
+                out.append(values[field])
+        return ''.join(out)
+
+
+class RenderedPrompt(NamedTuple):
+    prompt: str
+    system: Optional[str]
+    tokens: int
+    trimmed: bool
+
+
+class PromptTemplate:
+    """
+    قالب برومبت مسجل لوحدة معينة
+
+    Args:
+        name: اسم القالب في السجل
+        user: نص البرومبت بصيغة str.format (الأقواس الحرفية مضاعفة {{ }})
+        system: رسالة النظام (قد تحتوي حقولاً أيضاً)
+        budget: ميزانية توكنز المدخلات (user + system)
+        trim_order: ترتيب قص الحقول المرنة عند تجاوز الميزانية
+        examples: أمثلة ثابتة (JSON أو HTML) تُملأ تلقائياً، بصيغة كاملة ثم مضغوطة
+    """
+
+    def __init__(self, name: str, user: str, system: Optional[str] = None,
+                 budget: Optional[int] = None, trim_order: Sequence[str] = (),
+                 examples: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.budget = budget
+        self.trim_order = tuple(trim_order)
+        self.examples = {
+            key: (text, compact_json_example(text)) for key, text in (examples or {}).items()
+        }
+        self._user = _Compiled(user)
+        self._system = _Compiled(system) if system is not None else None
+        self.static_tokens = self._user.static_tokens + (self._system.static_tokens if self._system else 0)
+
+    def render(self, **fields) -> RenderedPrompt:
+        """تعبئة القالب وقص الحقول المرنة (Items / Variants) حتى تناسب الميزانية"""
+        for key, texts in self.examples.items():
+            fields.setdefault(key, Variants(*texts))
+
+        field_tokens = {}
+        for key, value in fields.items():
+            field_tokens[key] = estimate_tokens(_text(value))
+        total = self.static_tokens + sum(field_tokens.values())
+        before = total
+
+        if PROMPT_BUDGETS_ENABLED and self.budget and total > self.budget:
+            for key in self.trim_order:
+                value = fields.get(key)
+                if not hasattr(value, 'shrink'):
+                    continue
+                while total > self.budget and value.shrink():
+                    tokens = estimate_tokens(value.text)
+                    total += tokens - field_tokens[key]
+                    field_tokens[key] = tokens
+                if total <= self.budget:
+                    break
+
+        values = {key: _text(value) for key, value in fields.items()}
+        trimmed = total < before
+        if trimmed:
+            print(f"✂️ Prompt {self.name}: {before} → {total} توكن (الميزانية {self.budget})")
+
+        _record_render(self.name, total, trimmed)
+
+        return RenderedPrompt(
+            prompt=self._user.render(values),
+            system=self._system.render(values) if self._system else None,
+            tokens=total,
+            trimmed=trimmed
+        )
+
+
+def _text(value) -> str:
+    if hasattr(value, 'shrink'):
+        return value.text
+    return '' if value is None else str(value)
+
+
+PROMPTS: Dict[str, PromptTemplate] = {
+    name: PromptTemplate(name, **spec) for name, spec in PROMPT_SPECS.items()
+}
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    """الحصول على قالب مسجل بالاسم"""
+    return PROMPTS[name]
+
+
+def render_prompt(name: str, **fields) -> RenderedPrompt:
+    """اختصار: get_prompt(name).render(**fields)"""
+    return PROMPTS[name].render(**fields)
+
+
+_stats_lock = threading.Lock()
+_render_stats: Dict[str, Dict] = {}
+
+
+def _record_render(name: str, tokens: int, trimmed: bool):
+    with _stats_lock:
+        stats = _render_stats.setdefault(name, {'renders': 0, 'trimmed': 0, 'estimated_tokens': 0, 'max_tokens': 0})
+        stats['renders'] += 1
+        stats['trimmed'] += int(trimmed)
+        stats['estimated_tokens'] += tokens
+        stats['max_tokens'] = max(stats['max_tokens'], tokens)
+
+
+def get_prompt_stats() -> List[Dict]:
+    """إحصائيات أحجام البرومبت لكل قالب (تقديرية)"""
+    with _stats_lock:
+        return [
+            {
+                'name': name,
+                'budget': PROMPTS[name].budget,
+                'static_tokens': PROMPTS[name].static_tokens,
+                'renders': stats['renders'],
+                'trimmed': stats['trimmed'],
+                'avg_tokens': round(stats['estimated_tokens'] / stats['renders']),
+                'max_tokens': stats['max_tokens']
+            }
+            for name, stats in sorted(_render_stats.items())
+        ]
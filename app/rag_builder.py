@@ -5,27 +5,23 @@ This module handles building and rebuilding the FAISS index from PerfumeNote dat
 
 import os
 import json
-import hashlib
 import numpy as np
-import faiss
 from datetime import datetime
+from app.embeddings import embed_text, create_embedder, EMBEDDING_DIM
+from app.vector_index import build_index, fit_calibration, index_type_of
 
 
-def generate_embedding(text: str, embedding_dim: int = 384) -> np.ndarray:
+def generate_embedding(text: str, embedding_dim: int = EMBEDDING_DIM) -> np.ndarray:
     """Generate consistent hash-based embedding for text"""
-    hash_obj = hashlib.md5(text.encode())
-    seed = int(hash_obj.hexdigest(), 16) % (2**31)
-    
-    rng = np.random.RandomState(seed)
-    vector = rng.randn(embedding_dim).astype('float32')
-    vector = vector / (np.linalg.norm(vector) + 1e-10)
-    
-    return vector
+    return embed_text(text, embedding_dim)
 
 
 def create_note_text(note_dict: dict) -> str:
     """Create searchable text representation of a note"""
+    # الاسمان مكرران لأن قوائم works_well_with في النوتات الأخرى تذكر نفس الأسماء
     parts = [
+        note_dict.get('note', ''),
+        note_dict.get('arabic', ''),
         note_dict.get('note', ''),
         note_dict.get('arabic', ''),
         note_dict.get('family', ''),
@@ -72,61 +68,41 @@ def rebuild_faiss_index() -> dict:
         
         texts = [create_note_text(n) for n in notes_dicts]
         
-        embedding_dim = 384
-        vectors = []
-        for text in texts:
-            vector = generate_embedding(text, embedding_dim)
-            vectors.append(vector)
+        embedder = create_embedder()
+        vectors = embedder.fit(texts).encode(texts)
+        embedding_dim = embedder.dim
         
-        vectors = np.array(vectors).astype('float32')
-        
-        index = faiss.IndexFlatL2(embedding_dim)
-        index.add(vectors)
-        
-        data_dir = 'app/data'
-        os.makedirs(data_dir, exist_ok=True)
-        
-        index_path = os.path.join(data_dir, 'notes.index')
-        faiss.write_index(index, index_path)
+        # inner product على متجهات مطبّعة، النوع حسب FAISS_INDEX_TYPE وحجم المجموعة،
+        # ومعرفات PerfumeNote.id للتحديث التدريجي (app/notes_index.py)
+        index = build_index(vectors, ids=[n['id'] for n in notes_dicts])
+        calibration = fit_calibration(vectors)
         
         metadata = {
             'created_at': datetime.utcnow().isoformat(),
             'notes_count': len(notes_dicts),
             'embedding_dim': embedding_dim,
-            'source': 'database',
-            'notes': [
-                {
-                    'id': i,
-                    'db_id': n['id'],
-                    'note': n['note'],
-                    'arabic': n['arabic'],
-                    'family': n['family'],
-                    'incense_style': n.get('incense_style', 'clean'),
-                    'intensity_weight': n.get('intensity_weight', 5),
-                    'formality_score': n.get('formality_score', 5)
-                }
-                for i, n in enumerate(notes_dicts)
-            ]
+            'embedder': embedder.name,
+            'index_type': index_type_of(index),
+            'calibration': calibration.to_dict(),
+            'source': 'database'
         }
         
-        metadata_path = os.path.join(data_dir, 'notes_embeddings.json')
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-        
-        notes_cache_path = os.path.join(data_dir, 'notes_cache.json')
-        with open(notes_cache_path, 'w', encoding='utf-8') as f:
-            json.dump(notes_dicts, f, ensure_ascii=False, indent=2)
+        # نسخة جديدة كاملة تُنشر ذرياً وتحل محل سجل التعديلات التدريجية؛
+        # كل worker يحمّلها عند أول طلب بعد تغيّر app/data/CURRENT
+        from app.notes_index import wal_lock, publish_snapshot, snapshot_dir
+        with wal_lock():
+            generation = publish_snapshot(index, metadata, notes_dicts, embedder)
         
-        global _retriever_instance
-        _retriever_instance = None
+        from app.notes_retriever import get_retriever
+        get_retriever().sync()
         
-        print(f"✅ تم إعادة بناء FAISS index بنجاح ({len(notes_dicts)} نوتة)")
+        print(f"✅ تم إعادة بناء FAISS index بنجاح ({len(notes_dicts)} نوتة، embedder: {embedder.name}، النسخة {generation})")
         
         return {
             'success': True,
             'notes_count': len(notes_dicts),
-            'index_path': index_path,
-            'metadata_path': metadata_path
+            'generation': generation,
+            'snapshot_dir': snapshot_dir(generation)
         }
     
     except Exception as e:
@@ -138,37 +114,16 @@ def rebuild_faiss_index() -> dict:
         }
 
 
-_retriever_instance = None
-
-
 def get_notes_from_cache() -> list:
-    """Get notes from cache file (faster than database query)"""
-    cache_path = 'app/data/notes_cache.json'
-    
-    if os.path.exists(cache_path):
-        try:
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            pass
-    
-    try:
-        from app.models import PerfumeNote
-        return PerfumeNote.get_all_notes_as_dict()
-    except:
-        pass
-    
-    if os.path.exists('notes_kb.json'):
-        with open('notes_kb.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    
-    return []
+    """Get notes from the shared notes store (index snapshot, then database, then notes_kb.json)"""
+    from app.notes_store import get_notes_store
+    return get_notes_store().all()
 
 
 def initialize_rag_system():
     """Initialize RAG system on app startup"""
-    data_dir = 'app/data'
-    index_path = os.path.join(data_dir, 'notes.index')
+    from app.notes_index import current_generation, snapshot_dir
+    index_path = os.path.join(snapshot_dir(current_generation()), 'notes.index')
     
     if not os.path.exists(index_path):
         print("🔄 FAISS index غير موجود، جاري البناء الأولي...")
@@ -0,0 +1,94 @@
+"""
+RAG Debug Sampling - تسجيل معلومات التصحيح لنسبة من طلبات RAG في الإنتاج
+
+وضع التصحيح الكامل (RAG_DEBUG أو debug=True) يرفق RAGDebugInfo بكل رد. هنا بدلاً من ذلك:
+- RAG_DEBUG_SAMPLE_RATE: نسبة الطلبات (0-1) التي تُجمع لها معلومات التصحيح؛ الطلبات غير
+  المختارة تكلفتها مقارنة رقم واحد (ولا شيء عند 0)
+- السجلات تُحفظ في ring buffer بالذاكرة لكل worker (RAG_DEBUG_BUFFER_SIZE سجل، الأقدم يُحذف)
+  كـ dict مسطح يشير لقوائم RAGDebugInfo نفسها بدون نسخ، ولا تُرفق بالرد
+- التصفح والتصدير (JSON Lines) من لوحة الإدارة: /admin/rag-debug و /admin/rag-debug/export
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+
+RAG_DEBUG_SAMPLE_RATE = float(os.environ.get('RAG_DEBUG_SAMPLE_RATE', 0))
+RAG_DEBUG_BUFFER_SIZE = int(os.environ.get('RAG_DEBUG_BUFFER_SIZE', 500))
+
+
+class RAGDebugBuffer:
+    """آخر max_records سجل تصحيح مع رقم تسلسلي متزايد (للتصفح التدريجي بـ since)"""
+
+    def __init__(self, sample_rate: float = RAG_DEBUG_SAMPLE_RATE, max_records: int = RAG_DEBUG_BUFFER_SIZE):
+        self.sample_rate = sample_rate
+        self.max_records = max_records
+        self._records: deque = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def record(self, debug_info, result, top_k: int, duration: float):
+        """إضافة سجل من RAGDebugInfo ونتيجة الطلب (بدون نسخ القوائم)"""
+        record = {
+            'time': time.time(),
+            'query': debug_info.query,
+            'module_type': debug_info.module_type,
+            'filters': dict(debug_info.filters_applied),
+            'top_k': top_k,
+            'is_valid': result.is_valid,
+            'duration_ms': round(duration * 1000, 3),
+            'retrieved_count': debug_info.retrieved_count,
+            'used_notes': debug_info.used_notes,
+            'excluded_notes': debug_info.excluded_notes,
+            'selection_reasons': debug_info.selection_reasons,
+            'exclusion_reasons': debug_info.exclusion_reasons
+        }
+        with self._lock:
+            self._seq += 1
+            record['seq'] = self._seq
+            self._records.append(record)
+
+    def records(self, since: int = 0, module_type: Optional[str] = None,
+                limit: Optional[int] = None) -> List[Dict]:
+        """السجلات بعد الرقم since (الأحدث أولاً)، اختيارياً لوحدة واحدة"""
+        with self._lock:
+            records = list(self._records)
+        selected = []
+        for record in reversed(records):
+            if record['seq'] <= since or (limit is not None and len(selected) >= limit):
+                break
+            if module_type is None or record['module_type'] == module_type:
+                selected.append(record)
+        return selected
+
+    def iter_export(self) -> Iterator[Dict]:
+        """كل السجلات الحالية بالترتيب الزمني"""
+        with self._lock:
+            records = list(self._records)
+        return iter(records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def get_stats(self) -> Dict:
+        return {
+            'sample_rate': self.sample_rate,
+            'max_records': self.max_records,
+            'records': len(self._records),
+            'recorded_total': self._seq
+        }
+
+
+_buffer = RAGDebugBuffer()
+
+
+def get_debug_buffer() -> RAGDebugBuffer:
+    return _buffer
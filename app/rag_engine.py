@@ -4,15 +4,24 @@ RAG Engine - المحرك الموحد لنظام RAG
 """
 
 import json
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, field, asdict
-from app.notes_retriever import (
-    retrieve_notes, 
-    hybrid_retrieve, 
-    retrieve_notes_by_family,
-    retrieve_notes_by_role,
-    get_retriever
-)
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, field, fields, asdict
+from app.notes_retriever import get_retriever, Hit
+from app.rag_debug import get_debug_buffer
+
+
+# أقل درجة تطابق معايرة (0-1) لقبول نوتة: auto = أعلى من 95% من أزواج النوتات العشوائية
+# (app/vector_index.ScoreCalibration)، أو رقم ثابت، أو off لإرجاع top_k دائماً.
+# أفضل min_notes نتائج لكل وحدة تُحفظ دائماً، والحد يقص ما بعدها فقط
+SIMILARITY_FLOOR = os.environ.get('RAG_SIMILARITY_FLOOR', 'auto')
+# فلاتر تُطبّق فوق العائلة والدور، وعند عدم تطابق أي نوتة معها تُهمل (أفضل 3 نتائج بدونها)
+ADVANCED_FILTERS = ('incense_style', 'min_formality', 'max_intensity')
+# عدد نتائج RAG المحفوظة (LRU) لكل worker، 0 = بدون كاش
+RAG_CACHE_SIZE = int(os.environ.get('RAG_CACHE_SIZE', 256))
 
 
 @dataclass
@@ -42,7 +51,86 @@ class RAGDebugInfo:
     filters_applied: Dict = field(default_factory=dict)
     
     def to_dict(self) -> Dict:
-        return asdict(self)
+        # القوائم تخص هذا الطلب فقط، فلا حاجة لنسخها بعمق كما في asdict
+        result = {f.name: getattr(self, f.name) for f in fields(self)}
+        result['filters_applied'] = dict(self.filters_applied)
+        return result
+
+
+class RAGResultCache:
+    """
+    كاش LRU محدود لنتائج RAGEngine.run لكل (الاستعلام الموحّد، الوحدة، الفلاتر، top_k)
+
+    المفاتيح مرتبطة بنسخة الفهرس (رقم النسخة + موضع سجل التعديلات): عند إعادة البناء أو
+    الضغط أو أي تعديل في السجل تتغير النسخة فيُفرّغ الكاش كله عند أول طلب بعدها.
+    النتائج تُخزّن وتُعاد كنسخ (قوائم جديدة و dict جديد لكل نوتة)، فإضافة أو حذف المستدعي
+    لحقول أو نوتات لا يصل للكاش.
+    """
+
+    def __init__(self, max_entries: int = RAG_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _copy(result: RAGResult) -> RAGResult:
+        return RAGResult(
+            notes=[dict(note) for note in result.notes],
+            context_text=result.context_text,
+            note_ids=list(result.note_ids),
+            families=list(result.families),
+            is_valid=result.is_valid,
+            debug_info=dict(result.debug_info)
+        )
+
+    def _check_generation(self, generation: Tuple):
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, generation: Tuple, key: Tuple) -> Optional[RAGResult]:
+        with self._lock:
+            self._check_generation(generation)
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return self._copy(result)
+
+    def put(self, generation: Tuple, key: Tuple, result: RAGResult):
+        result = self._copy(result)
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'max_entries': self.max_entries,
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
 
 
 class RAGEngine:
@@ -78,43 +166,51 @@ class RAGEngine:
         'scent_dna': {
             'top_k': 6,
             'include_families': True,
-            'require_validation': True
+            'require_validation': True,
+            'min_notes': 3
         },
         'custom_perfume': {
             'top_k': 8,
             'include_families': True,
-            'require_validation': True
+            'require_validation': True,
+            'min_notes': 3
         },
         'recommendations': {
             'top_k': 10,
             'include_families': True,
-            'require_validation': True
+            'require_validation': True,
+            'min_notes': 3
         },
         'article': {
             'top_k': 5,
             'include_families': False,
-            'require_validation': False
+            'require_validation': False,
+            'min_notes': 3
         },
         'face_analyzer': {
             'top_k': 6,
             'include_families': True,
-            'require_validation': True
+            'require_validation': True,
+            'min_notes': 3
         },
         'blend_predictor': {
             'top_k': 8,
             'include_families': True,
-            'require_validation': True
+            'require_validation': True,
+            'min_notes': 3
         },
         'default': {
             'top_k': 5,
             'include_families': True,
-            'require_validation': True
+            'require_validation': True,
+            'min_notes': 3
         }
     }
     
-    def __init__(self, debug: bool = False):
+    def __init__(self, debug: bool = False, cache_size: int = RAG_CACHE_SIZE):
         self.debug = debug
         self._retriever = get_retriever()
+        self._cache = RAGResultCache(cache_size) if cache_size > 0 else None
     
     def run(
         self,
@@ -141,33 +237,73 @@ class RAGEngine:
         config = self.MODULE_CONFIGS.get(module_type, self.MODULE_CONFIGS['default'])
         k = top_k or config['top_k']
         
+        # عينة RAG_DEBUG_SAMPLE_RATE: معلومات التصحيح تُجمع للـ ring buffer ولا تُرفق بالرد
+        buffer = get_debug_buffer()
+        sampled = not use_debug and buffer.should_sample()
+        
         debug_info = RAGDebugInfo(
             query=query,
             module_type=module_type,
             filters_applied=filters or {}
-        ) if use_debug else None
+        ) if use_debug or sampled else None
+        
+        if not sampled:
+            return self._run(query, filters, module_type, k, debug_info, use_debug)
         
+        start = time.perf_counter()
+        result = self._run(query, filters, module_type, k, debug_info, use_debug)
+        buffer.record(debug_info, result, k, time.perf_counter() - start)
+        return result
+    
+    def _run(
+        self,
+        query: str,
+        filters: Optional[Dict],
+        module_type: str,
+        k: int,
+        debug_info: Optional[RAGDebugInfo],
+        attach_debug: bool
+    ) -> RAGResult:
+        """الاسترجاع وبناء السياق؛ debug_info يُملأ إذا مُرر ويُرفق بالنتيجة مع attach_debug"""
         try:
-            if filters:
-                notes = hybrid_retrieve(query, filters, k)
+            # نتائج خفيفة (note_id, score, method) حتى الفلترة، و dicts للنوتات المختارة فقط
+            retriever = get_retriever()
+            store = retriever.store
+            # التصحيح يشغّل الاسترجاع دائماً (أسباب الاختيار والاستبعاد لهذا الطلب)
+            cache_key = None
+            if self._cache is not None and debug_info is None and retriever.is_ready():
+                generation, cache_key = self._cache_key(retriever, query, filters, module_type, k)
+                cached = self._cache.get(generation, cache_key)
+                if cached is not None:
+                    return cached
+            
+            if not retriever.is_ready():
+                hits = []
+            elif filters:
+                hits = self._apply_advanced_filters(query, filters, k, retriever, store, debug_info)
             else:
-                notes = retrieve_notes(query, k)
+                hits = retriever.similarity_hits(query, k)
             
-            if not notes:
-                return RAGResult(
+            config = self.MODULE_CONFIGS.get(module_type, self.MODULE_CONFIGS['default'])
+            hits = self._apply_similarity_floor(hits, store, debug_info, config['min_notes'])
+            
+            if not hits:
+                result = RAGResult(
                     notes=[],
                     context_text=self._generate_empty_context(),
                     is_valid=False,
-                    debug_info=debug_info.to_dict() if debug_info else {}
+                    debug_info=debug_info.to_dict() if attach_debug else {}
                 )
+                if cache_key is not None:
+                    self._cache.put(generation, cache_key, result)
+                return result
             
-            notes = self._apply_advanced_filters(notes, filters, debug_info)
+            notes = retriever.materialize(hits, store)
             
             note_ids = [n.get('note', n.get('name_en', '')) for n in notes]
             families = list(set(n.get('family', '') for n in notes if n.get('family')))
             
-            context_text = self._generate_context(notes, config)
-            strict_context = self.STRICT_PROMPT_TEMPLATE.format(notes_context=context_text)
+            strict_context = self.build_context(notes, module_type)
             
             if debug_info:
                 debug_info.retrieved_count = len(notes)
@@ -180,14 +316,17 @@ class RAGEngine:
                     for n in notes[:3]
                 ]
             
-            return RAGResult(
+            result = RAGResult(
                 notes=notes,
                 context_text=strict_context,
                 note_ids=note_ids,
                 families=families,
                 is_valid=True,
-                debug_info=debug_info.to_dict() if debug_info else {}
+                debug_info=debug_info.to_dict() if attach_debug else {}
             )
+            if cache_key is not None:
+                self._cache.put(generation, cache_key, result)
+            return result
             
         except Exception as e:
             if debug_info:
@@ -197,58 +336,110 @@ class RAGEngine:
                 notes=[],
                 context_text=self._generate_empty_context(),
                 is_valid=False,
-                debug_info=debug_info.to_dict() if debug_info else {'error': str(e)}
+                debug_info=debug_info.to_dict() if attach_debug else {'error': str(e)}
             )
     
+    @staticmethod
+    def _cache_key(retriever, query: str, filters: Optional[Dict], module_type: str, k: int) -> Tuple[Tuple, Tuple]:
+        """(نسخة الفهرس، مفتاح الطلب): الاستعلام بتوحيد الـ embedder والفلاتر مرتبة"""
+        view = retriever.view
+        generation = (view.snapshot.token, view.wal_offset)
+        filters_key = json.dumps(filters or {}, sort_keys=True, ensure_ascii=False, default=str)
+        return generation, (retriever.embedder.query_key(query), module_type, k, filters_key)
+    
+    def get_cache_stats(self) -> Dict:
+        """إحصائيات كاش نتائج RAG"""
+        if self._cache is None:
+            return {'enabled': False}
+        return dict(self._cache.get_stats(), enabled=True)
+    
+    def similarity_floor(self) -> float:
+        """الحد الأدنى لدرجة التطابق حسب RAG_SIMILARITY_FLOOR (0 = بدون حد)"""
+        if SIMILARITY_FLOOR == 'off':
+            return 0.0
+        if SIMILARITY_FLOOR != 'auto':
+            return float(SIMILARITY_FLOOR)
+        calibration = getattr(self._retriever, 'calibration', None)
+        # فهارس قديمة بدون معايرة: الدرجات غير قابلة للمقارنة، لا حد
+        if calibration is None or not calibration.samples:
+            return 0.0
+        return calibration.background_floor()
+    
+    def _apply_similarity_floor(
+        self,
+        hits: List[Hit],
+        store,
+        debug_info: Optional[RAGDebugInfo],
+        min_notes: int = 0
+    ) -> List[Hit]:
+        """
+        استبعاد النوتات التي لا يتجاوز تطابقها تشابه الصدفة بدلاً من إرجاع top_k دائماً
+
+        أفضل min_notes نتائج تُحفظ حتى تحت الحد: الوحدات تحتاج عدداً أدنى من النوتات لوضع KB
+        """
+        floor = self.similarity_floor()
+        if not floor or len(hits) <= min_notes:
+            return hits
+        
+        kept = hits[:min_notes] + [h for h in hits[min_notes:] if h.score >= floor]
+        if debug_info and len(kept) != len(hits):
+            for h in hits[min_notes:]:
+                if h.score < floor:
+                    note = store.get(h.note_id)
+                    debug_info.excluded_notes.append(
+                        {'name': note.note if note else None, 'family': note.family if note else None, 'score': h.score}
+                    )
+            debug_info.exclusion_reasons.append(
+                f"تم استبعاد {len(hits) - len(kept)} نوتات بدرجة تطابق أقل من {floor:.2f}"
+            )
+        return kept
+    
     def _apply_advanced_filters(
-        self, 
-        notes: List[Dict], 
-        filters: Optional[Dict],
+        self,
+        query: str,
+        filters: Dict,
+        k: int,
+        retriever,
+        store,
         debug_info: Optional[RAGDebugInfo]
-    ) -> List[Dict]:
-        """تطبيق فلاتر متقدمة على النوتات"""
-        if not filters:
-            return notes
-        
-        filtered = notes.copy()
+    ) -> List[Hit]:
+        """
+        البحث الدلالي داخل النوتات المطابقة لكل الفلاتر (العائلة، الدور، نمط البخور، الرسمية، الشدة):
+        الفلترة داخل بحث FAISS فتعود k نتيجة بمرور واحد. إذا لم تطابق الفلاتر المتقدمة أي نوتة
+        تُستخدم أفضل 3 نتائج بفلاتر العائلة والدور فقط
+        """
+        hits = retriever.hybrid_hits(query, filters, k)
+        advanced = [key for key in ADVANCED_FILTERS if filters.get(key) not in (None, '')]
         
-        if 'incense_style' in filters and filters['incense_style']:
-            target_style = filters['incense_style'].lower()
-            before_count = len(filtered)
-            filtered = [
-                n for n in filtered 
-                if target_style in n.get('incense_style', 'clean').lower()
-            ]
-            if debug_info and before_count != len(filtered):
+        if debug_info:
+            rows = store.select(filters)
+            if rows is not None and len(rows) < len(store):
                 debug_info.exclusion_reasons.append(
-                    f"تم استبعاد {before_count - len(filtered)} نوتات بسبب عدم تطابق نمط البخور"
+                    f"تم استبعاد {len(store) - len(rows)} نوتات قبل البحث بسبب الفلاتر "
+                    f"({', '.join(key for key, value in filters.items() if value not in (None, ''))})"
                 )
         
-        if 'min_formality' in filters:
-            min_score = filters['min_formality']
-            before_count = len(filtered)
-            filtered = [
-                n for n in filtered 
-                if n.get('formality_score', 5) >= min_score
-            ]
-            if debug_info and before_count != len(filtered):
-                debug_info.exclusion_reasons.append(
-                    f"تم استبعاد {before_count - len(filtered)} نوتات بسبب درجة الرسمية"
-                )
+        if hits or not advanced:
+            return hits
         
-        if 'max_intensity' in filters:
-            max_weight = filters['max_intensity']
-            before_count = len(filtered)
-            filtered = [
-                n for n in filtered 
-                if n.get('intensity_weight', 5) <= max_weight
-            ]
-            if debug_info and before_count != len(filtered):
-                debug_info.exclusion_reasons.append(
-                    f"تم استبعاد {before_count - len(filtered)} نوتات بسبب شدة العطر"
-                )
+        basic = {key: filters.get(key) for key in ('family', 'role')}
+        hits = retriever.hybrid_hits(query, basic, k)[:3]
+        if debug_info and hits:
+            debug_info.exclusion_reasons.append(
+                f"لا توجد نوتات تطابق ({', '.join(advanced)})، استخدام أفضل {len(hits)} نوتات بدونها"
+            )
+        return hits
+    
+    def build_context(self, notes: List[Dict], module_type: str = 'default') -> str:
+        """
+        توليد سياق RAG الكامل (مع التعليمات الصارمة) لمجموعة نوتات
         
-        return filtered if filtered else notes[:3]
+        يُستخدم أيضاً لإعادة توليد السياق بعدد أقل من النوتات عند قص البرومبت
+        لميزانية التوكنز (النوتات مرتبة حسب درجة التطابق).
+        """
+        config = self.MODULE_CONFIGS.get(module_type, self.MODULE_CONFIGS['default'])
+        context_text = self._generate_context(notes, config)
+        return self.STRICT_PROMPT_TEMPLATE.format(notes_context=context_text)
     
     def _generate_context(self, notes: List[Dict], config: Dict) -> str:
         """توليد نص السياق للحقن في البرومبت"""
@@ -303,15 +494,15 @@ class RAGEngine:
     
     def get_available_notes(self) -> List[str]:
         """الحصول على قائمة النوتات المتاحة"""
-        if not self._retriever or not self._retriever.notes_db:
+        if not self._retriever:
             return []
-        return [n.get('note', '') for n in self._retriever.notes_db]
+        return [name or '' for name in self._retriever.store.column('note')]
     
     def get_available_families(self) -> List[str]:
         """الحصول على قائمة العائلات المتاحة"""
-        if not self._retriever or not self._retriever.notes_db:
+        if not self._retriever:
             return []
-        return list(set(n.get('family', '') for n in self._retriever.notes_db if n.get('family')))
+        return list(set(family for family in self._retriever.store.column('family') if family))
     
     def validate_note_exists(self, note_name: str) -> bool:
         """التحقق من وجود نوتة في قاعدة المعرفة"""
@@ -337,6 +528,11 @@ def get_rag_engine(debug: bool = False) -> RAGEngine:
     return _engine_instance
 
 
+def get_rag_cache_stats() -> Dict:
+    """إحصائيات كاش نتائج RAG للعرض في لوحة الإدارة"""
+    return get_rag_engine().get_cache_stats()
+
+
 def rag_run(
     query: str,
     filters: Optional[Dict] = None,
@@ -1,136 +1,83 @@
-import json
-import os
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from difflib import SequenceMatcher
+from app.notes_store import Note, NotesStore, get_notes_store, top_k_rows
+
+# Shared-attribute weights for recommend_similar_notes: same family > same role > same volatility
+SIMILAR_NOTE_WEIGHTS = {'family': 3, 'role': 2, 'volatility': 1}
 
 class FragranceKnowledgeBase:
     """
     RAG (Retrieval Augmented Generation) system for fragrance notes.
-    Loads and searches a knowledge base of fragrance notes.
+    Searches the process-wide notes store (app/notes_store.py) instead of its own copy.
+    Notes are returned as shared read-only Note records (note['arabic'] works; to_dict() for JSON).
     """
     
-    def __init__(self, kb_path: str = "notes_kb.json"):
-        """Initialize the knowledge base from JSON file"""
-        self.kb_path = kb_path
-        self.notes_db = []
-        self.load_knowledge_base()
+    def __init__(self, store: NotesStore = None):
+        """Initialize the knowledge base over a notes store (the current one by default)"""
+        self.store = store or get_notes_store()
     
-    def load_knowledge_base(self):
-        """Load fragrance notes from the knowledge base JSON file"""
-        try:
-            with open(self.kb_path, 'r', encoding='utf-8') as f:
-                self.notes_db = json.load(f)
-            print(f"✓ تم تحميل قاعدة النوتات: {len(self.notes_db)} نوتة")
-        except FileNotFoundError:
-            print(f"⚠ تنبيه: لم يتم العثور على ملف قاعدة النوتات: {self.kb_path}")
-            self.notes_db = []
-        except json.JSONDecodeError:
-            print(f"⚠ خطأ: فشل تحليل ملف JSON")
-            self.notes_db = []
+    @property
+    def notes_db(self) -> List[Dict]:
+        """All notes in store order"""
+        return self.store.all()
     
     def similarity_score(self, text1: str, text2: str) -> float:
         """Calculate similarity between two strings using SequenceMatcher"""
         return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
     
-    def search_note(self, query: str, threshold: float = 0.3) -> Dict:
+    def search_note(self, query: str, threshold: float = 0.3) -> Optional[Note]:
         """
         Search for a specific fragrance note by name.
-        Returns exact match or best fuzzy match.
+        Returns exact match or best fuzzy match (among the store's trigram name-index candidates,
+        with Arabic-aware normalization).
         """
-        if not self.notes_db:
+        if not len(self.store):
             return None
-        
-        query_lower = query.lower().strip()
-        
-        # Exact match (English or Arabic)
-        for note in self.notes_db:
-            if query_lower == note['note'].lower() or query_lower == note['arabic'].lower():
-                return note
-        
-        # Fuzzy match
-        best_match = None
-        best_score = threshold
-        
-        for note in self.notes_db:
-            # Check against English name
-            score_en = self.similarity_score(query, note['note'])
-            if score_en > best_score:
-                best_score = score_en
-                best_match = note
-            
-            # Check against Arabic name
-            score_ar = self.similarity_score(query, note['arabic'])
-            if score_ar > best_score:
-                best_score = score_ar
-                best_match = note
-        
-        return best_match
+        return self.store.search_name(query, threshold)
     
-    def search_by_family(self, family: str) -> List[Dict]:
+    def search_by_family(self, family: str) -> List[Note]:
         """Search all notes by fragrance family"""
-        if not self.notes_db:
-            return []
-        
-        family_lower = family.lower()
-        results = [note for note in self.notes_db 
-                   if family_lower in note['family'].lower()]
-        return results
+        return self.store.notes_for(self.store.matching('family', family))
     
-    def search_by_role(self, role: str) -> List[Dict]:
+    def search_by_role(self, role: str) -> List[Note]:
         """Search all notes by role (Top, Heart, Base)"""
-        if not self.notes_db:
-            return []
-        
-        role_lower = role.lower()
-        results = [note for note in self.notes_db 
-                   if role_lower in note['role'].lower()]
-        return results
+        return self.store.notes_for(self.store.matching('role', role))
     
-    def search_by_volatility(self, volatility: str) -> List[Dict]:
+    def search_by_volatility(self, volatility: str) -> List[Note]:
         """Search notes by volatility level"""
-        if not self.notes_db:
-            return []
-        
-        volatility_lower = volatility.lower()
-        results = [note for note in self.notes_db 
-                   if volatility_lower in note['volatility'].lower()]
-        return results
+        return self.store.notes_for(self.store.matching('volatility', volatility))
     
     def search_notes_combination(self, note_list: List[str]) -> Dict:
         """
         Check compatibility between multiple notes.
         Returns compatibility analysis and recommendations.
+        Pairs are looked up in the store's precomputed compatibility graph (app/note_graph.py).
         """
-        if not self.notes_db or not note_list:
+        store = self.store
+        if not len(store) or not note_list:
             return {"compatible": False, "notes_found": []}
         
-        found_notes = []
+        found_ids = []
         for query_note in note_list:
-            note = self.search_note(query_note)
-            if note:
-                found_notes.append(note)
+            note_id = store.search_name_id(query_note)
+            if note_id is not None:
+                found_ids.append(note_id)
         
-        if not found_notes:
+        if not found_ids:
             return {"compatible": False, "notes_found": []}
         
         # Check compatibility
+        graph = store.compatibility
+        found_notes = store.notes_for(found_ids)
         compatible_pairs = 0
         incompatible_pairs = 0
         compatibility_details = []
         
-        for i, note1 in enumerate(found_notes):
-            for note2 in found_notes[i+1:]:
-                # Check if notes work well together
-                note2_english = note2['note'].lower()
-                note2_arabic = note2['arabic'].lower()
+        for i, (id1, note1) in enumerate(zip(found_ids, found_notes)):
+            for id2, note2 in zip(found_ids[i+1:], found_notes[i+1:]):
+                relation = graph.relation(id1, id2)
                 
-                works_well = (note2_english in [n.lower() for n in note1['works_well_with']] or
-                             note2_arabic in note1['works_well_with'])
-                
-                avoid = (note2_english in [n.lower() for n in note1['avoid_with']] or
-                        note2_arabic in note1['avoid_with'])
-                
-                if works_well:
+                if relation > 0:
                     compatible_pairs += 1
                     compatibility_details.append({
                         "note1": note1['arabic'],
@@ -138,7 +85,7 @@ class FragranceKnowledgeBase:
                         "compatibility": "ممتازة",
                         "reason": f"{note1['arabic']} يعمل بشكل جيد مع {note2['arabic']}"
                     })
-                elif avoid:
+                elif relation < 0:
                     incompatible_pairs += 1
                     compatibility_details.append({
                         "note1": note1['arabic'],
@@ -149,12 +96,54 @@ class FragranceKnowledgeBase:
         
         return {
             "compatible": compatible_pairs > incompatible_pairs,
-            "notes_found": found_notes,
+            "notes_found": [note.to_dict() for note in found_notes],
             "compatible_pairs": compatible_pairs,
             "incompatible_pairs": incompatible_pairs,
             "compatibility_details": compatibility_details
         }
     
+    def best_partners(self, note_query: str, limit: int = 5) -> List[Note]:
+        """
+        Notes that pair best with a note (its compatibility-graph partners, mutual first).
+        Used by the oil mixer and blend predictor modules.
+        """
+        note_id = self.store.search_name_id(note_query)
+        if note_id is None:
+            return []
+        graph = self.store.compatibility
+        return self.store.notes_for([partner for partner, _ in graph.partners(note_id, limit)])
+    
+    def get_pairing_context(self, note_queries: List[str], limit: int = 4) -> str:
+        """
+        Knowledge-base pairing facts for a prompt: known compatible / conflicting pairs among
+        the notes, and the best partners of each one.
+        """
+        store = self.store
+        if not len(store) or not note_queries:
+            return ""
+        
+        lines = []
+        combination = self.search_notes_combination(note_queries)
+        for detail in combination.get('compatibility_details', []):
+            lines.append(f"• {detail['note1']} + {detail['note2']}: {detail['compatibility']}")
+        
+        graph = store.compatibility
+        for query in note_queries:
+            note_id = store.search_name_id(query)
+            if note_id is None:
+                continue
+            note = store.get(note_id)
+            partners = store.notes_for([partner for partner, _ in graph.partners(note_id, limit)])
+            avoided = store.notes_for(graph.avoided(note_id)[:limit])
+            if partners:
+                lines.append(f"• أفضل شركاء {note['arabic']}: {', '.join(p['arabic'] for p in partners)}")
+            if avoided:
+                lines.append(f"• تجنب مع {note['arabic']}: {', '.join(p['arabic'] for p in avoided)}")
+        
+        if not lines:
+            return ""
+        return "🔗 التوافق من قاعدة المعرفة:\n" + "\n".join(lines)
+    
     def get_note_context(self, note_query: str) -> str:
         """
         Get detailed context about a fragrance note for RAG injection.
@@ -210,42 +199,23 @@ class FragranceKnowledgeBase:
         
         return combined
     
-    def recommend_similar_notes(self, note_query: str, limit: int = 3) -> List[Dict]:
+    def recommend_similar_notes(self, note_query: str, limit: int = 3) -> List[Note]:
         """
         Recommend notes similar to a given note.
-        Based on family, role, and profile similarity.
+        Based on family, role, and volatility (SIMILAR_NOTE_WEIGHTS), scored for all notes at once
+        from the store's categorical codes.
         """
-        base_note = self.search_note(note_query)
-        if not base_note:
+        store = self.store
+        note_id = store.search_name_id(note_query) if len(store) else None
+        if note_id is None:
             return []
         
-        similar_notes = []
+        scores = store.attribute_scores(note_id, SIMILAR_NOTE_WEIGHTS)
+        # The note itself (and notes with the same name)
+        names = store.codes('note')
+        scores[names == names[store.row_of(note_id)]] = 0
         
-        for note in self.notes_db:
-            if note['note'] == base_note['note']:
-                continue
-            
-            # Score based on shared properties
-            score = 0
-            
-            # Same family = high score
-            if note['family'] == base_note['family']:
-                score += 3
-            
-            # Same role = medium score
-            if note['role'] == base_note['role']:
-                score += 2
-            
-            # Similar volatility = low score
-            if note['volatility'] == base_note['volatility']:
-                score += 1
-            
-            if score > 0:
-                similar_notes.append((note, score))
-        
-        # Sort by score and return top matches
-        similar_notes.sort(key=lambda x: x[1], reverse=True)
-        return [note for note, score in similar_notes[:limit]]
+        return store.notes_for(store.ids_at(top_k_rows(scores, limit)))
     
     def get_prompt_injection(self, note_queries: List[str]) -> str:
         """
@@ -270,7 +240,7 @@ class FragranceKnowledgeBase:
 """
         return injection
     
-    def get_family_recommendations(self, families: List[str]) -> List[Dict]:
+    def get_family_recommendations(self, families: List[str]) -> List[Note]:
         """Get all notes from specified fragrance families"""
         if not families:
             return []
@@ -282,33 +252,25 @@ class FragranceKnowledgeBase:
         
         return results
     
-    def search_best_for(self, use_case: str) -> List[Dict]:
+    def search_best_for(self, use_case: str) -> List[Note]:
         """
         Find notes that are best for a specific use case.
         Use cases: summer, winter, evening, daytime, formal, casual, etc.
         """
-        if not self.notes_db:
-            return []
-        
-        use_case_lower = use_case.lower()
-        results = []
-        
-        for note in self.notes_db:
-            if any(use_case_lower in case.lower() for case in note['best_for']):
-                results.append(note)
-        
-        return results
+        return self.store.notes_for(self.store.matching('best_for', use_case))
 
-# Create a global instance of the knowledge base
+# Global instance of the knowledge base, rebound when the notes store is reloaded
 def get_kb():
-    """Get the singleton knowledge base instance"""
-    if not hasattr(get_kb, '_instance'):
-        get_kb._instance = FragranceKnowledgeBase()
-    return get_kb._instance
+    """Get the knowledge base over the current notes store"""
+    store = get_notes_store()
+    kb = getattr(get_kb, '_instance', None)
+    if kb is None or kb.store is not store:
+        kb = get_kb._instance = FragranceKnowledgeBase(store)
+    return kb
 
 
 # Helper functions for easy access
-def search_fragrance_note(note_name: str) -> Dict:
+def search_fragrance_note(note_name: str) -> Optional[Note]:
     """Search for a fragrance note"""
     kb = get_kb()
     return kb.search_note(note_name)
@@ -332,19 +294,31 @@ def check_note_compatibility(notes: List[str]) -> Dict:
     return kb.search_notes_combination(notes)
 
 
-def get_similar_notes(note_name: str, limit: int = 3) -> List[Dict]:
+def get_best_partners(note_name: str, limit: int = 5) -> List[Note]:
+    """Get the notes that pair best with a note"""
+    kb = get_kb()
+    return kb.best_partners(note_name, limit)
+
+
+def get_pairing_context(notes: List[str], limit: int = 4) -> str:
+    """Get knowledge-base pairing facts for notes, for prompt injection"""
+    kb = get_kb()
+    return kb.get_pairing_context(notes, limit)
+
+
+def get_similar_notes(note_name: str, limit: int = 3) -> List[Note]:
     """Get similar notes recommendations"""
     kb = get_kb()
     return kb.recommend_similar_notes(note_name, limit)
 
 
-def get_notes_by_family(family: str) -> List[Dict]:
+def get_notes_by_family(family: str) -> List[Note]:
     """Get all notes from a specific family"""
     kb = get_kb()
     return kb.search_by_family(family)
 
 
-def get_notes_for_use_case(use_case: str) -> List[Dict]:
+def get_notes_for_use_case(use_case: str) -> List[Note]:
     """Get notes suitable for a specific use case"""
     kb = get_kb()
     return kb.search_best_for(use_case)
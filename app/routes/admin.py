@@ -1,10 +1,15 @@
 import os
 from functools import wraps
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response
 from flask_login import current_user, login_user, logout_user
 from app import db
 from app.models import User, ScentProfile, CustomPerfume, AffiliateProduct, Recommendation, Article, PerfumeNote
-from app.ai_service import generate_article
+from app.ai_service import agenerate_article, is_fallback
+from app.ai_resilience import CircuitOpenError, is_upstream_failure
+from app.streaming import wants_event_stream, iter_generation_events, sse_event, event_stream_response
+from app.jobs import job_handler, enqueue, JobFailed, JobCancelled
+from app.notes_index import sync_notes, remove_notes
+from app.routes.jobs import wants_json, job_accepted
 import json
 from datetime import datetime
 import re
@@ -13,6 +18,8 @@ import threading
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+NO_ARTICLE_ERROR = 'تعذر توليد المقال حالياً، يرجى المحاولة لاحقاً'
+
 def admin_required(f):
     """حماية المسارات الإدارية - يجب أن يكون المستخدم مصرح ومديراً"""
     @wraps(f)
@@ -65,6 +72,64 @@ def dashboard():
     
     return render_template('admin/dashboard.html', stats=stats, recent_users=recent_users, recent_perfumes=recent_perfumes)
 
+@admin_bp.route('/ai-stats')
+@admin_required
+def ai_stats():
+    """إحصائيات طبقة الذكاء الاصطناعي (الكاش، التزامن، مجمع الاتصالات، التوكنز، البرومبت، الـ circuit breaker والـ embedder والفهرس وكاش RAG)"""
+    from app.ai_cache import get_cache_stats
+    from app.ai_resilience import get_breaker_stats
+    from app.ai_client import get_concurrency_stats, get_coalescing_stats, get_token_stats, get_pool_stats
+    from app.prompts import get_prompt_stats
+    from app.notes_retriever import get_retriever
+    from app.rag_engine import get_rag_cache_stats
+    
+    return jsonify({
+        'response_cache': get_cache_stats(),
+        'concurrency': get_concurrency_stats(),
+        'coalescing': get_coalescing_stats(),
+        'http_pool': get_pool_stats(),
+        'tokens': get_token_stats(),
+        'prompts': get_prompt_stats(),
+        'breakers': get_breaker_stats(),
+        'embedder': get_retriever().embedder.get_stats(),
+        'index': get_retriever().get_index_stats(),
+        'rag_cache': get_rag_cache_stats()
+    })
+
+@admin_bp.route('/rag-debug')
+@admin_required
+def rag_debug():
+    """سجلات تصحيح RAG المأخوذة كعينة (الأحدث أولاً): ?since=<seq>&module=<نوع الوحدة>&limit=<عدد>"""
+    from app.rag_debug import get_debug_buffer
+    
+    buffer = get_debug_buffer()
+    records = buffer.records(
+        since=request.args.get('since', 0, type=int),
+        module_type=request.args.get('module') or None,
+        limit=request.args.get('limit', 100, type=int)
+    )
+    return jsonify({'stats': buffer.get_stats(), 'records': records})
+
+@admin_bp.route('/rag-debug/export')
+@admin_required
+def rag_debug_export():
+    """تصدير كل سجلات تصحيح RAG الحالية (JSON Lines)"""
+    from app.rag_debug import get_debug_buffer
+    
+    lines = (json.dumps(record, ensure_ascii=False) + '\n' for record in get_debug_buffer().iter_export())
+    filename = f"rag-debug-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.jsonl"
+    return Response(lines, mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@admin_bp.route('/rag-debug/clear', methods=['POST'])
+@admin_required
+def rag_debug_clear():
+    """تفريغ سجلات تصحيح RAG"""
+    from app.rag_debug import get_debug_buffer
+    
+    get_debug_buffer().clear()
+    return jsonify({'success': True})
+
 @admin_bp.route('/users')
 @admin_required
 def users():
@@ -219,46 +284,102 @@ def create_article():
             flash('يجب إدخال موضوع المقال', 'error')
             return render_template('admin/article_generator.html')
         
-        ai_result = generate_article(topic, keywords, tone)
+        if wants_event_stream():
+            return event_stream_response(_stream_article(topic, keywords, tone))
         
-        if not ai_result.get('success'):
-            flash(f'خطأ في توليد المقال: {ai_result.get("error")}', 'error')
-            return render_template('admin/article_generator.html')
+        # بدون بث: التوليد في طابور المهام الخلفية وإعادة رقم المهمة فوراً
+        job = enqueue('article.generate', {'topic': topic, 'keywords': keywords, 'tone': tone},
+                      user_id=current_user.id)
         
-        base_slug = re.sub(r'[^\w\s-]', '', topic).strip().replace(' ', '-').lower()
-        base_slug = base_slug[:45]
+        if wants_json():
+            return job_accepted(job)
         
-        # التأكد من تفرد الرابط (Slug) عبر إضافة طابع زمني مصغر
-        import time
-        slug = f"{base_slug}-{int(time.time()) % 10000}"
-        
-        import json
-        suggested_services = json.dumps(ai_result.get('suggested_services', []), ensure_ascii=False)
-        
-        article = Article(
-            title_ar=ai_result['title'],
-            slug=slug,
-            content_ar=ai_result['content'],
-            summary_ar=ai_result['summary'],
-            topic=topic,
-            keywords=ai_result['keywords'],
-            suggested_services=suggested_services,
-            is_published=True,
-            published_at=datetime.utcnow(),
-            created_by=current_user.id
-        )
-        
-        db.session.add(article)
-        db.session.commit()
-        
-        # إرسال المقال للفهرسة بشكل غير متزامن
-        threading.Thread(target=ping_indexnow, args=(article,), daemon=True).start()
-        
-        flash('تم إنشاء ونشر المقال بنجاح!', 'success')
+        flash('جاري توليد المقال في الخلفية، سيظهر في قائمة المقالات فور نشره', 'info')
         return redirect(url_for('admin.articles'))
     
     return render_template('admin/article_generator.html')
 
+def _publish_article(topic, ai_result, user_id=None):
+    """حفظ ونشر المقال المولّد ثم إرساله للفهرسة"""
+    base_slug = re.sub(r'[^\w\s-]', '', topic).strip().replace(' ', '-').lower()
+    base_slug = base_slug[:45]
+    
+    # التأكد من تفرد الرابط (Slug) عبر إضافة طابع زمني مصغر
+    import time
+    slug = f"{base_slug}-{int(time.time()) % 10000}"
+    
+    suggested_services = json.dumps(ai_result.get('suggested_services', []), ensure_ascii=False)
+    
+    article = Article(
+        title_ar=ai_result['title'],
+        slug=slug,
+        content_ar=ai_result['content'],
+        summary_ar=ai_result['summary'],
+        topic=topic,
+        keywords=ai_result['keywords'],
+        suggested_services=suggested_services,
+        is_published=True,
+        published_at=datetime.utcnow(),
+        created_by=user_id if user_id is not None else current_user.id
+    )
+    
+    db.session.add(article)
+    db.session.commit()
+    
+    # إرسال المقال للفهرسة بشكل غير متزامن
+    threading.Thread(target=ping_indexnow, args=(article,), daemon=True).start()
+    
+    return article
+
+def _stream_article(topic, keywords, tone):
+    """بث حقول المقال (العنوان، الملخص، المحتوى) فور اكتمالها ثم نشره"""
+    try:
+        for event, data in iter_generation_events(
+            lambda on_field: agenerate_article(topic, keywords, tone, on_field=on_field)
+        ):
+            if event != 'result':
+                yield sse_event(event, data)
+            elif not data.get('success'):
+                yield sse_event('error', {'success': False, 'error': data.get('error')})
+            elif is_fallback(data):
+                yield sse_event('error', {'success': False, 'error': NO_ARTICLE_ERROR})
+            else:
+                _publish_article(topic, data)
+                # الترويسات أُرسلت مع أول حدث، فـ flash لن يصل للجلسة: الرسالة يعرضها المتصفح
+                yield sse_event('result', {
+                    'success': True,
+                    'message': 'تم إنشاء ونشر المقال بنجاح!',
+                    'redirect': url_for('admin.articles')
+                })
+    except Exception as e:
+        yield sse_event('error', {'success': False, 'error': str(e)})
+
+@job_handler('article.generate', max_attempts=2, deadline=120, admin_only=True)
+def _article_job(payload, ctx):
+    """مهمة خلفية: توليد المقال ونشره"""
+    topic = payload.get('topic', '').strip()
+    if not topic:
+        raise JobFailed('يجب إدخال موضوع المقال')
+    
+    try:
+        ai_result = ctx.run(agenerate_article(topic, payload.get('keywords', ''), payload.get('tone', 'إعلامي متوازن'),
+                                              raise_errors=True))
+    except JobCancelled:
+        raise
+    except Exception as e:
+        # أعطال الخدمة المؤقتة (مهلة، اتصال، 5xx، 429، breaker مفتوح) تُعاد محاولتها
+        if is_upstream_failure(e) or isinstance(e, CircuitOpenError):
+            raise
+        raise JobFailed(f'{NO_ARTICLE_ERROR}: {e}')
+    if not ai_result.get('success'):
+        raise JobFailed(f'خطأ في توليد المقال: {ai_result.get("error")}')
+    if is_fallback(ai_result):
+        raise JobFailed(NO_ARTICLE_ERROR)
+    
+    ctx.check_cancelled()
+    article = _publish_article(topic, ai_result, user_id=ctx.user_id)
+    return {'article_id': article.id, 'slug': article.slug, 'title': article.title_ar}
+
 @admin_bp.route('/articles/edit/<int:id>', methods=['GET', 'POST'])
 @admin_required
 def edit_article(id):
@@ -394,6 +515,30 @@ def parse_list_input(value):
     return json.dumps(items, ensure_ascii=False)
 
 
+def _run_index_update(update, items):
+    """
+    تحديث الفهرس بعد حفظ قاعدة البيانات (sync_notes أو remove_notes)
+
+    الفشل (قفل السجل، I/O) لا يلغي الحفظ: يُسجل ويُعاد نص الخطأ (None عند النجاح)
+    """
+    try:
+        result = update(items)
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    if result.get('success'):
+        return None
+    print(f"⚠ تعذر تحديث الفهرس بعد الحفظ: {result.get('error')}")
+    return result.get('error') or 'خطأ غير معروف'
+
+
+def _update_index(update, items):
+    """_run_index_update مع إبلاغ المدير بإعادة بناء الفهرس عند الفشل"""
+    error = _run_index_update(update, items)
+    if error:
+        flash(f'تم الحفظ في قاعدة البيانات لكن تعذر تحديث الفهرس ({error})، '
+              'يرجى إعادة بناء الفهرس', 'warning')
+
+
 @admin_bp.route('/notes/add', methods=['GET', 'POST'])
 @admin_required
 def add_note():
@@ -416,6 +561,7 @@ def add_note():
             )
             db.session.add(note)
             db.session.commit()
+            _update_index(sync_notes, [note])
             flash(f'تم إضافة النوتة "{note.name_en}" بنجاح', 'success')
             return redirect(url_for('admin.notes'))
         except Exception as e:
@@ -447,6 +593,7 @@ def edit_note(id):
             note.is_active = 'is_active' in request.form
             
             db.session.commit()
+            _update_index(sync_notes, [note])
             flash(f'تم تحديث النوتة "{note.name_en}" بنجاح', 'success')
             return redirect(url_for('admin.notes'))
         except Exception as e:
@@ -463,6 +610,7 @@ def toggle_note(id):
     note = PerfumeNote.query.get_or_404(id)
     note.is_active = not note.is_active
     db.session.commit()
+    _update_index(sync_notes, [note])
     
     status = 'تفعيل' if note.is_active else 'تعطيل'
     flash(f'تم {status} النوتة "{note.name_en}"', 'success')
@@ -477,6 +625,7 @@ def delete_note(id):
     name = note.name_en
     db.session.delete(note)
     db.session.commit()
+    _update_index(remove_notes, [id])
     
     flash(f'تم حذف النوتة "{name}" بنجاح', 'success')
     return redirect(url_for('admin.notes'))
@@ -501,6 +650,22 @@ def rebuild_rag_index():
     return redirect(url_for('admin.notes'))
 
 
+@admin_bp.route('/notes/compact-index', methods=['POST'])
+@admin_required
+def compact_rag_index():
+    """دمج سجل التعديلات التدريجية في ملفات الفهرس (بدون إعادة بناء من قاعدة البيانات)"""
+    from app.notes_index import compact
+    
+    result = compact()
+    
+    if result['success']:
+        flash(f'تم ضغط سجل الفهرس ({result["ops"]} تعديل، {result["notes_count"]} نوتة)', 'success')
+    else:
+        flash(f'خطأ في ضغط سجل الفهرس: {result["error"]}', 'error')
+    
+    return redirect(url_for('admin.notes'))
+
+
 @admin_bp.route('/notes/migrate-json', methods=['POST'])
 @admin_required
 def migrate_notes_from_json():
@@ -511,7 +676,7 @@ def migrate_notes_from_json():
         with open('notes_kb.json', 'r', encoding='utf-8') as f:
             notes_data = json.load(f)
         
-        imported = 0
+        imported = []
         skipped = 0
         
         for note_data in notes_data:
@@ -535,10 +700,11 @@ def migrate_notes_from_json():
                 is_active=True
             )
             db.session.add(note)
-            imported += 1
+            imported.append(note)
         
         db.session.commit()
-        flash(f'تم استيراد {imported} نوتة بنجاح ({skipped} موجودة مسبقاً)', 'success')
+        _update_index(sync_notes, imported)
+        flash(f'تم استيراد {len(imported)} نوتة بنجاح ({skipped} موجودة مسبقاً)', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'خطأ في الاستيراد: {str(e)}', 'error')
@@ -549,30 +715,55 @@ def migrate_notes_from_json():
 @admin_bp.route('/notes/bulk-import', methods=['POST'])
 @admin_required
 def bulk_import_notes():
-    """استيراد نوتات متعددة من حقل نصي مع تحليل AI تلقائي وكشف التشابه"""
-    from app.ai_service import analyze_perfume_notes_bulk_import, find_similar_notes
-    
+    """استيراد نوتات متعددة من حقل نصي مع تحليل AI تلقائي وكشف التشابه (كمهمة خلفية)"""
     notes_text = request.form.get('notes_text', '').strip()
     
     if not notes_text:
+        if wants_json():
+            return jsonify({'success': False, 'error': 'يجب إدخال نص يحتوي على النوتات'}), 400
         flash('يجب إدخال نص يحتوي على النوتات', 'error')
         return redirect(url_for('admin.notes'))
     
-    # تحليل النص باستخدام AI
-    analysis = analyze_perfume_notes_bulk_import(notes_text)
+    job = enqueue('notes.bulk_import', {'notes_text': notes_text}, user_id=current_user.id)
+    
+    if wants_json():
+        return job_accepted(job)
     
+    flash('جاري تحليل واستيراد النوتات في الخلفية، حدّث الصفحة بعد قليل', 'info')
+    return redirect(url_for('admin.notes'))
+
+
+@job_handler('notes.bulk_import', max_attempts=2, deadline=300, admin_only=True)
+def _bulk_import_job(payload, ctx):
+    """مهمة خلفية: تحليل النص باستخدام AI ثم استيراد النوتات مع كشف التشابه"""
+    from app.ai_service import aanalyze_perfume_notes_bulk_import
+    
+    notes_text = payload.get('notes_text', '').strip()
+    if not notes_text:
+        raise JobFailed('يجب إدخال نص يحتوي على النوتات')
+    
+    analysis = ctx.run(aanalyze_perfume_notes_bulk_import(notes_text, on_progress=ctx.set_progress))
     if not analysis['success']:
-        flash(f'خطأ في التحليل: {analysis.get("error", "حدث خطأ غير معروف")}', 'error')
-        return redirect(url_for('admin.notes'))
+        raise JobFailed(f'خطأ في التحليل: {analysis.get("error", "حدث خطأ غير معروف")}')
+    
+    ctx.check_cancelled()
+    stats = _import_notes(analysis.get('notes', []))
+    stats['chunks'] = analysis.get('chunks')
+    stats['message'] = _import_summary(stats)
+    return stats
+
+
+def _import_notes(notes):
+    """إضافة النوتات المحللة مع تخطي المكررة والمتشابهة (fuzzy matching)"""
+    from app.ai_service import find_similar_notes
     
-    # استيراد النوتات مع كشف التشابه
-    imported = 0
+    imported = []
     skipped = 0
     similar_skipped = []
     exact_duplicates = []
     
     try:
-        for note_data in analysis.get('notes', []):
+        for note_data in notes:
             note_name = note_data.get('name_en', '').strip()
             
             # التحقق من exact match
@@ -630,27 +821,47 @@ def bulk_import_notes():
                 is_active=True
             )
             db.session.add(new_note)
-            imported += 1
+            imported.append(new_note)
         
         db.session.commit()
-        
-        # رسالة النجاح مع التفاصيل
-        msg = f'✅ تم استيراد {imported} نوتة بنجاح'
-        
-        if exact_duplicates:
-            msg += f'\n\n⚠️ تم تخطي {len(exact_duplicates)} نوتة موجودة بالفعل:\n' + '\n'.join(exact_duplicates[:5])
-            if len(exact_duplicates) > 5:
-                msg += f'\n... و {len(exact_duplicates) - 5} أخرى'
-        
-        if similar_skipped:
-            msg += f'\n\n🔍 تم تخطي {len(similar_skipped)} نوتة متشابهة:\n' + '\n'.join(similar_skipped[:5])
-            if len(similar_skipped) > 5:
-                msg += f'\n... و {len(similar_skipped) - 5} أخرى'
-        
-        flash(msg, 'success')
-        
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        flash(f'خطأ في الاستيراد: {str(e)}', 'error')
+        raise
     
-    return redirect(url_for('admin.notes'))
+    index_error = _run_index_update(sync_notes, imported)
+    
+    return {
+        'imported': len(imported),
+        'skipped': skipped,
+        'exact_duplicates': exact_duplicates,
+        'similar_skipped': similar_skipped,
+        'index_error': index_error
+    }
+
+
+def _import_summary(stats):
+    """رسالة النجاح مع التفاصيل"""
+    imported = stats['imported']
+    exact_duplicates = stats['exact_duplicates']
+    similar_skipped = stats['similar_skipped']
+    
+    msg = f'✅ تم استيراد {imported} نوتة بنجاح'
+    
+    if exact_duplicates:
+        msg += f'\n\n⚠️ تم تخطي {len(exact_duplicates)} نوتة موجودة بالفعل:\n' + '\n'.join(exact_duplicates[:5])
+        if len(exact_duplicates) > 5:
+            msg += f'\n... و {len(exact_duplicates) - 5} أخرى'
+    
+    if similar_skipped:
+        msg += f'\n\n🔍 تم تخطي {len(similar_skipped)} نوتة متشابهة:\n' + '\n'.join(similar_skipped[:5])
+        if len(similar_skipped) > 5:
+            msg += f'\n... و {len(similar_skipped) - 5} أخرى'
+    
+    chunks = stats.get('chunks') or {}
+    if chunks.get('failed'):
+        msg += f'\n\n❌ فشل تحليل {chunks["failed"]} من {chunks["total"]} أجزاء من النص، يمكن إعادة إرسالها:\n' + '\n'.join(chunks['errors'][:3])
+    
+    if stats.get('index_error'):
+        msg += f'\n\n⚠️ تم الحفظ في قاعدة البيانات لكن تعذر تحديث الفهرس ({stats["index_error"]})، يرجى إعادة بناء الفهرس'
+    
+    return msg
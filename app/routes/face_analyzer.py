@@ -1,10 +1,16 @@
 from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
 from app import db
-from app.ai_service import analyze_face_for_perfume, save_analysis_result
+from app.ai_service import aanalyze_face_for_perfume, save_analysis_result, is_fallback
+from app.ai_resilience import CircuitOpenError, is_upstream_failure
+from app.streaming import wants_event_stream, iter_generation_events, sse_event, event_stream_response
+from app.jobs import job_handler, enqueue, JobFailed, JobCancelled
+from app.routes.jobs import job_accepted
 
 face_analyzer_bp = Blueprint('face_analyzer', __name__, url_prefix='/face-analyzer')
 
+NO_ANALYSIS_ERROR = 'تعذر تحليل الصورة حالياً، يرجى المحاولة لاحقاً'
+
 @face_analyzer_bp.route('/form')
 @login_required
 def form():
@@ -23,23 +29,56 @@ def analyze():
             'error': 'لم يتم توفير صورة للتحليل'
         }), 400
     
+    if wants_event_stream():
+        return event_stream_response(_stream_analysis(image_data))
+    
+    # بدون بث: التحليل في طابور المهام الخلفية وإعادة رقم المهمة فوراً
+    job = enqueue('face.analyze', {'image_data': image_data}, user_id=current_user.id)
+    return job_accepted(job)
+
+
+def _stream_analysis(image_data):
+    """بث أقسام التحليل فور اكتمالها ثم النتيجة النهائية"""
     try:
-        analysis = analyze_face_for_perfume(image_data)
-        
-        if 'error' in analysis:
-            return jsonify({
-                'success': False,
-                'error': analysis['error']
-            }), 500
-        
-        save_analysis_result('face_analyzer', {'image_provided': True}, analysis)
-        
-        return jsonify({
-            'success': True,
-            'analysis': analysis
-        })
+        for event, data in iter_generation_events(
+            lambda on_field: aanalyze_face_for_perfume(image_data, on_field=on_field)
+        ):
+            if event == 'result':
+                if 'error' in data:
+                    yield sse_event('error', {'success': False, 'error': data['error']})
+                    return
+                if is_fallback(data):
+                    yield sse_event('error', {'success': False, 'error': NO_ANALYSIS_ERROR})
+                    return
+                save_analysis_result('face_analyzer', {'image_provided': True}, data)
+                yield sse_event('result', {'success': True, 'analysis': data})
+            else:
+                yield sse_event(event, data)
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        yield sse_event('error', {'success': False, 'error': str(e)})
+
+
+@job_handler('face.analyze', max_attempts=2, deadline=40, keep_payload=False)
+def _analysis_job(payload, ctx):
+    """مهمة خلفية: تحليل الصورة وحفظ النتيجة (تُحذف الصورة من الجدول بعد الانتهاء)"""
+    image_data = payload.get('image_data', '')
+    if not image_data:
+        raise JobFailed('لم يتم توفير صورة للتحليل')
+    
+    try:
+        analysis = ctx.run(aanalyze_face_for_perfume(image_data, raise_errors=True))
+    except JobCancelled:
+        raise
+    except Exception as e:
+        # أعطال الخدمة المؤقتة (مهلة، اتصال، 5xx، 429، breaker مفتوح) تُعاد محاولتها
+        if is_upstream_failure(e) or isinstance(e, CircuitOpenError):
+            raise
+        raise JobFailed(f'{NO_ANALYSIS_ERROR}: {e}')
+    if 'error' in analysis:
+        raise JobFailed(analysis['error'])
+    if is_fallback(analysis):
+        raise JobFailed(NO_ANALYSIS_ERROR)
+    
+    ctx.check_cancelled()
+    save_analysis_result('face_analyzer', {'image_provided': True}, analysis, user_id=ctx.user_id)
+    return {'analysis': analysis}
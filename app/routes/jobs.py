@@ -0,0 +1,120 @@
+from flask import Blueprint, request, jsonify, url_for
+from flask_login import login_required, current_user
+from app import jobs
+from app.models import Job
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+
+def wants_json():
+    """طلب من JavaScript (fetch) يتوقع JSON بدلاً من إعادة توجيه"""
+    return (request.is_json
+            or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+            or request.accept_mimetypes.best == 'application/json')
+
+
+def job_accepted(job):
+    """رد 202 موحّد بعد إضافة مهمة: المعرف وروابط الحالة والنتيجة"""
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('jobs.status', job_id=job.id),
+        'result_url': url_for('jobs.result', job_id=job.id),
+        'cancel_url': url_for('jobs.cancel', job_id=job.id)
+    }), 202
+
+
+def _get_owned_job(job_id):
+    """المهمة لصاحبها أو للمدير فقط"""
+    job = Job.query.get(job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin):
+        return None
+    return job
+
+
+def _not_found():
+    return jsonify({'success': False, 'error': 'المهمة غير موجودة'}), 404
+
+
+@jobs_bp.route('/<kind>', methods=['POST'])
+@login_required
+def enqueue(kind):
+    handler = jobs.get_handler(kind)
+    if handler is None:
+        return jsonify({'success': False, 'error': f'نوع مهمة غير معروف: {kind}'}), 404
+
+    if handler.admin_only and not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'هذه المهمة للمدير فقط'}), 403
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'success': False, 'error': 'يجب إرسال بيانات المهمة بصيغة JSON'}), 400
+
+    job = jobs.enqueue(kind, payload, user_id=current_user.id)
+    return job_accepted(job)
+
+
+@jobs_bp.route('', methods=['GET'])
+@login_required
+def list_jobs():
+    recent = (Job.query
+              .filter_by(user_id=current_user.id)
+              .order_by(Job.created_at.desc())
+              .limit(20)
+              .all())
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in recent]})
+
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@login_required
+def status(job_id):
+    job = _get_owned_job(job_id)
+    if job is None:
+        return _not_found()
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+@login_required
+def result(job_id):
+    """200 مع النتيجة عند النجاح، 202 أثناء الانتظار أو التنفيذ، و success=False عند الفشل أو الإلغاء"""
+    job = _get_owned_job(job_id)
+    if job is None:
+        return _not_found()
+
+    if not job.is_finished:
+        return jsonify({'success': True, 'done': False, 'job': job.to_dict()}), 202
+
+    if job.status != Job.SUCCEEDED:
+        error = 'تم إلغاء المهمة' if job.status == Job.CANCELLED else (job.error or 'فشلت المهمة')
+        return jsonify({'success': False, 'done': True, 'error': error, 'job': job.to_dict()})
+
+    data = job.to_dict(include_result=True)
+    return jsonify({'success': True, 'done': True, 'result': data.pop('result'), 'job': data})
+
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel(job_id):
+    job = _get_owned_job(job_id)
+    if job is None:
+        return _not_found()
+
+    if not jobs.cancel(job):
+        return jsonify({'success': False, 'error': 'المهمة منتهية بالفعل', 'job': job.to_dict()}), 409
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@jobs_bp.route('/<job_id>/retry', methods=['POST'])
+@login_required
+def retry(job_id):
+    job = _get_owned_job(job_id)
+    if job is None:
+        return _not_found()
+
+    if job.payload is None:
+        return jsonify({'success': False, 'error': 'لم تعد بيانات المهمة محفوظة، يرجى إعادة الإرسال'}), 409
+    if not jobs.retry(job):
+        return jsonify({'success': False, 'error': 'يمكن إعادة المهام الفاشلة أو الملغاة فقط', 'job': job.to_dict()}), 409
+    return job_accepted(job)
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
 from app import db
 from app.ai_service import get_ai_response, save_analysis_result
+from app.rag_service import get_pairing_context
 
 oil_mixer_bp = Blueprint('oil_mixer', __name__, url_prefix='/oil-mixer')
 
@@ -17,11 +18,15 @@ def mix():
     
     selected_notes = data.get('notes', [])
     target_layer = data.get('target', 'قلب')
+    # أزواج التوافق/التعارض وأفضل شركاء كل نوتة من رسم التوافق في قاعدة المعرفة
+    pairing_context = get_pairing_context(selected_notes)
     
     prompt = f"""أنت خبير في مزج النوتات العطرية. امزج:
     - النوتات المختارة: {', '.join(selected_notes)}
     - الهدف: {target_layer}
     
+    {pairing_context}
+    
     أنشئ أكورداً عطرياً متناسقاً."""
     
     default_analysis = {
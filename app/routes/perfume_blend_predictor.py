@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required
 from app.ai_service import get_ai_response, save_analysis_result
+from app.rag_service import get_best_partners
 
 perfume_blend_bp = Blueprint('perfume_blend', __name__, url_prefix='/perfume-blend-predictor')
 
@@ -189,6 +190,19 @@ def predict():
     except:
         prediction = default_prediction
     
+    # أفضل شركاء النوتات المهيمنة في الخليط من رسم التوافق في قاعدة المعرفة
+    # (رد النموذج قد يضع expected_result أو dominant_notes بشكل آخر غير dict وقائمة نصوص)
+    expected_result = prediction.get('expected_result')
+    dominant_notes = expected_result.get('dominant_notes') if isinstance(expected_result, dict) else None
+    suggested_partners = {}
+    for note in dominant_notes if isinstance(dominant_notes, list) else []:
+        if not isinstance(note, str):
+            continue
+        partners = get_best_partners(note, 3)
+        if partners:
+            suggested_partners[note] = [partner['arabic'] for partner in partners]
+    prediction['suggested_partners'] = suggested_partners
+    
     save_analysis_result('perfume_blend', data, prediction)
     
     return jsonify({
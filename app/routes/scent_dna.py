@@ -4,60 +4,84 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import current_user
 from app import db
 from app.models import ScentProfile
-from app.ai_service import generate_scent_dna_analysis
+from app.ai_service import generate_scent_dna_analysis, agenerate_scent_dna_analysis
+from app.streaming import wants_event_stream, iter_generation_events, sse_event, event_stream_response
 
 scent_dna_bp = Blueprint('scent_dna', __name__)
 
 @scent_dna_bp.route('/scent-dna', methods=['GET', 'POST'])
 def form():
     if request.method == 'POST':
-        gender = request.form.get('gender', '')
-        age_range = request.form.get('age_range', '')
-        personality_type = request.form.get('personality_type', '')
         favorite_notes = request.form.getlist('favorite_notes')
         disliked_notes = request.form.getlist('disliked_notes')
-        climate = request.form.get('climate', '')
-        skin_type = request.form.get('skin_type', '')
         
         profile_data = {
-            'gender': gender,
-            'age_range': age_range,
-            'personality_type': personality_type,
+            'gender': request.form.get('gender', ''),
+            'age_range': request.form.get('age_range', ''),
+            'personality_type': request.form.get('personality_type', ''),
             'favorite_notes': ', '.join(favorite_notes),
             'disliked_notes': ', '.join(disliked_notes),
-            'climate': climate,
-            'skin_type': skin_type
+            'climate': request.form.get('climate', ''),
+            'skin_type': request.form.get('skin_type', '')
         }
         
-        ai_result = generate_scent_dna_analysis(profile_data)
-        
-        session_id = session.get('session_id')
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            session['session_id'] = session_id
+        if wants_event_stream():
+            return event_stream_response(_stream_analysis(profile_data))
         
-        scent_profile = ScentProfile(
-            user_id=current_user.id if current_user.is_authenticated else None,
-            session_id=session_id,
-            gender=gender,
-            age_range=age_range,
-            personality_type=personality_type,
-            favorite_notes=', '.join(favorite_notes),
-            disliked_notes=', '.join(disliked_notes),
-            climate=climate,
-            skin_type=skin_type,
-            scent_personality=ai_result.get('scent_personality', ''),
-            ai_analysis=json.dumps(ai_result, ensure_ascii=False)
-        )
-        
-        db.session.add(scent_profile)
-        db.session.commit()
+        ai_result = generate_scent_dna_analysis(profile_data)
+        scent_profile = _save_profile(profile_data, ai_result)
         
         flash('تم تحليل بصمتك العطرية بنجاح!', 'success')
         return redirect(url_for('scent_dna.result', id=scent_profile.id))
     
     return render_template('scent_dna/form.html')
 
+
+def _save_profile(profile_data, ai_result):
+    """حفظ نتيجة التحليل كـ ScentProfile للمستخدم أو الجلسة الحالية"""
+    session_id = session.get('session_id')
+    if not session_id:
+        session_id = str(uuid.uuid4())
+        session['session_id'] = session_id
+    
+    scent_profile = ScentProfile(
+        user_id=current_user.id if current_user.is_authenticated else None,
+        session_id=session_id,
+        gender=profile_data['gender'],
+        age_range=profile_data['age_range'],
+        personality_type=profile_data['personality_type'],
+        favorite_notes=profile_data['favorite_notes'],
+        disliked_notes=profile_data['disliked_notes'],
+        climate=profile_data['climate'],
+        skin_type=profile_data['skin_type'],
+        scent_personality=ai_result.get('scent_personality', ''),
+        ai_analysis=json.dumps(ai_result, ensure_ascii=False)
+    )
+    
+    db.session.add(scent_profile)
+    db.session.commit()
+    
+    return scent_profile
+
+
+def _stream_analysis(profile_data):
+    """بث حقول التحليل فور اكتمالها ثم رابط صفحة النتيجة"""
+    try:
+        for event, data in iter_generation_events(
+            lambda on_field: agenerate_scent_dna_analysis(profile_data, on_field=on_field)
+        ):
+            if event == 'result':
+                scent_profile = _save_profile(profile_data, data)
+                # بدون flash: الترويسات أُرسلت مع أول حدث، وصفحة النتيجة تعرض التحليل مباشرة
+                yield sse_event('result', {
+                    'success': True,
+                    'redirect': url_for('scent_dna.result', id=scent_profile.id)
+                })
+            else:
+                yield sse_event(event, data)
+    except Exception as e:
+        yield sse_event('error', {'success': False, 'error': str(e)})
+
 @scent_dna_bp.route('/scent-dna/result/<int:id>')
 def result(id):
     scent_profile = ScentProfile.query.get_or_404(id)
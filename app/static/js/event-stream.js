@@ -0,0 +1,35 @@
+/**
+ * قراءة استجابة Server-Sent Events من fetch (يدعم POST على عكس EventSource)
+ * onEvent(eventName, data) يُستدعى لكل حدث فور وصوله
+ * أحداث التوليد: field لكل حقل مكتمل، reset لإزالة الحقول المعروضة (محاولة بديلة)،
+ * result للنتيجة النهائية، error عند الفشل
+ */
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            const dataLines = [];
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+            });
+
+            if (dataLines.length) {
+                onEvent(eventName, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+}
@@ -0,0 +1,24 @@
+/**
+ * انتظار مهمة خلفية من /jobs حتى تنتهي
+ * job: رد 202 من المسار (job_id, result_url, cancel_url)
+ * يعيد النتيجة عند النجاح ويرفع Error عند الفشل أو الإلغاء
+ */
+async function waitForJob(job, { interval = 2000, onStatus = null } = {}) {
+    while (true) {
+        const response = await fetch(job.result_url, { headers: { 'Accept': 'application/json' } });
+        const data = await response.json();
+
+        if (onStatus) onStatus(data.job);
+        if (data.done) {
+            if (!data.success) throw new Error(data.error);
+            return data.result;
+        }
+
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
+
+/** طلب إلغاء مهمة (الإلغاء يتم عند أقرب نقطة آمنة في التنفيذ) */
+function cancelJob(job) {
+    return fetch(job.cancel_url, { method: 'POST', headers: { 'Accept': 'application/json' } });
+}
@@ -0,0 +1,73 @@
+"""
+Streaming - بث نتائج الذكاء الاصطناعي للمتصفح عبر Server-Sent Events
+يربط الدوال غير المتزامنة في ai_service (عبر on_field) بمسارات Flask
+"""
+
+import json
+import queue
+from typing import Callable, Iterator, Tuple
+
+from flask import Response, request, stream_with_context
+
+from app.ai_client import submit
+
+
+def wants_event_stream() -> bool:
+    """هل طلب المتصفح البث (Accept: text/event-stream أو ?stream=1)"""
+    return ('text/event-stream' in request.headers.get('Accept', '')
+            or request.args.get('stream') == '1')
+
+
+def sse_event(event: str, data) -> str:
+    """تنسيق حدث SSE واحد"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def iter_generation_events(coro_factory: Callable) -> Iterator[Tuple[str, object]]:
+    """
+    تشغيل دالة توليد غير متزامنة على حلقة أحداث AI وإرجاع أحداثها بالترتيب
+
+    coro_factory تستقبل on_field وتعيد coroutine (مثل
+    lambda on_field: agenerate_article(topic, keywords, tone, on_field=on_field)).
+
+    on_field.reset() تُبلغ المتصفح بإهمال الحقول المعروضة (محاولة بديلة ستبث حقولاً أخرى).
+
+    Yields:
+        ('field', {'key': ..., 'value': ...}) لكل حقل مكتمل، و ('reset', {}) عند إهمال
+        الحقول السابقة، ثم ('result', النتيجة النهائية)
+    """
+    events = queue.Queue()
+
+    def on_field(key, value):
+        events.put(('field', {'key': key, 'value': value}))
+
+    on_field.reset = lambda: events.put(('reset', {}))
+
+    future = submit(coro_factory(on_field))
+    future.add_done_callback(lambda _: events.put(None))
+
+    try:
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield event
+
+        yield 'result', future.result()
+    finally:
+        # إغلاق الاتصال من المتصفح قبل الانتهاء يلغي الطلب الجاري
+        if not future.done():
+            future.cancel()
+
+
+def event_stream_response(events: Iterator[str]) -> Response:
+    """استجابة Flask لبث أحداث SSE مع الحفاظ على سياق الطلب"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
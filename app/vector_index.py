@@ -0,0 +1,267 @@
+"""
+Vector Index - إنشاء فهارس FAISS للنوتات وتحويل نتائجها إلى درجات تطابق معايرة
+
+المتجهات مطبّعة (انظر app/embeddings.py)، لذلك الفهارس تستخدم inner product
+(= cosine) بدلاً من IndexFlatL2 وتحويل 1/(1+d):
+- flat: IndexFlatIP، بحث دقيق (حتى HNSW_MIN_VECTORS متجه)
+- hnsw: IndexHNSWFlat، بحث تقريبي سريع للمجموعات المتوسطة
+- ivfpq: IndexIVFPQ مع إعادة ترتيب بـ SQ8 (IndexRefine)، ذاكرة أقل بحوالي 3.5x
+  للمجموعات الكبيرة جداً (IVFPQ_MIN_VECTORS فأكثر)
+
+FAISS_INDEX_TYPE=auto يختار حسب عدد المتجهات، و read_index يفتح الفهرس بـ mmap
+(FAISS_MMAP) فتتشارك الـ workers صفحات الملف بدلاً من نسخة خاصة لكل عملية. search(ids=...)
+يبحث داخل مجموعة معرفات فقط (IDSelector داخل FAISS) فيعيد k نتيجة مطابقة للفلاتر. ScoreCalibration تحوّل cosine
+إلى درجة 0-1 نسبة إلى تشابه أزواج عشوائية من نفس المجموعة (الخلفية)، فتصبح
+الدرجات قابلة للمقارنة بين embedders وأحجام مختلفة وصالحة لحد أدنى للتطابق.
+"""
+
+import os
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+FAISS_INDEX_TYPE = os.environ.get('FAISS_INDEX_TYPE', 'auto')
+HNSW_MIN_VECTORS = int(os.environ.get('FAISS_HNSW_MIN_VECTORS', 50000))
+IVFPQ_MIN_VECTORS = int(os.environ.get('FAISS_IVFPQ_MIN_VECTORS', 1000000))
+HNSW_M = int(os.environ.get('FAISS_HNSW_M', 32))
+HNSW_EF_CONSTRUCTION = int(os.environ.get('FAISS_HNSW_EF_CONSTRUCTION', 80))
+HNSW_EF_SEARCH = int(os.environ.get('FAISS_HNSW_EF_SEARCH', 64))
+IVF_NPROBE = int(os.environ.get('FAISS_IVF_NPROBE', 16))
+IVF_REFINE_FACTOR = int(os.environ.get('FAISS_IVF_REFINE_FACTOR', 30))
+FAISS_MMAP = os.environ.get('FAISS_MMAP', '1') != '0'
+# بحث مفلتر في hnsw/ivfpq: حتى هذا العدد من المعرفات تُقارن متجهاتها مباشرة (دقيق)
+FILTER_EXACT_MAX = int(os.environ.get('FAISS_FILTER_EXACT_MAX', 2048))
+PQ_SUBVECTOR_DIM = 8
+# أقل عدد متجهات لتدريب PQ بـ 8 bits (256 مركز × 39 نقطة)، أقل من ذلك يُستخدم flat
+PQ_MIN_TRAIN = 256 * 39
+
+INDEX_TYPES = ('flat', 'hnsw', 'ivfpq')
+
+
+def choose_index_type(n: int, index_type: Optional[str] = None) -> str:
+    """نوع الفهرس حسب الإعداد (FAISS_INDEX_TYPE) أو حجم المجموعة إذا كان auto"""
+    index_type = index_type or FAISS_INDEX_TYPE
+    if index_type != 'auto':
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"نوع فهرس غير معروف: {index_type} (المتاح: auto, {', '.join(INDEX_TYPES)})")
+        return 'flat' if index_type == 'ivfpq' and n < PQ_MIN_TRAIN else index_type
+    if n >= IVFPQ_MIN_VECTORS:
+        return 'ivfpq'
+    if n >= HNSW_MIN_VECTORS:
+        return 'hnsw'
+    return 'flat'
+
+
+def build_index(vectors: np.ndarray, index_type: Optional[str] = None,
+                ids: Optional[np.ndarray] = None) -> faiss.Index:
+    """
+    بناء فهرس inner product للمتجهات المطبّعة (n × dim float32)
+
+    Args:
+        vectors: المتجهات بنفس ترتيب النوتات
+        index_type: flat / hnsw / ivfpq / auto (FAISS_INDEX_TYPE افتراضياً)
+        ids: معرفات المتجهات (PerfumeNote.id) في IndexIDMap2 لتحديثها لاحقاً بشكل منفرد،
+             بدونها المعرف = رقم الصف
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    index_type = choose_index_type(n, index_type)
+
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == 'ivfpq':
+        nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))
+        subquantizers = dim // PQ_SUBVECTOR_DIM if dim % PQ_SUBVECTOR_DIM == 0 else dim
+        ivf = faiss.IndexIVFPQ(faiss.IndexFlatIP(dim), dim, nlist, subquantizers, 8, faiss.METRIC_INNER_PRODUCT)
+        # أكواد PQ وحدها تعطي recall@10 حوالي 50%: أفضل k × IVF_REFINE_FACTOR تُرتّب بـ SQ8 (بايت لكل بُعد)
+        index = faiss.IndexRefine(ivf, faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit,
+                                                                   faiss.METRIC_INNER_PRODUCT))
+        # عينة تدريب كافية لـ k-means (حوالي 40 متجه لكل خلية)
+        train_size = min(n, max(40 * nlist, PQ_MIN_TRAIN))
+        sample = vectors[np.random.RandomState(0).choice(n, train_size, replace=False)] if train_size < n else vectors
+        index.train(sample)
+    else:
+        index = faiss.IndexFlatIP(dim)
+
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    else:
+        index.add(vectors)
+    configure_search(index)
+    return index
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """الفهرس الفعلي داخل IndexIDMap/IndexIDMap2"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def has_id_map(index: faiss.Index) -> bool:
+    """معرفات النتائج هي PerfumeNote.id (وليست رقم الصف)"""
+    return isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def configure_search(index: faiss.Index) -> faiss.Index:
+    """ضبط معاملات البحث (efSearch / nprobe / k_factor) بعد البناء أو التحميل من ملف"""
+    kind = index_type_of(index)
+    if kind == 'hnsw':
+        base_index(index).hnsw.efSearch = HNSW_EF_SEARCH
+    elif kind == 'ivfpq':
+        faiss.extract_index_ivf(index).nprobe = IVF_NPROBE
+        refine = base_index(index)
+        if isinstance(refine, faiss.IndexRefine):
+            refine.k_factor = IVF_REFINE_FACTOR
+    return index
+
+
+def read_index(path: str, mmap: Optional[bool] = None) -> faiss.Index:
+    """
+    تحميل فهرس من ملف مع ضبط معاملات البحث
+
+    mmap (FAISS_MMAP افتراضياً): متجهات/أكواد الفهرس (flat، تخزين HNSW، نسخة SQ8 في ivfpq)
+    تبقى في الملف عبر mmap للقراءة فقط بدلاً من نسخها إلى ذاكرة العملية. فهرس mmap لا يُعدّل
+    ولا يُنسخ بـ clone_index (النسخة تشارك نفس الصفحات): للتعديل يُحمّل بـ mmap=False.
+    """
+    mmap = FAISS_MMAP if mmap is None else mmap
+    flags = 0
+    if mmap:
+        # IO_FLAG_MMAP_IFC (faiss >= 1.10) هو الذي يربط أكواد IndexFlatCodes بالملف مباشرة
+        flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    return configure_search(faiss.read_index(path, flags))
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """flat / hnsw / ivfpq، أو flat_l2 للفهارس القديمة (IndexFlatL2)"""
+    index = base_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, (faiss.IndexIVF, faiss.IndexRefine)):
+        return 'ivfpq'
+    if index.metric_type == faiss.METRIC_L2:
+        return 'flat_l2'
+    return 'flat'
+
+
+def search(index: faiss.Index, queries: np.ndarray, k: int,
+           ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    بحث موحّد يعيد (cosine, ids) مهما كان نوع الفهرس
+
+    ids: البحث داخل هذه المعرفات فقط (نتائج فلاتر النوتات): الفلترة داخل البحث نفسه
+    بدلاً من جلب نتائج أكثر ثم حذف غير المطابق، فتعود k نتيجة ما دامت المعرفات تكفي.
+    الفهارس القديمة (L2 على متجهات مطبّعة) تُحوّل: cosine = 1 - d²/2.
+    """
+    queries = np.ascontiguousarray(queries.reshape(-1, index.d), dtype=np.float32)
+    if ids is None:
+        scores, labels = index.search(queries, min(k, index.ntotal))
+    else:
+        ids = np.asarray(ids, dtype=np.int64)
+        k = min(k, len(ids))
+        if not k:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+        kind = index_type_of(index)
+        if kind in ('hnsw', 'ivfpq') and len(ids) <= FILTER_EXACT_MAX:
+            # مجموعة صغيرة: الرسم/الخلايا القريبة قد لا تحتوي k منها، والمقارنة المباشرة أرخص ودقيقة
+            vectors = np.vstack([index.reconstruct(int(note_id)) for note_id in ids])
+            scores = queries @ vectors.T
+            top = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+            return np.take_along_axis(scores, top, axis=1), ids[top]
+        selector = id_selector(ids)
+        scores, labels = index.search(queries, k, params=search_parameters(index, selector, len(ids)))
+    if index.metric_type == faiss.METRIC_L2:
+        scores = 1 - scores / 2
+    return scores, labels
+
+
+def id_selector(ids: np.ndarray) -> faiss.IDSelector:
+    """IDSelectorBitmap للمعرفات المتقاربة (PerfumeNote.id، أرقام الصفوف)، وإلا IDSelectorBatch"""
+    if ids.min() >= 0 and ids.max() < 64 * len(ids):
+        bitmap = np.zeros(int(ids.max()) // 8 + 1, dtype=np.uint8)
+        np.bitwise_or.at(bitmap, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+        selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        # faiss لا يملك المصفوفة: تبقى حية مع الـ selector
+        selector.referenced_objects = [bitmap]
+        return selector
+    return faiss.IDSelectorBatch(ids)
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector, allowed: int) -> faiss.SearchParameters:
+    """
+    معاملات بحث بالـ selector لكل نوع فهرس
+
+    hnsw / ivfpq: efSearch و nprobe تُضرب في نسبة المتجهات المستبعدة (حتى كل الرسم/الخلايا)
+    حتى يصل البحث إلى k مرشح مطابق. IndexIDMap يترجم selector المستوى الأعلى فقط إلى
+    أرقام الصفوف الداخلية، فالـ selector داخل معاملات IVF يُترجم هنا.
+    """
+    ratio = index.ntotal / max(allowed, 1)
+    kind = index_type_of(index)
+    if kind == 'hnsw':
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=int(min(HNSW_EF_SEARCH * ratio, index.ntotal)))
+    if kind == 'ivfpq':
+        ivf = faiss.extract_index_ivf(index)
+        if has_id_map(index):
+            translated = faiss.IDSelectorTranslated(faiss.downcast_index(index).id_map, selector)
+            translated.referenced_objects = [selector]
+            selector = translated
+        nprobe = int(min(IVF_NPROBE * ratio, ivf.nlist))
+        ivf_params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+        ivf_params.referenced_objects = [selector]
+        if isinstance(base_index(index), faiss.IndexRefine):
+            params = faiss.IndexRefineSearchParameters(k_factor=IVF_REFINE_FACTOR, base_index_params=ivf_params)
+            params.referenced_objects = [ivf_params]
+            return params
+        return ivf_params
+    return faiss.SearchParameters(sel=selector)
+
+
+@dataclass
+class ScoreCalibration:
+    """
+    معايرة cosine إلى درجة تطابق 0-1
+
+    background_p50/p95/p99: توزيع cosine بين أزواج عشوائية من النوتات (تشابه بالصدفة).
+    الدرجة = (cosine - p50) / (1 - p50) مقصوصة إلى [0, 1]: تشابه الخلفية المعتاد → 0،
+    والتطابق التام → 1. background_floor() هي درجة p95 (أعلى من 95% من الأزواج العشوائية).
+    """
+    background_p50: float = 0.0
+    background_p95: float = 0.0
+    background_p99: float = 0.0
+    samples: int = 0
+
+    def calibrate(self, cosine):
+        scale = max(1.0 - self.background_p50, 1e-6)
+        return np.clip((np.asarray(cosine, dtype=np.float32) - self.background_p50) / scale, 0.0, 1.0)
+
+    def background_floor(self) -> float:
+        return float(self.calibrate(self.background_p95))
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> Optional['ScoreCalibration']:
+        if not data:
+            return None
+        return cls(**{key: data[key] for key in cls.__dataclass_fields__ if key in data})
+
+
+def fit_calibration(vectors: np.ndarray, samples: int = 20000, seed: int = 0) -> ScoreCalibration:
+    """توزيع cosine لأزواج عشوائية مختلفة من المتجهات (بدون حساب المصفوفة الكاملة)"""
+    n = len(vectors)
+    if n < 2:
+        return ScoreCalibration()
+
+    rng = np.random.RandomState(seed)
+    left = rng.randint(0, n, samples)
+    right = (left + rng.randint(1, n, samples)) % n
+    cosines = np.einsum('ij,ij->i', vectors[left], vectors[right])
+    p50, p95, p99 = np.percentile(cosines, [50, 95, 99])
+    return ScoreCalibration(float(p50), float(p95), float(p99), samples)
@@ -3,52 +3,27 @@ Vector Search using FAISS for semantic similarity in fragrance notes
 This is integrated into the RAG system for advanced semantic search
 """
 
-import faiss
-import json
 import numpy as np
-import os
 from typing import List, Dict, Tuple
+from app.notes_retriever import IndexView, get_retriever
 
 class VectorNoteSearch:
-    """Vector-based semantic search for fragrance notes"""
-    
-    def __init__(self, index_path: str = "app/data/notes.index", 
-                 embeddings_path: str = "app/data/notes_embeddings.json"):
-        """Initialize vector search with FAISS index"""
-        self.index_path = index_path
-        self.embeddings_path = embeddings_path
-        self.index = None
-        self.metadata = None
-        self.notes_map = {}
-        self.load_index()
+    """
+    Vector-based semantic search for fragrance notes
+
+    A thin view over the process-wide index snapshot and notes store (app/notes_store.py):
+    nothing is loaded here, and pending admin edits (the index update log) are included.
+    """
     
-    def load_index(self):
-        """Load FAISS index and metadata"""
-        try:
-            if not os.path.exists(self.index_path):
-                print(f"⚠ تنبيه: لم يتم العثور على FAISS index في {self.index_path}")
-                print("  تأكد من تشغيل app/notes_vectorizer.py أولاً")
-                return False
-            
-            self.index = faiss.read_index(self.index_path)
-            
-            if not os.path.exists(self.embeddings_path):
-                print(f"⚠ تنبيه: لم يتم العثور على metadata في {self.embeddings_path}")
-                return False
-            
-            with open(self.embeddings_path, 'r', encoding='utf-8') as f:
-                self.metadata = json.load(f)
-            
-            # Create mapping of note IDs to note data
-            for note_info in self.metadata['notes']:
-                self.notes_map[note_info['id']] = note_info
-            
-            print(f"✓ تم تحميل FAISS index بنجاح ({self.index.ntotal} نوتة)")
-            return True
-        
-        except Exception as e:
-            print(f"⚠ خطأ في تحميل FAISS index: {str(e)}")
-            return False
+    def __init__(self, view: IndexView = None):
+        """Bind to an index view (the shared retriever's current one by default)"""
+        self.view = view or get_retriever().view
+        snapshot = self.view.snapshot
+        self.index = snapshot.index
+        self.metadata = snapshot.metadata
+        self.embedder = snapshot.embedder
+        self.calibration = snapshot.calibration
+        self.notes_map = self.view.store.notes
     
     def search_by_embedding(self, embedding: np.ndarray, k: int = 5) -> List[Dict]:
         """Search for similar notes using embedding vector"""
@@ -56,25 +31,23 @@ class VectorNoteSearch:
             return []
         
         try:
-            # Ensure embedding is correct shape and type
-            embedding = np.array([embedding]).astype('float32')
-            
-            # Search
-            distances, indices = self.index.search(embedding, min(k, self.index.ntotal))
+            # Search (cosine for any index type, legacy L2 indexes included) over snapshot + edit log
+            matches = self.view.search(np.asarray(embedding, dtype=np.float32), k)
+            scores = self.calibration.calibrate([cosine for _, cosine in matches])
+            store = self.view.store
             
             results = []
-            for idx, distance in zip(indices[0], distances[0]):
-                if idx < 0 or idx >= len(self.metadata['notes']):
+            for (note_id, cosine), score in zip(matches, scores):
+                note_info = store.get(note_id)
+                if note_info is None:
                     continue
-                
-                note_info = self.notes_map[idx]
                 results.append({
-                    "id": idx,
-                    "note": note_info['note'],
-                    "arabic": note_info['arabic'],
-                    "family": note_info['family'],
-                    "distance": float(distance),
-                    "similarity": 1 / (1 + float(distance))  # Convert distance to similarity
+                    "id": note_id,
+                    "note": note_info.note,
+                    "arabic": note_info.arabic,
+                    "family": note_info.family,
+                    "distance": 1 - float(cosine),  # cosine distance
+                    "similarity": float(score)  # calibrated 0-1 (see app/vector_index.py)
                 })
             
             return results
@@ -89,10 +62,13 @@ class VectorNoteSearch:
             return None
         
         try:
-            # Reconstruct the vector from index
-            # Note: This works with IndexFlatL2, for other index types may need different approach
-            vector = self.index.reconstruct(note_id)
-            return vector
+            # Notes edited since the snapshot have their own vector; deleted ones have none
+            if note_id in self.view.vectors:
+                return self.view.vectors[note_id]
+            if note_id in self.view.masked:
+                return None
+            # Reconstruct the vector from index (IVF-PQ returns its SQ8 refine copy, accurate to ~1e-3)
+            return self.index.reconstruct(note_id)
         except:
             return None
     
@@ -105,10 +81,11 @@ class VectorNoteSearch:
 _vector_search = None
 
 def get_vector_search() -> VectorNoteSearch:
-    """Get or create singleton vector search instance"""
+    """Vector search over the shared retriever's current index view (rebound when it changes)"""
     global _vector_search
-    if _vector_search is None:
-        _vector_search = VectorNoteSearch()
+    view = get_retriever().view
+    if _vector_search is None or _vector_search.view is not view:
+        _vector_search = VectorNoteSearch(view)
     return _vector_search
 
 
@@ -121,19 +98,10 @@ def search_similar_notes(embedding: np.ndarray, k: int = 5) -> List[Dict]:
 
 
 def generate_note_embedding(client, note_text: str) -> np.ndarray:
-    """Generate embedding for a custom note description using hash-based approach"""
-    import hashlib
-    
+    """Generate embedding for a custom note description (local embedder, client is unused)"""
     try:
-        # Use hash-based embedding for consistency
-        hash_obj = hashlib.md5(note_text.encode())
-        seed = int(hash_obj.hexdigest(), 16) % (2**31)
-        
-        rng = np.random.RandomState(seed)
-        vector = rng.randn(384).astype('float32')
-        vector = vector / (np.linalg.norm(vector) + 1e-10)
-        
-        return vector
+        # Same embedder the index was built with
+        return get_vector_search().embedder.encode_query(note_text)
     except Exception as e:
         print(f"⚠ خطأ في توليد embedding: {str(e)}")
         return None
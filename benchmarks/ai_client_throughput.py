@@ -0,0 +1,70 @@
+"""
+قياس إنتاجية طلبات AI لكل عامل: العميل المتزامن مقابل المسار غير المتزامن
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.ai_client_throughput --requests 64 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fake_openai_server import start_fake_server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(latency=args.latency)
+
+    os.environ['AI_INTEGRATIONS_OPENAI_BASE_URL'] = base_url
+    os.environ['AI_INTEGRATIONS_OPENAI_API_KEY'] = 'bench'
+    os.environ['AI_CACHE_ENABLED'] = 'false'
+    os.environ['AI_LOG_TOKENS'] = 'false'
+
+    from openai import OpenAI
+    from app import ai_service
+    from app.ai_client import MAX_CONCURRENCY
+
+    prompts = [f"حلل المناخ رقم {i}" for i in range(args.requests)]
+
+    print("=" * 60)
+    print(f"🚀 قياس الإنتاجية: {args.requests} طلب، زمن الاستجابة {args.latency}s")
+    print("=" * 60)
+
+    # قبل: عميل OpenAI متزامن واحد، طلب واحد في كل مرة (عامل sync في gunicorn)
+    sync_client = OpenAI(api_key='bench', base_url=base_url)
+    start = time.perf_counter()
+    for prompt in prompts:
+        sync_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            max_completion_tokens=1500
+        )
+    sync_elapsed = time.perf_counter() - start
+
+    # بعد: الدوال غير المتزامنة، عدة طلبات قيد التنفيذ في نفس العامل
+    async def run_async():
+        return await asyncio.gather(*(ai_service.aget_ai_response(p) for p in prompts))
+
+    ai_service.get_ai_response("warmup")
+    start = time.perf_counter()
+    results = asyncio.run(run_async())
+    async_elapsed = time.perf_counter() - start
+
+    errors = sum(1 for r in results if isinstance(r, dict) and 'error' in r)
+
+    print(f"✓ متزامن:      {sync_elapsed:7.2f}s  →  {args.requests / sync_elapsed:7.1f} طلب/ثانية")
+    print(f"✓ غير متزامن:  {async_elapsed:7.2f}s  →  {args.requests / async_elapsed:7.1f} طلب/ثانية "
+          f"(حد التزامن {MAX_CONCURRENCY}, أخطاء {errors})")
+    print(f"  - التسريع: x{sync_elapsed / async_elapsed:.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+قياس الاستيراد الجماعي للنوتات: طلب AI واحد للنص كاملاً مقابل أجزاء متوازية (run_batch)
+
+الخادم الوهمي يعيد نوتة لكل سطر في الجزء، وزمن الرد يتناسب مع طول المخرجات
+(--per-note ثانية لكل نوتة)، والرد يُقطع عند max_completion_tokens كما في OpenAI
+(--tokens-per-note تقريباً لكل نوتة في الـ JSON).
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.bulk_import_batch --notes 500 --per-note 0.02
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from benchmarks.fake_openai_server import start_fake_server
+
+
+NOTE_LINE = re.compile(r'^(Synthetic Note \d+),', re.MULTILINE)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notes', type=int, default=500)
+    parser.add_argument('--base-latency', type=float, default=0.3)
+    parser.add_argument('--per-note', type=float, default=0.02)
+    parser.add_argument('--tokens-per-note', type=int, default=120)
+    parser.add_argument('--concurrency', default='1,4,8,16')
+    args = parser.parse_args()
+
+    def notes_in(request):
+        prompt = request['messages'][-1]['content']
+        limit = request.get('max_completion_tokens', 4000) // args.tokens_per_note
+        return NOTE_LINE.findall(prompt), limit
+
+    def latency(request):
+        names, limit = notes_in(request)
+        return args.base_latency + args.per_note * min(len(names), limit)
+
+    def content(request):
+        names, limit = notes_in(request)
+        body = json.dumps([
+            {"name_en": name, "name_ar": f"نوتة {name.split()[-1]}", "family": "Woody", "role": "Base",
+             "volatility": "Low", "profile": "خشبي دافئ", "best_for": ["مساء"],
+             "works_well_with": ["Amber"], "avoid_with": [], "concentration": "10%", "origin": "—"}
+            for name in names
+        ], ensure_ascii=False)
+        if len(names) > limit:
+            # وصل الرد إلى max_completion_tokens: JSON مقطوع في المنتصف
+            body = body[:len(body) * limit // len(names)]
+        return body
+
+    server, base_url = start_fake_server(latency=latency, content=content)
+
+    os.environ['AI_INTEGRATIONS_OPENAI_BASE_URL'] = base_url
+    os.environ['AI_INTEGRATIONS_OPENAI_API_KEY'] = 'bench'
+    os.environ['AI_CACHE_ENABLED'] = 'false'
+    os.environ['AI_LOG_TOKENS'] = 'false'
+
+    from app import ai_batch, ai_service
+
+    text = '\n'.join(f"Synthetic Note {i}, خشبي دافئ، عائلة خشبية، دور قاعدة" for i in range(args.notes))
+    chunk_lines = ai_service.BULK_IMPORT_CHUNK_LINES
+
+    print("=" * 60)
+    print(f"🚀 استيراد {args.notes} نوتة: {args.per_note * 1000:.0f}ms لكل نوتة في الرد، "
+          f"أجزاء من {chunk_lines} سطر")
+    print("=" * 60)
+
+    # قبل: النص كاملاً في طلب واحد
+    ai_service.BULK_IMPORT_CHUNK_LINES = ai_service.BULK_IMPORT_CHUNK_CHARS = 10 ** 9
+    start = time.perf_counter()
+    result = ai_service.analyze_perfume_notes_bulk_import(text)
+    elapsed = time.perf_counter() - start
+    status = f"{len(result.get('notes', []))} نوتة" if result['success'] else f"فشل: {result['error'][:40]}"
+    print(f"✓ طلب واحد:        {elapsed:6.2f}s  →  {status}")
+
+    # بعد: أجزاء متوازية بحدود تزامن مختلفة
+    ai_service.BULK_IMPORT_CHUNK_LINES = chunk_lines
+    ai_service.BULK_IMPORT_CHUNK_CHARS = 3000
+    baseline = None
+    for concurrency in (int(c) for c in args.concurrency.split(',')):
+        ai_batch.BATCH_CONCURRENCY = concurrency
+        updates = []
+        start = time.perf_counter()
+        result = ai_service.analyze_perfume_notes_bulk_import(
+            text, on_progress=lambda done, total, failed: updates.append(done)
+        )
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        chunks = result['chunks']
+        print(f"✓ دفعات x{concurrency:<3}       {elapsed:6.2f}s  →  {len(result['notes'])} نوتة، "
+              f"{chunks['total']} أجزاء ({chunks['failed']} فاشلة، {len(updates)} تحديث تقدم)  "
+              f"التسريع x{baseline / elapsed:.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+قياس سلوك عامل واحد عندما تتباطأ خدمة OpenAI: الانتظار الكامل مقابل المهلة والـ circuit breaker
+
+كل طلب يمثل طلب مستخدم على مسار AI بمهلة --deadline. قبل: عميل OpenAI
+المتزامن ينتظر حتى يرد الخادم البطيء. بعد: ai_service يعيد الرد الافتراضي
+عند انتهاء المهلة، وبعد AI_BREAKER_FAILURES إخفاقات يُرفض الطلب فوراً.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.degraded_upstream --requests 12 --latency 1.5 --deadline 0.5
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.fake_openai_server import start_fake_server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=12)
+    parser.add_argument('--latency', type=float, default=1.5)
+    parser.add_argument('--deadline', type=float, default=0.5)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(latency=args.latency)
+
+    os.environ['AI_INTEGRATIONS_OPENAI_BASE_URL'] = base_url
+    os.environ['AI_INTEGRATIONS_OPENAI_API_KEY'] = 'bench'
+    os.environ['AI_CACHE_ENABLED'] = 'false'
+    os.environ['AI_LOG_TOKENS'] = 'false'
+
+    from openai import OpenAI
+    from app import ai_resilience
+    from app.ai_service import get_ai_response
+
+    prompts = [f"حلل المناخ رقم {i}" for i in range(args.requests)]
+
+    print("=" * 60)
+    print(f"🚀 خدمة متباطئة: {args.requests} طلب، زمن الاستجابة {args.latency}s، مهلة المسار {args.deadline}s")
+    print("=" * 60)
+
+    # قبل: انتظار الرد مهما طال
+    sync_client = OpenAI(api_key='bench', base_url=base_url)
+    before = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        sync_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            max_completion_tokens=1500
+        )
+        before.append(time.perf_counter() - start)
+
+    # بعد: مهلة لكل طلب + circuit breaker
+    after = []
+    fallbacks = 0
+    for prompt in prompts:
+        token = ai_resilience.set_deadline(args.deadline)
+        start = time.perf_counter()
+        result = get_ai_response(prompt)
+        after.append(time.perf_counter() - start)
+        ai_resilience.reset_deadline(token)
+        fallbacks += isinstance(result, dict) and 'error' in result
+
+    def summary(samples):
+        return (f"المجموع {sum(samples):6.2f}s  الوسيط {statistics.median(samples) * 1000:7.1f}ms  "
+                f"الأقصى {max(samples) * 1000:7.1f}ms")
+
+    print(f"✓ انتظار كامل:        {summary(before)}")
+    print(f"✓ مهلة + breaker:      {summary(after)}  (ردود افتراضية {fallbacks})")
+    print(f"  - حالة الـ breaker: {ai_resilience.get_breaker_stats()}")
+    print(f"  - وقت العامل المحرر: x{sum(before) / sum(after):.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+قياس زمن إعادة بناء الفهرس (embeddings + FAISS) لعدد كبير من النوتات الاصطناعية
+
+قبل: RandomState جديد لكل نص في حلقة، ثم np.array تنسخ كل المتجهات مرة أخرى.
+بعد: app.embeddings.embed_texts (مصفوفة float32 واحدة، تطبيع متجهي، process pool للمجموعات الكبيرة).
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.embedding_rebuild --sizes 10000,100000,1000000 --legacy-max 100000
+"""
+
+import argparse
+import hashlib
+import os
+import time
+
+import faiss
+import numpy as np
+
+from app.embeddings import embed_texts, EMBEDDING_DIM
+from app.rag_builder import create_note_text
+
+
+FAMILIES = ['Woody', 'Floral', 'Oriental', 'Fresh', 'Citrus', 'Spicy', 'Gourmand', 'Green']
+ROLES = ['Top', 'Heart', 'Base']
+
+
+def synthetic_texts(n):
+    return [
+        create_note_text({
+            'note': f"Synthetic Note {i}",
+            'arabic': f"نوتة {i}",
+            'family': FAMILIES[i % len(FAMILIES)],
+            'role': ROLES[i % len(ROLES)],
+            'profile': 'دافئ وعميق مع لمسة راتنجية',
+            'volatility': 'Low',
+            'works_well_with': ['Amber', 'Musk'],
+            'best_for': ['مساء', 'شتاء'],
+        })
+        for i in range(n)
+    ]
+
+
+def legacy_embed(texts):
+    """الطريقة السابقة في rag_builder.rebuild_faiss_index"""
+    vectors = []
+    for text in texts:
+        seed = int(hashlib.md5(text.encode()).hexdigest(), 16) % (2**31)
+        rng = np.random.RandomState(seed)
+        vector = rng.randn(EMBEDDING_DIM).astype('float32')
+        vectors.append(vector / (np.linalg.norm(vector) + 1e-10))
+    return np.array(vectors).astype('float32')
+
+
+def rebuild(embed, texts):
+    start = time.perf_counter()
+    vectors = embed(texts)
+    index = faiss.IndexFlatL2(EMBEDDING_DIM)
+    index.add(vectors)
+    return time.perf_counter() - start, vectors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--legacy-max', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"🚀 إعادة بناء الفهرس: {EMBEDDING_DIM} بُعد، {args.workers} عمليات للـ process pool")
+    print("=" * 60)
+
+    for n in (int(size) for size in args.sizes.split(',')):
+        texts = synthetic_texts(n)
+        print(f"\n📊 {n:,} نوتة (المصفوفة {n * EMBEDDING_DIM * 4 / 2**20:,.0f} MB)")
+
+        batched, vectors = rebuild(lambda t: embed_texts(t, workers=1), texts)
+
+        if n <= args.legacy_max:
+            legacy, legacy_vectors = rebuild(legacy_embed, texts)
+            drift = float(np.abs(legacy_vectors - vectors).max())
+            del legacy_vectors
+            print(f"✓ قبل (حلقة + np.array): {legacy:7.2f}s")
+            print(f"✓ embed_texts:            {batched:7.2f}s  التسريع x{legacy / batched:.1f}  (أقصى فرق {drift:.1e})")
+        else:
+            print(f"✓ قبل (حلقة + np.array):     —   (أكبر من --legacy-max)")
+            print(f"✓ embed_texts:            {batched:7.2f}s")
+        del vectors
+
+        if args.workers > 1:
+            pooled, vectors = rebuild(lambda t: embed_texts(t, workers=args.workers), texts)
+            del vectors
+            print(f"✓ embed_texts x{args.workers} عمليات: {pooled:7.2f}s  التسريع x{batched / pooled:.1f}")
+
+        del texts
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+قياس جودة الاسترجاع (recall@k) لكل embedder على استعلامات مُعلّمة من notes_kb.json
+
+لكل نوتة تُبنى استعلامات بأنواع مختلفة (الاسم العربي، العربي مع تشكيل/همزات،
+الاسم الإنجليزي، خطأ إملائي، وصف الرائحة، جملة عربية) والإجابة الصحيحة هي النوتة نفسها.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.embedding_recall --k 1,5
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.embeddings import create_embedder, EMBEDDERS
+from app.rag_builder import create_note_text
+
+
+def arabic_variant(name):
+    """نفس الاسم بكتابة مختلفة: تشكيل، همزة على الألف، ى/ة في النهاية"""
+    variant = name.replace('ا', 'أ', 1) if name.startswith('ا') else name
+    if variant.endswith('ي'):
+        variant = variant[:-1] + 'ى'
+    elif variant.endswith('ه'):
+        variant = variant[:-1] + 'ة'
+    return ''.join(ch + 'َ' if ch.isalpha() and i % 2 == 0 else ch for i, ch in enumerate(variant))
+
+
+def build_queries(notes):
+    queries = []
+    for i, note in enumerate(notes):
+        english = note['note']
+        profile = [word.strip() for word in note['profile'].split(',')][:2]
+        queries += [
+            ('arabic', note['arabic'], i),
+            ('arabic_variant', arabic_variant(note['arabic']), i),
+            ('english', english.lower(), i),
+            ('profile', f"{' '.join(profile)} {note['family']}".lower(), i),
+            ('arabic_phrase', f"أبحث عن عطر فيه {note['arabic']}", i),
+        ]
+        if len(english) >= 5:
+            typo = english[:len(english) // 2] + english[len(english) // 2 + 1:]
+            queries.append(('typo', typo.lower(), i))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--k', default='1,5')
+    parser.add_argument('--embedders', default=','.join(EMBEDDERS))
+    args = parser.parse_args()
+
+    with open('notes_kb.json', 'r', encoding='utf-8') as f:
+        notes = json.load(f)
+
+    texts = [create_note_text(note) for note in notes]
+    queries = build_queries(notes)
+    ks = [int(k) for k in args.k.split(',')]
+    kinds = list(dict.fromkeys(kind for kind, _, _ in queries))
+
+    print("=" * 60)
+    print(f"🚀 recall@k: {len(notes)} نوتة، {len(queries)} استعلام مُعلّم")
+    print("=" * 60)
+
+    for name in args.embedders.split(','):
+        embedder = create_embedder(name)
+        start = time.perf_counter()
+        matrix = embedder.fit(texts).encode(texts)
+        build = time.perf_counter() - start
+
+        hits = {kind: {k: 0 for k in ks} for kind in kinds}
+        counts = {kind: 0 for kind in kinds}
+
+        start = time.perf_counter()
+        for kind, query, label in queries:
+            ranked = np.argsort(-(matrix @ embedder.encode_query(query)))
+            counts[kind] += 1
+            for k in ks:
+                hits[kind][k] += label in ranked[:k]
+        cold = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        for _, query, _ in queries:
+            embedder.encode_query(query)
+        warm = (time.perf_counter() - start) / len(queries)
+
+        print(f"\n📊 {name}: بناء {build * 1000:.0f}ms، استعلام {cold * 1000:.2f}ms (من الكاش {warm * 1000:.3f}ms)")
+        for kind in kinds:
+            scores = '  '.join(f"@{k} {hits[kind][k] / counts[kind]:5.1%}" for k in ks)
+            print(f"  - {kind:<15} {scores}")
+        total = '  '.join(f"@{k} {sum(h[k] for h in hits.values()) / len(queries):5.1%}" for k in ks)
+        print(f"  ✓ {'الكل':<15} {total}")
+
+
+if __name__ == "__main__":
+    main()
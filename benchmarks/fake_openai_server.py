@@ -0,0 +1,111 @@
+"""
+Fake OpenAI Server - خادم HTTP محلي يحاكي /v1/chat/completions
+يُستخدم في قياسات الأداء فقط، ويعيد استجابة JSON ثابتة بعد تأخير قابل للضبط (مع دعم stream=True)
+
+latency و content يمكن أن يكونا دالتين تستقبلان جسم الطلب (dict) لمحاكاة ردود تعتمد على الـ prompt
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_CONTENT = '{"summer_perfumes": ["Acqua di Gio"], "recommendation": "عطر خفيف"}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        latency = self.server.latency
+        content = self.server.content
+        time.sleep(latency(request) if callable(latency) else latency)
+        if callable(content):
+            content = content(request)
+
+        if request.get('stream'):
+            self._send_stream(request, content)
+            return
+
+        body = json.dumps({
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}
+        }).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, request, content):
+        """إرسال المحتوى كأجزاء chat.completion.chunk (stream=True)"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        step = 16
+        for i in range(0, len(content), step):
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        if (request.get('stream_options') or {}).get('include_usage'):
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # العميل ألغى الطلب (مهلة أو hedge) قبل وصول الرد
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_fake_server(latency=0.2, content=DEFAULT_CONTENT):
+    """تشغيل الخادم في thread خلفي وإرجاع (server, base_url)"""
+    server = _Server(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.content = content
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/v1"
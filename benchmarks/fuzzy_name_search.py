@@ -0,0 +1,111 @@
+"""
+قياس البحث التقريبي باسم النوتة (FragranceKnowledgeBase.search_note): SequenceMatcher مع
+الاسمين الإنجليزي والعربي لكل نوتة (المسار السابق) مقابل فهرس trigrams (app/name_index.py)
+
+الاستعلامات: أسماء إنجليزية بخطأ إملائي واحد (حذف/تبديل/استبدال حرف) وأسماء عربية بتشكيل
+أو همزة مختلفة. لكل حجم: زمن البناء، زمن الاستعلام، عدد الأسماء المقارنة بـ SequenceMatcher،
+ونسبة الاستعلامات التي يعيد فيها الفهرس نوتة مساوية أو أقرب للاستعلام (بعد التوحيد) من المسار السابق.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.fuzzy_name_search --sizes 10000 100000
+"""
+
+import argparse
+import random
+import time
+from difflib import SequenceMatcher
+
+from app.embeddings import normalize_text
+from app.name_index import FUZZY_NAME_CANDIDATES, NameIndex
+from benchmarks.mmap_loading import synthetic_notes
+
+
+ARABIC_VARIANTS = [('ا', 'أ'), ('ي', 'ى'), ('ه', 'ة'), ('ر', 'رَ'), ('ل', 'لْ')]
+
+
+def misspell(name, rng):
+    """خطأ إملائي واحد في اسم إنجليزي"""
+    i = rng.randrange(1, max(len(name) - 1, 2))
+    kind = rng.choice(('drop', 'swap', 'replace'))
+    if kind == 'drop':
+        return name[:i] + name[i + 1:]
+    if kind == 'swap' and i + 1 < len(name):
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    return name[:i] + rng.choice('aeiourstn') + name[i + 1:]
+
+
+def vary_arabic(name, rng):
+    """تشكيل أو همزة مختلفة في اسم عربي (نفس الاسم بعد التوحيد)"""
+    for plain, variant in rng.sample(ARABIC_VARIANTS, len(ARABIC_VARIANTS)):
+        if plain in name:
+            return name.replace(plain, variant, 1)
+    return name + 'ـ'
+
+
+def linear_search(notes, query, threshold=0.3):
+    """المسار السابق: SequenceMatcher مع الاسمين لكل نوتة"""
+    best, best_score = None, threshold
+    query = query.lower()
+    for note in notes:
+        for name in (note['note'], note['arabic']):
+            score = SequenceMatcher(None, query, name.lower()).ratio()
+            if score > best_score:
+                best, best_score = note['id'], score
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--linear-queries', type=int, default=20)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"🚀 البحث التقريبي بالاسم: SequenceMatcher لكل النوتات مقابل فهرس trigrams "
+          f"({FUZZY_NAME_CANDIDATES} مرشح)")
+    print("=" * 60)
+
+    for size in args.sizes:
+        notes = synthetic_notes(size)
+        by_id = {note['id']: note for note in notes}
+        rng = random.Random(0)
+        queries = []
+        for note in rng.sample(notes, args.queries):
+            queries.append(misspell(note['note'], rng) if rng.random() < 0.5 else vary_arabic(note['arabic'], rng))
+
+        start = time.perf_counter()
+        index = NameIndex((note['id'], name) for note in notes for name in (note['note'], note['arabic']))
+        built = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [index.search(query)[0] for query in queries]
+        indexed = (time.perf_counter() - start) / len(queries)
+        touched = sum(len(index.candidates(query)) for query in queries) / len(queries)
+
+        sample = queries[:args.linear_queries]
+        start = time.perf_counter()
+        expected = [linear_search(notes, query) for query in sample]
+        linear = (time.perf_counter() - start) / len(sample)
+
+        # جودة النتيجة بنفس المقياس للمسارين: أعلى تشابه بين الاستعلام الموحّد واسمي النوتة
+        def quality(query, note_id):
+            if note_id is None:
+                return 0.0
+            query = normalize_text(query)
+            return max(SequenceMatcher(None, query, normalize_text(name)).ratio()
+                       for name in (by_id[note_id]['note'], by_id[note_id]['arabic']))
+
+        same = sum(quality(query, got) >= quality(query, want) - 1e-9
+                   for query, got, want in zip(sample, results, expected))
+
+        print(f"\n📊 {size:,} نوتة ({len(index):,} اسم)")
+        print(f"✓ بناء الفهرس: {built:.2f}s")
+        print(f"✓ SequenceMatcher لكل النوتات: {linear * 1000:9.2f}ms لكل استعلام")
+        print(f"✓ فهرس trigrams:               {indexed * 1000:9.2f}ms لكل استعلام "
+              f"({touched:.0f} اسم مقارن، {linear / indexed:.0f}x أسرع)")
+        print(f"✓ نتيجة مساوية أو أقرب من المسار السابق: {same}/{len(sample)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+قياس أنواع فهارس FAISS (app/vector_index.py): زمن البناء، زمن الاستعلام، recall@k والذاكرة
+
+البيانات اصطناعية ومطبّعة ومجمّعة حول مراكز (مثل النوتات: عائلات متقاربة)، والاستعلامات
+نسخ مشوّشة من متجهات في المجموعة. الإجابة الصحيحة هي نتائج البحث الدقيق (flat).
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.index_types --sizes 1000,100000,1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.embeddings import EMBEDDING_DIM
+from app.vector_index import build_index, search, choose_index_type, HNSW_M
+
+
+def synthetic_vectors(n, dim, clusters=1000, noise=0.6, seed=0):
+    """n متجه مطبّع حول مراكز عشوائية (float32، بأجزاء لتوفير الذاكرة)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100000):
+        block = vectors[start:start + 100000]
+        block[:] = centers[rng.integers(0, clusters, len(block))]
+        block += noise * rng.standard_normal(block.shape, dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+
+def sample_queries(vectors, count, noise=0.3, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), count)].copy()
+    queries += noise * rng.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(queries.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def index_megabytes(kind, n, dim):
+    """حجم الفهرس التقريبي: المتجهات الكاملة، + روابط HNSW، أو أكواد PQ + المعرفات + نسخة SQ8"""
+    if kind == 'hnsw':
+        return n * (dim * 4 + HNSW_M * 2 * 4) / 2**20
+    if kind == 'ivfpq':
+        return n * (dim // 8 + 8 + dim) / 2**20
+    return n * dim * 4 / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,100000,1000000')
+    parser.add_argument('--types', default='flat,hnsw,ivfpq')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=EMBEDDING_DIM)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"🚀 أنواع فهارس FAISS: {args.dim} بُعد، {args.queries} استعلام، recall@{args.k} مقابل flat")
+    print("=" * 60)
+
+    for n in (int(size) for size in args.sizes.split(',')):
+        vectors = synthetic_vectors(n, args.dim)
+        queries = sample_queries(vectors, args.queries)
+        print(f"\n📊 {n:,} متجه (auto → {choose_index_type(n, 'auto')})")
+
+        truth = None
+        for kind in ['flat'] + [t for t in args.types.split(',') if t != 'flat']:
+            if choose_index_type(n, kind) != kind:
+                print(f"✓ {kind:<6} —  (مجموعة صغيرة لتدريب PQ، يُبنى flat بدلاً منه)")
+                continue
+
+            start = time.perf_counter()
+            index = build_index(vectors, kind)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for query in queries:
+                _, ids = search(index, query, args.k)
+            latency = (time.perf_counter() - start) / len(queries)
+
+            _, ids = search(index, queries, args.k)
+            if truth is None:
+                truth = ids
+            recall = np.mean([len(set(found) & set(expected)) / args.k for found, expected in zip(ids, truth)])
+            del index
+
+            if kind in args.types.split(','):
+                print(f"✓ {kind:<6} بناء {build:8.2f}s  استعلام {latency * 1000:7.3f}ms  "
+                      f"recall@{args.k} {recall:6.1%}  الفهرس ~{index_megabytes(kind, n, args.dim):,.0f} MB")
+
+        del vectors
+
+
+if __name__ == "__main__":
+    main()
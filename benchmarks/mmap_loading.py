@@ -0,0 +1,130 @@
+"""
+قياس تحميل نسخة الفهرس في كل worker: read_index + تحليل notes_cache.json مقابل
+read_index بـ mmap + notes.columns (app/notes_columns.py)
+
+لكل طريقة عملية جديدة (مثل worker جديد) تقيس زمن الفتح، وذاكرتها الخاصة (RssAnon: نسخة
+لكل worker) والمربوطة بالملفات (RssFile: صفحات page cache مشتركة بين كل الـ workers)
+بعد الفتح وبعد استعلامات بحث وقراءة نوتات النتائج.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.mmap_loading --notes 100000 --workers 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from app.embeddings import EMBEDDING_DIM
+from app.notes_columns import NoteColumns, write_columns
+from app.vector_index import build_index, read_index, search
+from benchmarks.index_types import synthetic_vectors, sample_queries
+
+
+def memory_mb():
+    """(RssAnon، RssFile) بالميجابايت من /proc/self/status"""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('RssAnon:', 'RssFile:')):
+                key, value = line.split(':')
+                values[key] = int(value.split()[0]) / 1024
+    return values['RssAnon'], values['RssFile']
+
+
+def synthetic_notes(n):
+    """n نوتة بنفس شكل PerfumeNote.to_dict() (تكرار نوتات الكاش المرفق بأسماء مختلفة)"""
+    with open('app/data/notes_cache.json', 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    return [
+        dict(base[i % len(base)], id=i + 1, note=f"{base[i % len(base)]['note']} {i}")
+        for i in range(n)
+    ]
+
+
+def child(mode, directory, queries_path, k):
+    """worker واحد: فتح النسخة ثم بحث وقراءة نوتات النتائج"""
+    anon, file = memory_mb()
+    start = time.perf_counter()
+    if mode == 'json':
+        index = read_index(os.path.join(directory, 'notes.index'), mmap=False)
+        with open(os.path.join(directory, 'notes_cache.json'), 'r', encoding='utf-8') as f:
+            notes = {note['id']: note for note in json.load(f)}
+    else:
+        index = read_index(os.path.join(directory, 'notes.index'), mmap=True)
+        notes = NoteColumns(os.path.join(directory, 'notes.columns'))
+    opened = time.perf_counter() - start
+    open_anon, open_file = memory_mb()
+
+    queries = np.load(queries_path)
+    start = time.perf_counter()
+    for query in queries:
+        _, ids = search(index, query, k)
+        results = [notes[note_id] for note_id in ids[0].tolist()]
+    latency = (time.perf_counter() - start) / len(queries)
+    query_anon, query_file = memory_mb()
+
+    print(json.dumps({
+        'open': opened, 'latency': latency, 'results': len(results),
+        'open_anon': open_anon - anon, 'open_file': open_file - file,
+        'query_anon': query_anon - anon, 'query_file': query_file - file
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notes', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=EMBEDDING_DIM)
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'DIR', 'QUERIES'))
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child, args.k)
+        return
+
+    print("=" * 60)
+    print(f"🚀 تحميل النسخة في كل worker: {args.notes:,} نوتة، {args.dim} بُعد، {args.workers} workers")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        notes = synthetic_notes(args.notes)
+        vectors = synthetic_vectors(args.notes, args.dim)
+        faiss.write_index(build_index(vectors, 'flat', ids=[note['id'] for note in notes]),
+                          os.path.join(directory, 'notes.index'))
+        with open(os.path.join(directory, 'notes_cache.json'), 'w', encoding='utf-8') as f:
+            json.dump(notes, f, ensure_ascii=False)
+        write_columns(os.path.join(directory, 'notes.columns'), notes)
+        queries_path = os.path.join(directory, 'queries.npy')
+        np.save(queries_path, sample_queries(vectors, args.queries))
+        del notes, vectors
+
+        for name in ('notes.index', 'notes_cache.json', 'notes.columns'):
+            print(f"📄 {name:<17} {os.path.getsize(os.path.join(directory, name)) / 2**20:8.1f} MB")
+
+        for mode, label in (('json', 'JSON + نسخة'), ('mmap', 'columns + mmap')):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.mmap_loading', '--k', str(args.k),
+                 '--child', mode, directory, queries_path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            stats = json.loads(output.strip().splitlines()[-1])
+            # الذاكرة الخاصة تتكرر في كل worker، وصفحات الملفات تُحسب مرة واحدة
+            total = args.workers * stats['query_anon'] + stats['query_file']
+            print(f"\n📊 {label}")
+            print(f"✓ الفتح {stats['open'] * 1000:9.1f}ms   خاصة {stats['open_anon']:7.1f} MB   ملفات {stats['open_file']:7.1f} MB")
+            print(f"✓ بعد {args.queries} استعلام ({stats['latency'] * 1000:.2f}ms لكل استعلام)   "
+                  f"خاصة {stats['query_anon']:7.1f} MB   ملفات {stats['query_file']:7.1f} MB")
+            print(f"✓ {args.workers} workers ≈ {total:,.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+قياس تحليل مخرجات النماذج: parse_ai_response القديمة مقابل JSONExtractor
+
+المدونة (corpus) مبنية من أشكال الاستجابات الفعلية في default_responses
+بالصيغ التي تعيدها النماذج: JSON خام، داخل ```json، مع شرح قبل/بعد،
+مقطوع بسبب max_completion_tokens، بصيغة Python، ومخرجات طويلة تالفة.
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.parse_ai_response --repeat 200
+"""
+
+import argparse
+import json
+import time
+
+from app.constants import default_responses
+from app.json_stream import JSONExtractor, JSONExtractError, extract_json
+
+
+def legacy_parse_ai_response(content):
+    """التنفيذ السابق لـ ai_service.parse_ai_response (للمقارنة فقط)"""
+    if content is None:
+        return None
+
+    result = content.strip()
+
+    if result.startswith("```"):
+        parts = result.split("```")
+        if len(parts) > 1:
+            result = parts[1]
+            if result.startswith("json"):
+                result = result[4:]
+
+    result = result.strip()
+
+    try:
+        return json.loads(result)
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        start_idx = result.find('{')
+        end_idx = result.rfind('}')
+        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+            return json.loads(result[start_idx:end_idx + 1])
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        start_idx = result.find('[')
+        end_idx = result.rfind(']')
+        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+            return json.loads(result[start_idx:end_idx + 1])
+    except json.JSONDecodeError:
+        pass
+
+    return None
+
+
+def new_parse_ai_response(content):
+    if content is None:
+        return None
+    try:
+        return extract_json(content, expect=dict)
+    except JSONExtractError:
+        return None
+
+
+def build_corpus():
+    """(الاسم، النص، القيمة المتوقعة) لكل حالة؛ None للمخرجات التي لا يصح تحليلها"""
+    payloads = {
+        'scent_dna': default_responses.GENERIC_SCENT_DNA,
+        'custom_perfume': default_responses.GENERIC_CUSTOM_PERFUME,
+        'recommendations': default_responses.GENERIC_RECOMMENDATIONS,
+        'face_analysis': default_responses.GENERIC_FACE_ANALYSIS,
+        'article': dict(default_responses.GENERIC_ARTICLE,
+                        content=default_responses.GENERIC_ARTICLE.get('content', '') + "<p>{فقرة}</p>" * 400),
+    }
+
+    corpus = []
+    for name, payload in payloads.items():
+        raw = json.dumps(payload, ensure_ascii=False, indent=2)
+        corpus.append((f'{name}/raw', raw, payload))
+        corpus.append((f'{name}/fenced', f"```json\n{raw}\n```", payload))
+        corpus.append((f'{name}/prose', f"إليك التحليل المطلوب:\n{raw}\n\nأتمنى أن يكون مفيداً {{ملاحظة}}", payload))
+        corpus.append((f'{name}/notes_prefix', f"النوتات [العود، الورد] و{{المسك}} مناسبة لك:\n{raw}", payload))
+        corpus.append((f'{name}/list_prefix', f"[1] أفضل الخيارات [1, 2, 3]:\n{raw}", payload))
+        corpus.append((f'{name}/truncated', raw[:int(len(raw) * 0.8)], None))
+        corpus.append((f'{name}/trailing_comma', raw[:-2] + ",\n}", None))
+        corpus.append((f'{name}/python_repr', repr(payload), None))
+
+    # مخرجات طويلة تالفة
+    article = json.dumps(payloads['article'], ensure_ascii=False)
+    corpus.append(('malformed/unescaped_html', article.replace('<p>', '<p class="lead">'), None))
+    corpus.append(('malformed/unquoted_keys', "{" + ", ".join(f"key{i}: {i}" for i in range(3000)) + "}", None))
+    return corpus
+
+
+def bench(fn, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, text, _ in corpus:
+            fn(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_chunked(corpus, repeat, chunk_size=16):
+    """تغذية تدريجية بأجزاء صغيرة كما تصل أثناء البث"""
+    chunked = [[text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] for _, text, _ in corpus]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for chunks in chunked:
+            extractor = JSONExtractor(expect=dict)
+            for chunk in chunks:
+                if extractor.feed(chunk):
+                    break
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    total_bytes = sum(len(text.encode('utf-8')) for _, text, _ in corpus)
+
+    print("=" * 60)
+    print(f"🚀 تحليل مخرجات النماذج: {len(corpus)} حالة، {total_bytes / 1024:.0f} KB")
+    print("=" * 60)
+
+    # مقارنة النتائج مع القيمة المتوقعة (إرجاع جزء داخلي من JSON تالف يُعد خطأ)
+    correct_old = correct_new = 0
+    for name, text, expected in corpus:
+        old_ok = legacy_parse_ai_response(text) == expected
+        new_ok = new_parse_ai_response(text) == expected
+        correct_old += old_ok
+        correct_new += new_ok
+        if old_ok != new_ok:
+            print(f"  ⚠ {name}: قديم={'✓' if old_ok else '✗'} جديد={'✓' if new_ok else '✗'}")
+
+    groups = [
+        ('صالح', [c for c in corpus if c[2] is not None]),
+        ('تالف', [c for c in corpus if c[2] is None]),
+    ]
+    for label, cases in groups:
+        old_time = bench(legacy_parse_ai_response, cases, args.repeat)
+        new_time = bench(new_parse_ai_response, cases, args.repeat)
+        chunked_time = bench_chunked(cases, args.repeat)
+
+        print(f"\n📊 {label} ({len(cases)} حالة):")
+        print(f"✓ القديمة:          {old_time * 1000:8.3f}ms لكل مرور")
+        print(f"✓ JSONExtractor:    {new_time * 1000:8.3f}ms لكل مرور  (x{old_time / new_time:.2f})")
+        print(f"✓ تغذية تدريجية:    {chunked_time * 1000:8.3f}ms لكل مرور  (أجزاء 16 حرف)")
+
+    print(f"\n✓ نتائج صحيحة: القديمة {correct_old}/{len(corpus)}، JSONExtractor {correct_new}/{len(corpus)}")
+
+    print("\n📍 مواضع الأخطاء:")
+    for name, text, _ in corpus:
+        try:
+            extract_json(text)
+        except JSONExtractError as e:
+            print(f"  - {name}: {e}")
+
+
+if __name__ == "__main__":
+    main()
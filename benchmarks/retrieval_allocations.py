@@ -0,0 +1,171 @@
+"""
+قياس تخصيصات الذاكرة لكل طلب استرجاع (tracemalloc): نسخة dict لكل نتيجة مرشحة
+(المسار السابق: notes_db قائمة dicts و note.copy() في كل retrieve_by_*) مقابل
+نتائج Hit (note_id، score، method) وسجلات Note بـ __slots__ تتحول إلى dict عند الإخراج فقط
+
+لكل نوع طلب: عدد الكتل والحجم المتبقي بعد الطلب (النتائج + ما بقي في الذاكرة) وذروة
+الذاكرة المؤقتة أثناءه، بمتوسط عدة طلبات بعد إحماء بنفس الطلبات (جداول المخزن وسجلات النتائج مبنية مسبقاً).
+
+التشغيل من جذر المشروع:
+    python -m benchmarks.retrieval_allocations --notes 10000
+"""
+
+import argparse
+import gc
+import json
+import os
+import tempfile
+import tracemalloc
+
+import faiss
+
+from app.embeddings import HashEmbedder
+from app.notes_columns import write_columns
+from app.notes_index import CACHE_FILE, COLUMNS_FILE, INDEX_FILE, METADATA_FILE
+from app.notes_retriever import NotesRetriever
+from app.rag_builder import create_note_text
+from app.vector_index import build_index, fit_calibration
+from benchmarks.mmap_loading import synthetic_notes
+
+
+QUERIES = ['fresh citrus for summer', 'عود دافئ للمساء', 'rose and musk', 'woody amber base', 'صندل كريمي']
+FAMILIES = ['Citrus', 'Woody', 'Floral', 'Oriental', 'Musky']
+USE_CASES = ['summer', 'evening', 'office', 'winter', 'daily']
+
+
+class LegacyRetriever:
+    """المسار السابق: dict لكل نوتة في notes_db ونسخة (copy) لكل نتيجة"""
+
+    def __init__(self, retriever: NotesRetriever, notes_db):
+        self.view = retriever.view
+        self.notes = {note['id']: note for note in notes_db}
+        self.notes_db = notes_db
+
+    def retrieve_by_similarity(self, query, top_k=5):
+        snapshot = self.view.snapshot
+        matches = self.view.search(snapshot.embedder.encode_query(query), top_k)
+        scores = snapshot.calibration.calibrate([cosine for _, cosine in matches])
+        results = []
+        for (note_id, cosine), score in zip(matches, scores):
+            note = self.notes[note_id].copy()
+            note['similarity_score'] = float(score)
+            note['cosine'] = cosine
+            note['retrieval_method'] = 'semantic'
+            results.append(note)
+        return results
+
+    def _filter(self, field, text, method, top_k):
+        text = text.lower()
+        results = [note.copy() for note in self.notes_db if text in note.get(field, '').lower()]
+        for note in results:
+            note['retrieval_method'] = method
+            note['similarity_score'] = 1.0
+        return results[:top_k]
+
+    def retrieve_by_family(self, family, top_k=5):
+        return self._filter('family', family, 'family_filter', top_k)
+
+    def retrieve_by_use_case(self, use_case, top_k=5):
+        use_case = use_case.lower()
+        results = [
+            note.copy() for note in self.notes_db
+            if isinstance(note.get('best_for'), list) and any(use_case in case.lower() for case in note['best_for'])
+        ]
+        for note in results:
+            note['retrieval_method'] = 'use_case_filter'
+            note['similarity_score'] = 1.0
+        return results[:top_k]
+
+    def hybrid_retrieve(self, query, filters=None, top_k=5):
+        results = self.retrieve_by_similarity(query, top_k * 2)
+        if filters and filters.get('family'):
+            names = {note['note'] for note in self.retrieve_by_family(filters['family'], 100)}
+            results = [note for note in results if note['note'] in names]
+        results.sort(key=lambda note: note.get('similarity_score', 0), reverse=True)
+        return results[:top_k]
+
+
+def requests_for(retriever, k):
+    """(اسم الطلب، دالة طلب رقم i) بنفس الواجهة في المسارين"""
+    return [
+        ('semantic', lambda i: retriever.retrieve_by_similarity(QUERIES[i % len(QUERIES)], k)),
+        ('family', lambda i: retriever.retrieve_by_family(FAMILIES[i % len(FAMILIES)], k)),
+        ('use_case', lambda i: retriever.retrieve_by_use_case(USE_CASES[i % len(USE_CASES)], k)),
+        ('hybrid', lambda i: retriever.hybrid_retrieve(
+            QUERIES[i % len(QUERIES)], {'family': FAMILIES[i % len(FAMILIES)]}, k)),
+    ]
+
+
+def measure(request, repeats):
+    """(كتل متبقية، KB متبقية، ذروة KB) لكل طلب مع الاحتفاظ بالنتائج كما يفعل المستدعي"""
+    # إحماء: سجلات Note لنتائج كل الطلبات تُنشأ مرة واحدة في المخزن (حالة worker مستقر)
+    for i in range(repeats):
+        request(i)
+    results = []
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    peak = 0
+    for i in range(repeats):
+        tracemalloc.reset_peak()
+        results.append(request(i))
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - start)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    del results
+    return blocks / repeats, size / repeats / 1024, peak / 1024
+
+
+def build_snapshot(directory, n):
+    """نسخة فهرس اصطناعية: notes.columns + notes_cache.json + IndexIDMap2 (hash embedder)"""
+    notes = synthetic_notes(n)
+    embedder = HashEmbedder()
+    vectors = embedder.encode([create_note_text(note) for note in notes])
+    faiss.write_index(build_index(vectors, 'flat', ids=[note['id'] for note in notes]),
+                      os.path.join(directory, INDEX_FILE))
+    write_columns(os.path.join(directory, COLUMNS_FILE), notes)
+    with open(os.path.join(directory, CACHE_FILE), 'w', encoding='utf-8') as f:
+        json.dump(notes, f, ensure_ascii=False)
+    with open(os.path.join(directory, METADATA_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'embedder': embedder.name, 'calibration': fit_calibration(vectors).to_dict()}, f)
+    embedder.save(directory)
+    return notes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notes', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"🚀 تخصيصات الذاكرة لكل طلب استرجاع: {args.notes:,} نوتة، k={args.k}، {args.repeats} طلب")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        notes = build_snapshot(directory, args.notes)
+        retriever = NotesRetriever(directory)
+        legacy = LegacyRetriever(retriever, notes)
+
+        tracemalloc.start()
+        rows = {}
+        for label, current in (('dict + copy', legacy), ('Hit + Note', retriever)):
+            for name, request in requests_for(current, args.k):
+                rows.setdefault(name, {})[label] = measure(request, args.repeats)
+        tracemalloc.stop()
+
+    print(f"\n{'الطلب':<10} {'المسار':<12} {'كتل متبقية':>11} {'KB متبقية':>10} {'ذروة KB':>9}")
+    for name, results in rows.items():
+        for label, (blocks, size, peak) in results.items():
+            print(f"{name:<10} {label:<12} {blocks:11.0f} {size:10.1f} {peak:9.1f}")
+        old, new = results['dict + copy'], results['Hit + Note']
+        print(f"{'':<10} ✓ السابق / الحالي: الذروة {old[2] / max(new[2], 1e-9):.1f}x، المتبقي {old[1] / max(new[1], 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
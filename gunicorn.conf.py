@@ -0,0 +1,27 @@
+"""
+إعدادات gunicorn (تُقرأ تلقائياً من جذر المشروع)
+
+كل عامل يُنشئ عميل OpenAI ومجمع اتصالات HTTP خاصاً به بعد fork؛
+لا يجوز مشاركة اتصالات TLS المفتوحة بين العمليات.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# أطول من أطول مهلة AI لمسار (ROUTE_DEADLINES في app/ai_resilience.py)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 150))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+
+def post_fork(server, worker):
+    """إسقاط عملاء AI الموروثة من العملية الأم (مهم مع preload_app)"""
+    from app import ai_client
+    ai_client.reset_after_fork()
+
+
+def worker_exit(server, worker):
+    """إغلاق اتصالات مجمع AI بشكل نظيف عند إيقاف العامل"""
+    from app import ai_client
+    ai_client.shutdown()